@@ -0,0 +1,61 @@
+"""App JWT signing throughput, with and without key/token reuse.
+
+    PYTHONPATH=. python benchmarks/bench_jwt.py [--seconds 2]
+"""
+import argparse
+import time
+
+import jwt
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from ghapp.github.identity import AppIdentity
+
+
+def generate_pem():
+    key = rsa.generate_private_key(
+        public_exponent=65537, key_size=2048, backend=default_backend())
+    return key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.TraditionalOpenSSL,
+        encryption_algorithm=serialization.NoEncryption(),
+    ).decode()
+
+
+def rate(fn, seconds):
+    n = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        fn()
+        n += 1
+    return n / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    pem = generate_pem()
+    identity = AppIdentity(app_id=1663, private_key=pem)
+
+    def pem_sign():
+        # Previous behavior, parse pem and sign on every call.
+        now = int(time.time())
+        jwt.encode(
+            dict(iat=now, exp=now + 600, iss="1663"), pem, algorithm="RS256")
+
+    results = [
+        ("sign from pem (before)", pem_sign),
+        ("sign from parsed key", lambda: identity.jwt(reuse=False)),
+        ("reused jwt (after)", identity.jwt),
+    ]
+
+    for name, fn in results:
+        print("%-24s %12.0f tokens/s" % (name, rate(fn, args.seconds)))
+
+
+if __name__ == "__main__":
+    main()
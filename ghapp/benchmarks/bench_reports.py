@@ -0,0 +1,95 @@
+"""Streaming report ingestion time and peak memory on synthetic reports.
+
+Writes JUnit XML and SARIF reports of `--cases` testcases/results, 1% failing,
+and ingests each, comparing peak memory to a full DOM/json parse.
+
+    PYTHONPATH=. python benchmarks/bench_reports.py [--cases 1000000]
+"""
+import os
+import json
+import argparse
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+from ghapp import reports
+
+
+def write_junit(path, cases):
+    with open(path, "w") as out:
+        out.write('<?xml version="1.0" encoding="UTF-8"?>\n<testsuites>\n')
+        out.write('<testsuite name="synthetic" tests="%s">\n' % cases)
+        for i in range(cases):
+            out.write(
+                '<testcase classname="tests.test_%s" name="test_%s" '
+                'file="tests/test_%s.py" line="%s" time="0.001"'
+                % (i // 1000, i, i // 1000, i % 1000))
+            if i % 100 == 0:
+                out.write(
+                    '><failure message="assert %s == 0">Traceback: %s'
+                    '</failure></testcase>\n' % (i, "x" * 200))
+            else:
+                out.write('/>\n')
+        out.write('</testsuite>\n</testsuites>\n')
+
+
+def write_sarif(path, cases):
+    with open(path, "w") as out:
+        out.write('{"version": "2.1.0", "runs": [{"tool": {"driver": '
+                  '{"name": "synthetic"}}, "results": [\n')
+        for i in range(cases):
+            if i:
+                out.write(",\n")
+            json.dump({
+                "ruleId": "R%s" % (i % 50),
+                "level": "error" if i % 100 == 0 else "note",
+                "message": {"text": "finding %s" % i},
+                "locations": [{"physicalLocation": {
+                    "artifactLocation": {"uri": "src/m%s.py" % (i // 1000)},
+                    "region": {"startLine": i % 1000 + 1},
+                }}],
+            }, out)
+        out.write("\n]}]}\n")
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cases", type=int, default=1000000)
+    parser.add_argument(
+        "--full", action="store_true",
+        help="Also measure a full DOM/json parse, for comparison.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        junit = os.path.join(tmp, "junit.xml")
+        sarif = os.path.join(tmp, "results.sarif")
+        write_junit(junit, args.cases)
+        write_sarif(sarif, args.cases)
+
+        for name, path, full in (
+                ("junit", junit, lambda p: ET.parse(p)),
+                ("sarif", sarif, lambda p: json.load(open(p)))):
+            summary, elapsed, peak = measure(lambda: reports.ingest(path))
+            print("%-6s %6.0fMB %8.1fs %8.0f cases/s %8.1fMB peak  %s" % (
+                name, os.path.getsize(path) / 1e6, elapsed,
+                args.cases / elapsed, peak, summary.title))
+
+            if args.full:
+                _, elapsed, peak = measure(lambda: full(path))
+                print("%-6s %6s %8.1fs %17s %8.1fMB peak  (full parse)" % (
+                    "", "", elapsed, "", peak))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Webhook body verification and parsing of 1MB payloads.
+
+Compares the previous handler body handling, which buffered the body,
+compared a sha1 hex digest with `==` and parsed the body again via
+`Request.json`, with streaming sha256 verification via `read_body` and a
+single `parse_body`. Both are served by aiohttp over a unix socket, and
+report per-request latency and peak traced memory while handling.
+
+    PYTHONPATH=. python benchmarks/bench_webhooks.py [-n 50] [--size 1048576]
+"""
+import os
+import hmac
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+
+import aiohttp
+from aiohttp import web
+
+from ghapp.payload import parse_body, read_body
+
+SECRET = b"bench"
+
+
+async def buffered(req):
+    raw = await req.read()
+    sig = "sha1=" + hmac.new(SECRET, msg=raw, digestmod="sha1").hexdigest()
+    if not req.headers["x-hub-signature"] == sig:
+        return web.Response(status=401)
+    await req.json()
+    return web.Response()
+
+
+async def streaming(req):
+    mac = hmac.new(SECRET, digestmod="sha256")
+    raw = await read_body(req, 25 * 1024 * 1024, [mac])
+    sig = "sha256=" + mac.hexdigest()
+    if not hmac.compare_digest(
+            sig.encode(), req.headers["x-hub-signature-256"].encode()):
+        return web.Response(status=401)
+    parse_body(req, raw)
+    return web.Response()
+
+
+def payload(size):
+    entry = {"filename": "src/module.py", "status": "modified", "patch": ""}
+    entries = []
+    while len(json.dumps({"files": entries})) < size:
+        entries.append(dict(entry, patch="+" + "x" * 1000))
+    return json.dumps({"files": entries}).encode()
+
+
+async def bench(handler, body, n):
+    path = os.path.join(tempfile.mkdtemp(), "bench.sock")
+    # aiohttp caps buffered bodies at 1MB by default
+    app = web.Application(client_max_size=32 * 1024 * 1024)
+    app.router.add_post("/", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.UnixSite(runner, path).start()
+
+    headers = {
+        "content-type": "application/json",
+        "x-hub-signature": "sha1=" + hmac.new(
+            SECRET, body, "sha1").hexdigest(),
+        "x-hub-signature-256": "sha256=" + hmac.new(
+            SECRET, body, "sha256").hexdigest(),
+    }
+
+    times = []
+    peaks = []
+    try:
+        async with aiohttp.ClientSession(
+                connector=aiohttp.UnixConnector(path=path)) as session:
+            for _ in range(n):
+                tracemalloc.start()
+                start = time.perf_counter()
+                async with session.post(
+                        "http://bench/", data=body, headers=headers) as resp:
+                    assert resp.status == 200, resp.status
+                times.append(time.perf_counter() - start)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+    finally:
+        await runner.cleanup()
+
+    return times, peaks
+
+
+def report(name, times, peaks):
+    print("%-10s mean %6.1fms  median %6.1fms  peak %6.1fMB" % (
+        name,
+        statistics.mean(times) * 1e3,
+        statistics.median(times) * 1e3,
+        max(peaks) / 2**20,
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=50)
+    parser.add_argument("--size", type=int, default=1024 * 1024)
+    args = parser.parse_args()
+
+    body = payload(args.size)
+    print("payload: %.2fMB" % (len(body) / 2**20))
+
+    for name, handler in (("buffered", buffered), ("streaming", streaming)):
+        report(name, *asyncio.run(bench(handler, body, args.n)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,22 @@
 import logging
 import os
+from typing import Optional
 
 import attr
 import cattr
 from aiohttp import web
 
 from .mind import Mind, Ping
+from .github.identity import AppIdentity
+from .github.client import GithubClient
 from .github.webhooks import GithubHooks
+from .buildkite import jobs
 from .buildkite.webhooks import BuildkiteHooks
+from .jobchecks import JobChecks
+from .dedup import DeliveryDedup
+from .journal import DeliveryJournal
+from .routing import WorkerRouter
+from .workqueue import WorkQueue
 
 
 @attr.s(auto_attribs=True, slots=True)
@@ -16,36 +25,107 @@ class Main:
     github_hooks: GithubHooks
     buildkite_hooks: BuildkiteHooks
     mind: Mind
+    work: WorkQueue
+    dedup: DeliveryDedup
+    job_checks: Optional[JobChecks] = None
+    router: Optional[WorkerRouter] = None
 
     async def get_mind(self, req: web.Request):
         return web.Response(body=self.mind.thought)
 
+    def metrics(self) -> dict:
+        metrics = {"work": self.work.stats(), "dedup": self.dedup.stats()}
+        if self.job_checks:
+            metrics["job_checks"] = self.job_checks.stats()
+            metrics["identity"] = self.job_checks.github.identity.stats()
+        if self.router:
+            metrics["router"] = self.router.stats()
+        return metrics
+
+    async def get_metrics(self, req: web.Request):
+        return web.json_response(self.metrics())
+
+    def resolve_delivery(self, source: str, name: str):
+        """Signal handler for a journaled webhook delivery, if any."""
+        hooks = {
+            "github": self.github_hooks,
+            "buildkite": self.buildkite_hooks,
+        }[source]
+        signal = hooks.signals.signals.get(name)
+        return signal.send if signal else None
+
     async def push_ping(self, name, body):
         assert name == "ping"
         ping = cattr.structure(body, Ping)
         self.mind.listen(ping)
 
     @staticmethod
-    def setup(loop=None):
+    def setup(loop=None,
+              identity: Optional[AppIdentity] = None,
+              journal: Optional[DeliveryJournal] = None,
+              router: Optional[WorkerRouter] = None):
+        """Setup app, pushing buildkite job events to checks if given an identity.
+
+        Webhook deliveries are journaled, and replayed at startup, if given a
+        journal, and routed to their owning worker process if given a router.
+        """
         sdir = os.path.join(os.path.dirname(__file__), "../secrets/")
 
         app = web.Application(loop=loop)
-        github_hooks = GithubHooks()
-        buildkite_hooks = BuildkiteHooks()
+        work = WorkQueue(journal=journal)
+        dedup = DeliveryDedup()
+        github_hooks = GithubHooks(work=work, dedup=dedup)
+        buildkite_hooks = BuildkiteHooks(work=work, dedup=dedup)
         mind = Mind()
+        job_checks = JobChecks(GithubClient(identity)) if identity else None
         main = Main(
             app=app,
             github_hooks=github_hooks,
             buildkite_hooks=buildkite_hooks,
-            mind=mind)
+            mind=mind,
+            work=work,
+            dedup=dedup,
+            job_checks=job_checks,
+            router=router)
+
+        # Webhooks are acknowledged once queued, and handled by workers.
+        async def start_work(_):
+            await work.start()
+            work.start_replay(main.resolve_delivery)
+        app.on_startup.append(start_work)
+
+        async def close_work(_):
+            await work.close()
+        app.on_cleanup.append(close_work)
+
+        if router:
+            async def close_router(_):
+                await router.close()
+            app.on_cleanup.append(close_router)
 
         app.router.add_get("/zen", main.get_mind)
+        app.router.add_get("/metrics", main.get_metrics)
+
+        def route(source, hooks):
+            if router:
+                return router.route(source, hooks.handler, hooks.read_verified)
+            return hooks.handler
 
-        app.router.add_post('/webhooks/github', github_hooks.handler)
+        app.router.add_post(
+            '/webhooks/github', route("github", github_hooks))
         github_hooks.signals.add_handler("ping", main.push_ping)
         github_hooks.signals.freeze()
 
-        app.router.add_post('/webhooks/buildkite', buildkite_hooks.handler)
+        app.router.add_post(
+            '/webhooks/buildkite', route("buildkite", buildkite_hooks))
+        if job_checks:
+            for event in jobs.JobEvent:
+                buildkite_hooks.signals.add_handler(
+                    event.value, job_checks.handle_job_hook)
+
+            async def close_job_checks(_):
+                await job_checks.close()
+            app.on_cleanup.append(close_job_checks)
         buildkite_hooks.signals.freeze()
 
 
@@ -57,7 +137,20 @@ def create_app(loop):
         logging.root.setLevel(logging.DEBUG)
         logging.info("debug")
 
-    app = Main.setup(loop=loop).app
+    try:
+        identity = AppIdentity()
+    except ValueError:
+        logging.warning("No app identity, not pushing job checks.",
+                        exc_info=True)
+        identity = None
+
+    try:
+        journal = DeliveryJournal()
+    except ValueError:
+        logging.warning("No delivery journal, not replaying webhooks.")
+        journal = None
+
+    app = Main.setup(loop=loop, identity=identity, journal=journal).app
     app.on_startup.append(set_verbose_logging)
 
     return app
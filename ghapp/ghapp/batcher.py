@@ -0,0 +1,116 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+import asyncio
+import logging
+
+import attr
+
+from .github import checks
+from .serial import KeyedSerial
+
+logger = logging.getLogger(__name__)
+
+
+def merge_run_details(older: checks.RunDetails,
+                      newer: checks.RunDetails) -> checks.RunDetails:
+    """Newer run details, retaining older values for fields newer leaves unset."""
+    updates = {}
+    for field in attr.fields(checks.RunDetails):
+        value = getattr(newer, field.name)
+        if value is not None:
+            updates[field.name] = value
+
+    return attr.evolve(older, **updates)
+
+
+@attr.s(auto_attribs=True)
+class PendingUpdate:
+    run: checks.RunDetails
+    context: Any
+    # Resolves to whether the merged update was sent.
+    sent: "asyncio.Future[bool]"
+    timer: Optional[asyncio.Handle] = None
+
+
+@attr.s(auto_attribs=True)
+class UpdateBatcher:
+    """Coalesces check run updates per key over a debounce window.
+
+    Updates submitted for a key within `window` seconds of its first pending
+    update are merged, and only the merged state is passed to `flush` along
+    with the most recent context. Completed runs flush immediately. Flushes
+    for a key are sent serially, in submission order, via `lanes`.
+
+    `submit` returns a future resolving to whether the update, merged with
+    any later updates for its key, was sent.
+    """
+    flush: Callable[[Hashable, checks.RunDetails, Any], Awaitable[None]]
+    window: float = 2.0
+
+    submitted: int = 0
+    sent: int = 0
+
+    lanes: KeyedSerial = attr.Factory(KeyedSerial)
+
+    _pending: Dict[Hashable, PendingUpdate] = attr.ib(
+        default=attr.Factory(dict), repr=False)
+
+    async def submit(self, key: Hashable, run: checks.RunDetails,
+                     context: Any = None) -> "asyncio.Future[bool]":
+        self.submitted += 1
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            logger.debug("Merging pending update: %s", key)
+            pending.run = merge_run_details(pending.run, run)
+            pending.context = context
+        else:
+            pending = self._pending[key] = PendingUpdate(
+                run, context, asyncio.get_event_loop().create_future())
+            if self.window > 0:
+                pending.timer = asyncio.get_event_loop().call_later(
+                    self.window,
+                    lambda: asyncio.ensure_future(self._flush_logged(key)))
+
+        if self.window <= 0 or pending.run.status == checks.Status.completed:
+            await self.flush_key(key)
+
+        return pending.sent
+
+    async def flush_key(self, key: Hashable):
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        if pending.timer is not None:
+            pending.timer.cancel()
+
+        try:
+            await self.lanes.run(key, self._send, key, pending)
+        finally:
+            if not pending.sent.done():
+                pending.sent.set_result(False)
+
+    async def _send(self, key: Hashable, pending: PendingUpdate):
+        self.sent += 1
+        await self.flush(key, pending.run, pending.context)
+        if not pending.sent.done():
+            pending.sent.set_result(True)
+
+    async def _flush_logged(self, key: Hashable):
+        try:
+            await self.flush_key(key)
+        except Exception:
+            logger.exception("Error flushing update: %s", key)
+
+    async def close(self):
+        """Flush all pending updates."""
+        await asyncio.gather(
+            *[self._flush_logged(key) for key in list(self._pending)])
+
+    def stats(self) -> dict:
+        return dict(
+            submitted=self.submitted,
+            sent=self.sent,
+            pending=len(self._pending),
+            lanes=self.lanes.stats(),
+        )
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Optional, Union
 import os
 
 import logging
@@ -7,7 +7,10 @@ import attr
 
 from aiohttp import web
 
+from ..dedup import DeliveryDedup
+from ..payload import BodyTooLarge, parse_body, read_body, resolve_max_body
 from ..signalset import SignalSet
+from ..workqueue import WorkQueue
 
 logger = logging.getLogger(__name__)
 
@@ -41,8 +44,16 @@ class BuildkiteHooks:
         default=attr.Factory(lambda: BuildkiteHooks._resolve_secret()))
 
     signals: SignalSet = attr.Factory(SignalSet)
-
-    async def handler(self, req: web.Request):
+    # Handles signals in the background if given, otherwise before responding.
+    work: Optional[WorkQueue] = None
+    # Drops redelivered webhooks if given.
+    dedup: Optional[DeliveryDedup] = None
+    # Rejects larger bodies, resolved from `GHAPP_MAX_WEBHOOK_BYTES`.
+    max_body: int = attr.ib(converter=resolve_max_body, default=None)
+
+    async def read_verified(
+            self, req: web.Request) -> Union[bytes, web.Response]:
+        """Read the body, verifying its token, or the rejecting response."""
         # Get and validate signature
         token = req.headers.get('x-buildkite-token')
         if token:
@@ -51,8 +62,38 @@ class BuildkiteHooks:
                 logging.debug("secret: %s", self.secret)
                 return web.Response(status=401, text="invalid x-buildkite-token")
 
+        try:
+            return await read_body(req, self.max_body)
+        except BodyTooLarge:
+            return web.Response(status=413, text="webhook body too large")
+
+    async def handler(self, req: web.Request):
+        raw_body = await self.read_verified(req)
+        if isinstance(raw_body, web.Response):
+            return raw_body
+
+        # Drop redeliveries before parsing or dispatch
+        key = None
+        if self.dedup is not None:
+            key = self.dedup.key("buildkite", None, raw_body)
+            if self.dedup.is_duplicate(key):
+                return web.Response(status=200, text="duplicate delivery")
+
+        # Forget deliveries that are not accepted, so redeliveries are handled
+        try:
+            resp = await self._dispatch(req, raw_body)
+        except BaseException:
+            if key is not None:
+                self.dedup.forget(key)
+            raise
+        if key is not None and resp.status >= 300:
+            self.dedup.forget(key)
+        return resp
+
+    async def _dispatch(self, req: web.Request,
+                        raw_body: bytes) -> web.Response:
         # Get body, only application/json
-        body = await req.json()
+        body = parse_body(req, raw_body)
 
         name = req.headers['x-buildkite-event']
         logger.debug("name: %s", name)
@@ -60,6 +101,12 @@ class BuildkiteHooks:
         signal = self.signals.signals.get(name)
         if signal:
             logger.debug("resolved signals: %s", name)
-            await signal.send(name = name, body=body)
+            if self.work is None:
+                await signal.send(name = name, body=body)
+            elif not await self.work.deliver(
+                    "buildkite", signal.send, name=name, body=body):
+                return web.Response(
+                    status=503, text="webhook queue full",
+                    headers={"Retry-After": "1"})
 
         return web.Response(status=200)
@@ -0,0 +1,107 @@
+from typing import Any, Callable, Hashable, Optional
+
+import time
+import collections
+
+import attr
+
+_missing = object()
+
+
+@attr.s(auto_attribs=True)
+class LRUCache:
+    """Bounded least-recently-used mapping with optional entry expiry.
+
+    Entries expire after `ttl` seconds, or an explicit per-entry `ttl` passed
+    to `put`, as measured by `clock`. Expired entries are dropped lazily on
+    access, and the least recently used entry is evicted once `maxsize` is
+    exceeded. If given `weigh`, least recently used entries are also evicted
+    while the total `weight` of entries exceeds `maxweight`. `hits` and
+    `misses` count `get` lookups.
+    """
+    maxsize: int = 1024
+    ttl: Optional[float] = None
+    clock: Callable[[], float] = time.monotonic
+    weigh: Optional[Callable[[Any], int]] = None
+    maxweight: Optional[int] = None
+
+    weight: int = 0
+
+    hits: int = 0
+    misses: int = 0
+
+    _entries: "collections.OrderedDict" = attr.ib(
+        default=attr.Factory(collections.OrderedDict), repr=False)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self._lookup(key)
+        if value is _missing:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if ttl is None:
+            ttl = self.ttl
+        expires = self.clock() + ttl if ttl is not None else None
+
+        weight = self.weigh(value) if self.weigh is not None else 0
+
+        self._drop(key)
+        self._entries[key] = (expires, weight, value)
+        self.weight += weight
+
+        while len(self._entries) > self.maxsize or (
+                self.maxweight is not None and self.weight > self.maxweight):
+            self._drop(next(iter(self._entries)))
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._drop(key)
+        if entry is None:
+            return default
+        return entry[2]
+
+    def clear(self):
+        self._entries.clear()
+        self.weight = 0
+
+    def _drop(self, key: Hashable) -> Optional[tuple]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.weight -= entry[1]
+        return entry
+
+    @property
+    def hit_rate(self) -> Optional[float]:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else None
+
+    def stats(self) -> dict:
+        return dict(
+            size=len(self._entries),
+            maxsize=self.maxsize,
+            hits=self.hits,
+            misses=self.misses,
+            hit_rate=self.hit_rate,
+        )
+
+    def _lookup(self, key: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return _missing
+
+        expires, _, value = entry
+        if expires is not None and expires <= self.clock():
+            self._drop(key)
+            return _missing
+
+        self._entries.move_to_end(key)
+        return value
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._lookup(key) is not _missing
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,21 +1,32 @@
 import logging
 import json
 import os
-from typing import Optional
+import itertools
+import contextlib
+from typing import List, Optional, Tuple, Union
 
+import attr
 import cattr
 
-import aiohttp
 import aiorun
 import asyncio
 import click
 from decorator import decorator
 
 from .github.identity import AppIdentity
+from .github.client import GithubClient
+from .github.ratelimit import Priority
 from .github import checks
-from .github.gitcredentials import credential_helper
+from .github.annotations import (
+    ANNOTATIONS_PER_REQUEST, read_annotations, upload_annotations)
+from .github.gitcredentials import credential_helper, credential_eraser
+from .github import credentialclient
+from .github.credentialbroker import CredentialBroker
 
 from .buildkite import jobs
+from . import reports
+from .output import read_if_file
+from .watch import ProgressWatch
 from .handlers import RepoName, job_environ_to_check_action
 
 logger = logging.getLogger(__name__)
@@ -50,6 +61,12 @@ def aiomain(coro, *args, **kwargs):
           "Resolved from $%s." % AppIdentity.PRIVATE_KEY_ENV_VAR),
     envvar=AppIdentity.PRIVATE_KEY_ENV_VAR,
 )
+@click.option(
+    '--token_cache',
+    help=("Path of installation token cache file shared between processes. "
+          "Resolved from $%s." % AppIdentity.TOKEN_CACHE_ENV_VAR),
+    envvar=AppIdentity.TOKEN_CACHE_ENV_VAR,
+)
 @click.option(
     '-v',
     '--verbose',
@@ -59,14 +76,15 @@ def aiomain(coro, *args, **kwargs):
     envvar="GITHUB_APP_AUTH_DEBUG",
 )
 @click.pass_context
-def main(ctx, app_id, private_key, verbose):
+def main(ctx, app_id, private_key, token_cache, verbose):
     if verbose:
         logging.basicConfig(
             level=logging.INFO if verbose == 1 else logging.DEBUG,
             format="%(name)s %(message)s",
         )
 
-    ctx.obj = AppIdentity(app_id=app_id, private_key=private_key)
+    ctx.obj = AppIdentity(
+        app_id=app_id, private_key=private_key, token_store=token_cache)
 
 
 @main.add_command
@@ -74,9 +92,8 @@ def main(ctx, app_id, private_key, verbose):
 @pass_appidentity
 @aiomain
 async def current(appidentity: AppIdentity):
-    async with aiohttp.ClientSession(
-            headers=appidentity.app_headers(), ) as session:
-        async with session.get('https://api.github.com/app', ) as resp:
+    async with GithubClient(appidentity) as github:
+        async with github.app().get('https://api.github.com/app', ) as resp:
             resp.raise_for_status()
             print(json.dumps(await resp.json(), indent=2))
 
@@ -87,7 +104,18 @@ async def current(appidentity: AppIdentity):
 @click.argument('account')
 @aiomain
 async def token(appidentity, account):
-    print(await appidentity.installation_token_for(account))
+    async with GithubClient(appidentity) as github:
+        print(await appidentity.installation_token_for(account, github.app()))
+
+
+@main.add_command
+@click.command(help="List all app installations.")
+@pass_appidentity
+@aiomain
+async def installations(appidentity: AppIdentity):
+    async with GithubClient(appidentity) as github:
+        print(json.dumps(
+            await appidentity.installations(github.app()), indent=2))
 
 
 @main.group(help="git-credential helper implementation.")
@@ -100,23 +128,87 @@ def credential():
 @pass_appidentity
 @click.argument('input', type=click.File('r'), default="-")
 @click.argument('output', type=click.File('w'), default="-")
+@click.option(
+    '--socket',
+    help=("Credential broker socket, falling back to in-process helper if "
+          "unavailable. Resolved from $%s." % credentialclient.SOCKET_ENV_VAR),
+    envvar=credentialclient.SOCKET_ENV_VAR,
+)
 @aiomain
-async def get(appidentity, input, output):
+async def get(appidentity, input, output, socket):
     # https://git-scm.com/docs/git-credential
     logger.debug("get id: %s input: %s output: %s", appidentity, input, output)
-    output.write(await credential_helper(input.read(),
-                                         appidentity.installation_token_for))
+    credential_input = input.read()
+
+    if socket:
+        try:
+            output.write(
+                credentialclient.request(socket, "get", credential_input))
+            output.write("\n")
+            return
+        except credentialclient.BrokerUnavailable:
+            logger.info("Credential broker unavailable: %s", socket)
+
+    output.write(await credential_helper(credential_input,
+                                         appidentity.installation_token))
     output.write("\n")
 
 
+@credential.add_command
+@click.command(help="Serve credentials to `get` via a unix socket broker.")
+@pass_appidentity
+@click.option(
+    '--socket',
+    required=True,
+    help=("Credential broker socket path. "
+          "Resolved from $%s." % credentialclient.SOCKET_ENV_VAR),
+    envvar=credentialclient.SOCKET_ENV_VAR,
+)
+@aiomain
+async def serve(appidentity, socket):
+    await CredentialBroker(identity=appidentity, path=socket).serve_forever()
+
+
 @credential.command(help="no-op git-credential interface")
 def store():
     pass
 
 
-@credential.command(help="no-op git-credential interface")
-def erase():
-    pass
+@credential.add_command
+@click.command(help="Evict rejected credentials from token cache.")
+@pass_appidentity
+@click.argument('input', type=click.File('r'), default="-")
+def erase(appidentity, input):
+    credential_eraser(input.read(), appidentity.evict_installation_token)
+
+
+@main.add_command
+@click.command(
+    name="serve",
+    help="Serve github and buildkite webhooks from worker processes.")
+@pass_appidentity
+@click.option('--host', default="0.0.0.0")
+@click.option('--port', type=int, default=8080, envvar="PORT")
+@click.option(
+    '--workers',
+    type=int,
+    default=None,
+    help="Worker processes, sharing the port via SO_REUSEPORT. "
+    "Defaults to one per cpu.")
+@click.option(
+    '--uvloop/--no-uvloop',
+    default=False,
+    help="Run workers on uvloop, if installed.")
+def serve_webhooks(appidentity: AppIdentity, host: str, port: int,
+                   workers: Optional[int], uvloop: bool):
+    from . import serve
+
+    serve.run(
+        host=host,
+        port=port,
+        workers=workers,
+        identity=appidentity,
+        use_uvloop=uvloop)
 
 
 @main.group(help="github checks api support")
@@ -129,15 +221,31 @@ def check():
 @pass_appidentity
 @click.argument('repo', type=str)
 @click.argument('ref', type=str)
+@click.option('--check_name', type=str, default=None)
+@click.option(
+    '--filter', type=click.Choice(["latest", "all"]), default=None)
 @aiomain
-async def list(app: AppIdentity, repo: str, ref: str):
+async def list(
+        app: AppIdentity,
+        repo: str,
+        ref: str,
+        check_name: Optional[str],
+        filter: Optional[str],
+):
     """List current checks on given repo ref."""
     repo = RepoName.parse(repo)
 
-    async with aiohttp.ClientSession(
-            headers=await app.installation_headers(repo.owner)) as sesh:
-        fetch = checks.GetRuns(owner=repo.owner, repo=repo.repo, ref=ref)
-        print(await fetch.execute(sesh))
+    async with GithubClient(app) as github:
+        sesh = github.installation(repo.owner)
+        fetch = checks.GetRuns(
+            owner=repo.owner,
+            repo=repo.repo,
+            ref=ref,
+            check_name=check_name,
+            filter=filter,
+        )
+        async for run in fetch.iterate(sesh):
+            print(run)
 
 
 @check.add_command
@@ -165,8 +273,8 @@ async def push(
     repo = RepoName.parse(repo)
     output = load_job_output(output_title, output_summary, output)
 
-    async with aiohttp.ClientSession(
-            headers=await app.installation_headers(repo.owner)) as sesh:
+    async with GithubClient(app) as github:
+        sesh = github.installation(repo.owner)
 
         if not sha:
             logging.info("Resolving branch sha: %s", branch)
@@ -227,8 +335,8 @@ async def update(
             status=checks.Status.in_progress,
         ))
 
-    async with aiohttp.ClientSession(
-            headers=await app.installation_headers(repo.owner)) as sesh:
+    async with GithubClient(app) as github:
+        sesh = github.installation(repo.owner)
 
         async with action.execute(sesh) as resp:
             logging.debug(resp)
@@ -248,48 +356,163 @@ async def update(
 @click.option('--output_title', type=str, default=None)
 @click.option('--output_summary', type=str, default=None)
 @click.option('--output', type=str, default=None)
+@click.option(
+    '--annotations', type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="File of check run annotations, one json annotation per line.")
+@click.option(
+    '--report', type=click.Path(exists=True, dir_okay=False), multiple=True,
+    help="JUnit XML, checkstyle or SARIF report, summarized as the run's "
+    "output and annotations if no output is given.")
 @aiomain
 async def from_job_env(
     app: AppIdentity,
     output_title: str,
     output_summary: Optional[str],
     output: Optional[str],
+    annotations: Optional[str],
+    report: Tuple[str, ...],
 ):
     job_env = cattr.structure(dict(os.environ), jobs.JobEnviron)
     logging.info("job_env: %s", job_env)
 
     repo = RepoName.parse(job_env.BUILDKITE_REPO)
 
-    async with aiohttp.ClientSession(
-            headers=await app.installation_headers(repo.owner)) as sesh:
+    async with GithubClient(app) as github:
+        sesh = github.installation(repo.owner)
 
         current_runs = await checks.GetRuns(
             owner=repo.owner,
             repo=repo.repo,
             ref=job_env.BUILDKITE_COMMIT,
+            check_name=job_env.BUILDKITE_LABEL,
         ).execute(sesh)
         logging.info("current_runs: %s", current_runs)
 
         check_action = job_environ_to_check_action(job_env, current_runs)
         output = load_job_output(output_title, output_summary, output)
-        if output:
-            check_action.run.output = output
 
-        logging.info("action: %s", check_action)
+        summary = None
+        if report:
+            summary = reports.ReportSummary()
+            for path in report:
+                reports.ingest(path, summary)
+            logging.info("report counts: %s", dict(summary.counts))
+            if not output:
+                output = summary.output()
+
+        with contextlib.ExitStack() as stack:
+            sources = []
+            if summary:
+                sources.append(summary.annotations())
+            if annotations:
+                # Streamed from the file, a request's batch at a time.
+                sources.append(read_annotations(
+                    stack.enter_context(open(annotations, "r"))))
+            pending = itertools.chain.from_iterable(sources)
+
+            # The first batch is sent with the run, reusing its current output
+            # if none is given, as output title and summary are required.
+            batch = [*itertools.islice(pending, ANNOTATIONS_PER_REQUEST)]
+            if batch and not output:
+                output = existing_output(check_action, current_runs)
+                if not output:
+                    output = checks.Output(
+                        title=check_action.run.name, summary="")
+
+            if output:
+                check_action.run.output = attr.evolve(
+                    output, annotations=batch or None)
+
+            logging.info("action: %s", check_action)
+
+            async with check_action.execute(sesh) as resp:
+                resp.raise_for_status()
+                run_id = (await resp.json())["id"] if batch else None
+
+            if batch:
+                run = attr.evolve(check_action.run, id=run_id)
+                await upload_annotations(
+                    sesh, repo.owner, repo.repo, run, output, pending)
+
+
+def existing_output(
+        action: Union[checks.CreateRun, checks.UpdateRun],
+        current_runs: List[checks.RunDetails]) -> Optional[checks.Output]:
+    """Output of the run updated by `action`, if any."""
+    if not isinstance(action, checks.UpdateRun):
+        return None
+    for run in current_runs:
+        if run.id == action.run.id and run.output:
+            return attr.evolve(run.output, annotations=None)
+    return None
+
+
+@check.add_command
+@click.command()
+@pass_appidentity
+@click.argument('path', type=click.Path(dir_okay=False))
+@click.option('--output_title', type=str, default=None)
+@click.option(
+    '--interval', type=float, default=30.0,
+    help="Minimum seconds between check run updates.")
+@click.option(
+    '--poll', type=float, default=None,
+    help="Poll for changes every given seconds, rather than via inotify.")
+@click.option(
+    '--stop_file', type=click.Path(dir_okay=False), default=None,
+    help="Stop watching once this file exists.")
+@aiomain
+async def watch(
+    app: AppIdentity,
+    path: str,
+    output_title: Optional[str],
+    interval: float,
+    poll: Optional[float],
+    stop_file: Optional[str],
+):
+    """Push a job's progress file to its check run output as it changes."""
+    job_env = cattr.structure(dict(os.environ), jobs.JobEnviron)
+    repo = RepoName.parse(job_env.BUILDKITE_REPO)
+
+    async with GithubClient(app) as github:
+        sesh = github.installation(repo.owner, priority=Priority.progress)
+
+        run = await checks.GetRuns(
+            owner=repo.owner,
+            repo=repo.repo,
+            ref=job_env.BUILDKITE_COMMIT,
+            check_name=job_env.BUILDKITE_LABEL,
+        ).find(sesh, lambda run: run.name == job_env.BUILDKITE_LABEL)
+        if run is None:
+            raise click.ClickException(
+                f"No check run for job: {job_env.BUILDKITE_LABEL}")
+
+        async def push(content: str):
+            update = checks.UpdateRun(
+                owner=repo.owner,
+                repo=repo.repo,
+                run=checks.RunDetails(
+                    name=run.name,
+                    id=run.id,
+                    output=checks.Output(
+                        title=output_title or run.name, summary=content)))
+            async with update.execute(sesh) as resp:
+                resp.raise_for_status()
 
+        progress = ProgressWatch(
+            path, push,
+            min_interval=interval, stop_file=stop_file, poll_interval=poll)
+        logging.info("Watching: %s for run: %s", path, run.id)
+        await progress.run()
 
-        await check_action.execute(sesh)
 
 def load_job_output(output_title, output_summary, output):
-    """Loads job output (maybe) from files, to be moved to handler layer."""
-    def read_if_file(val):
-        if os.path.exists(val):
-            logger.info("Reading file: %s", val)
-            with open(val, "r") as inf:
-                return inf.read()
-        else:
-            return val
+    """Loads job output (maybe) from files, to be moved to handler layer.
 
+    Summary and text are bounded to github's output size limit, reading only
+    the head and tail of oversized files.
+    """
     if output_title:
         assert output_summary
         return checks.Output(
@@ -0,0 +1,62 @@
+from typing import Callable, Hashable, Optional
+
+import time
+import hashlib
+import logging
+
+import attr
+
+from .cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+@attr.s(auto_attribs=True)
+class DeliveryDedup:
+    """Bounded window of recent webhook deliveries, for dropping repeats.
+
+    Deliveries are keyed by the sender's delivery id, or by a hash of the raw
+    body if it has none, and remembered for `ttl` seconds, up to the `maxsize`
+    most recent. `dropped` counts repeats seen within the window.
+    """
+    maxsize: int = 4096
+    ttl: float = 3600
+    clock: Callable[[], float] = time.monotonic
+
+    seen: int = 0
+    dropped: int = 0
+
+    _recent: LRUCache = attr.ib(default=None, repr=False)
+
+    def __attrs_post_init__(self):
+        self._recent = LRUCache(
+            maxsize=self.maxsize, ttl=self.ttl, clock=self.clock)
+
+    @staticmethod
+    def key(source: str, delivery_id: Optional[str], body: bytes) -> Hashable:
+        if delivery_id:
+            return (source, delivery_id)
+        return (source, hashlib.blake2b(body, digest_size=16).digest())
+
+    def is_duplicate(self, key: Hashable) -> bool:
+        """Record a delivery, returning True if seen within the window."""
+        self.seen += 1
+        if key in self._recent:
+            self.dropped += 1
+            logger.info("Dropping duplicate delivery: %s", key)
+            return True
+
+        self._recent.put(key, True)
+        return False
+
+    def forget(self, key: Hashable):
+        """Forget a rejected delivery, so its redelivery is accepted."""
+        self._recent.pop(key)
+
+    def stats(self) -> dict:
+        return dict(
+            size=len(self._recent),
+            maxsize=self.maxsize,
+            seen=self.seen,
+            dropped=self.dropped,
+        )
@@ -0,0 +1,139 @@
+from typing import Dict, IO, Iterable, Iterator, List, Optional
+
+import json
+import array
+import logging
+import itertools
+
+import attr
+import cattr
+
+from .checks import (
+    Annotation, AnnotationLevel, Output, RunDetails, Session, UpdateRun)
+
+logger = logging.getLogger(__name__)
+
+# Github accepts at most 50 annotations per create or update request.
+ANNOTATIONS_PER_REQUEST = 50
+
+_levels = list(AnnotationLevel)
+_level_codes = {level: code for code, level in enumerate(_levels)}
+
+
+@attr.s(auto_attribs=True)
+class AnnotationBuffer:
+    """Compact, append-only store of check run annotations.
+
+    Annotations are held column-wise, line and column numbers in int arrays
+    and strings interned, rather than as one `Annotation` per line, and are
+    materialized a batch at a time by `batches`. Unset columns are stored as
+    0, as columns are 1-based.
+    """
+    _strings: Dict[str, str] = attr.ib(
+        default=attr.Factory(dict), repr=False)
+    _paths: List[str] = attr.ib(default=attr.Factory(list), repr=False)
+    _messages: List[str] = attr.ib(default=attr.Factory(list), repr=False)
+    _titles: List[Optional[str]] = attr.ib(
+        default=attr.Factory(list), repr=False)
+    _raw_details: List[Optional[str]] = attr.ib(
+        default=attr.Factory(list), repr=False)
+    _lines: array.array = attr.ib(
+        default=attr.Factory(lambda: array.array("L")), repr=False)
+    _columns: array.array = attr.ib(
+        default=attr.Factory(lambda: array.array("L")), repr=False)
+    _levels: array.array = attr.ib(
+        default=attr.Factory(lambda: array.array("B")), repr=False)
+
+    def _intern(self, value: Optional[str]) -> Optional[str]:
+        if value is None:
+            return None
+        return self._strings.setdefault(value, value)
+
+    def append(self, annotation: Annotation):
+        self._paths.append(self._intern(annotation.path))
+        self._messages.append(self._intern(annotation.message))
+        self._titles.append(self._intern(annotation.title))
+        self._raw_details.append(annotation.raw_details)
+        self._lines.extend((annotation.start_line, annotation.end_line))
+        self._columns.extend(
+            (annotation.start_column or 0, annotation.end_column or 0))
+        self._levels.append(_level_codes[annotation.annotation_level])
+
+    def extend(self, annotations: Iterable[Annotation]):
+        for annotation in annotations:
+            self.append(annotation)
+
+    def __len__(self) -> int:
+        return len(self._levels)
+
+    def __getitem__(self, i: int) -> Annotation:
+        return Annotation(
+            path=self._paths[i],
+            start_line=self._lines[2 * i],
+            end_line=self._lines[2 * i + 1],
+            annotation_level=_levels[self._levels[i]],
+            message=self._messages[i],
+            start_column=self._columns[2 * i] or None,
+            end_column=self._columns[2 * i + 1] or None,
+            title=self._titles[i],
+            raw_details=self._raw_details[i],
+        )
+
+    def __iter__(self) -> Iterator[Annotation]:
+        return (self[i] for i in range(len(self)))
+
+    def batches(self, size: int = ANNOTATIONS_PER_REQUEST
+                ) -> Iterator[List[Annotation]]:
+        for start in range(0, len(self), size):
+            yield [self[i] for i in range(start, min(start + size, len(self)))]
+
+
+def read_annotations(inf: IO[str]) -> Iterator[Annotation]:
+    """Stream annotations from a file of one json annotation per line."""
+    for lineno, line in enumerate(inf, 1):
+        if not line.strip():
+            continue
+        try:
+            yield cattr.structure(json.loads(line), Annotation)
+        except Exception:
+            logger.exception("Invalid annotation on line: %s", lineno)
+            raise
+
+
+async def upload_annotations(
+        session: Session, owner: str, repo: str, run: RunDetails,
+        output: Output, annotations: Iterable[Annotation],
+        batch_size: int = ANNOTATIONS_PER_REQUEST) -> int:
+    """Add annotations to an existing run, `batch_size` per request.
+
+    Batches are sent as sequential updates of the run's output, github
+    appending each batch to the run's annotations. Returns the number of
+    requests sent.
+    """
+    assert run.id is not None
+    assert batch_size <= ANNOTATIONS_PER_REQUEST
+
+    if isinstance(annotations, AnnotationBuffer):
+        batches = annotations.batches(batch_size)
+    else:
+        annotations = iter(annotations)
+        batches = iter(
+            lambda: list(itertools.islice(annotations, batch_size)), [])
+
+    requests = 0
+    for batch in batches:
+        update = UpdateRun(
+            owner=owner,
+            repo=repo,
+            run=RunDetails(
+                name=run.name,
+                id=run.id,
+                output=attr.evolve(output, annotations=batch)))
+
+        async with update.execute(session) as resp:
+            resp.raise_for_status()
+        requests += 1
+
+    logger.info("Uploaded annotations to run: %s in %s requests",
+                run.id, requests)
+    return requests
@@ -1,6 +1,7 @@
-from typing import Optional, List
+from typing import Optional, List, Union, Dict, Callable, AsyncIterator, Tuple
 
 import aiohttp
+import asyncio
 import logging
 
 import attr
@@ -8,10 +9,15 @@ import cattr
 import enum
 
 from ..cattrs import ignore_optional_none, ignore_unknown_attribs
+from .client import GithubRequest, GithubSession
+from .ratelimit import Priority
 
 logger = logging.getLogger(__name__)
 api_headers = {"Accept": "application/vnd.github.antiope-preview+json"}
 
+# Actions execute via an authenticated ClientSession or GithubClient session.
+Session = Union[aiohttp.ClientSession, GithubSession]
+
 
 class Status(enum.Enum):
     queued = "queued"
@@ -28,6 +34,28 @@ class Conclusion(enum.Enum):
     action_required = "action_required"
 
 
+class AnnotationLevel(enum.Enum):
+    notice = "notice"
+    warning = "warning"
+    failure = "failure"
+
+
+@ignore_optional_none
+@ignore_unknown_attribs
+@attr.s(auto_attribs=True)
+class Annotation:
+    """Check run annotation from: https://developer.github.com/v3/checks/runs/"""
+    path: str
+    start_line: int
+    end_line: int
+    annotation_level: AnnotationLevel
+    message: str
+    start_column: Optional[int] = None
+    end_column: Optional[int] = None
+    title: Optional[str] = None
+    raw_details: Optional[str] = None
+
+
 @ignore_optional_none
 @ignore_unknown_attribs
 @attr.s(auto_attribs=True)
@@ -35,7 +63,8 @@ class Output:
     title: str
     summary: str
     text: Optional[str] = None
-    #annotations: List[Annotation]
+    # At most 50 per request, see `annotations.upload_annotations`.
+    annotations: Optional[List[Annotation]] = None
     #images: List[Image]
 
 
@@ -58,6 +87,14 @@ class RunDetails:
     # actions: typing.List[CheckActions]
 
 
+def run_priority(run: RunDetails) -> Priority:
+    """Request lane for run updates, sending conclusions before progress."""
+    if run.status == Status.completed or run.conclusion is not None:
+        return Priority.final
+    else:
+        return Priority.progress
+
+
 @attr.s(auto_attribs=True)
 class CreateRun:
     """Check run input parameters from: https://developer.github.com/v3/checks/runs/"""
@@ -65,7 +102,7 @@ class CreateRun:
     repo: str
     run: RunDetails
 
-    def execute(self, session: aiohttp.ClientSession):
+    def execute(self, session: Session):
         assert self.run.head_branch is not None
         assert self.run.head_sha is not None
         assert self.run.id is None
@@ -76,7 +113,40 @@ class CreateRun:
 
         logger.info('POST %s\n%s', url, body)
 
-        return session.post(url, headers=api_headers, json=body)
+        request = session.post(url, headers=api_headers, json=body)
+        if isinstance(request, GithubRequest) and self.run.external_id:
+            request.retry_guard = self.retry_guard
+        return request
+
+    async def retry_guard(self, request: GithubRequest) -> bool:
+        """Guard a resent create against duplicating a run, by external_id.
+
+        If the failed request did create the run the retry is rewritten to
+        update the existing run instead.
+        """
+        try:
+            existing = await GetRuns(
+                owner=self.owner,
+                repo=self.repo,
+                ref=self.run.head_sha,
+                check_name=self.run.name,
+            ).find(
+                request.session,
+                lambda run: run.external_id == self.run.external_id)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            logger.exception("Unable to check for created run: %s",
+                             self.run.external_id)
+            return False
+
+        if existing is not None:
+            logger.info("Run created by failed request: %s", existing.id)
+            update = attr.evolve(
+                self.run, id=existing.id, head_sha=None, head_branch=None)
+            request.method = "PATCH"
+            request.url = f"{request.url}/{existing.id}"
+            request.kwargs["json"] = cattr.unstructure(update)
+
+        return True
 
 
 @attr.s(auto_attribs=True)
@@ -86,7 +156,7 @@ class UpdateRun:
     repo: str
     run: RunDetails
 
-    def execute(self, session: aiohttp.ClientSession):
+    def execute(self, session: Session):
         assert self.run.id is not None
 
         assert self.run.head_branch is None
@@ -98,23 +168,106 @@ class UpdateRun:
 
         logger.info('PATCH %s\n%s', url, body)
 
-        return session.patch(url, headers=api_headers, json=body)
+        request = session.patch(url, headers=api_headers, json=body)
+        if isinstance(request, GithubRequest):
+            # Skip updates matching the last update sent for the run, unless
+            # adding annotations, which github appends on every update.
+            dedupe_key = ("check-run", str(self.run.id))
+            if self.run.output is not None and self.run.output.annotations:
+                request.session.client.sent_bodies.pop(dedupe_key)
+            else:
+                request.dedupe_key = dedupe_key
+                request.skipped_body = {"id": self.run.id}
+        return request
+
+def _without_empty_output(raw_run: dict) -> dict:
+    """Listed run, dropping the null title and summary of runs without output."""
+    output = raw_run.get("output")
+    if output and (output.get("title") is None
+                   or output.get("summary") is None):
+        raw_run = dict(raw_run, output=None)
+    return raw_run
+
 
 @attr.s(auto_attribs=True)
 class GetRuns:
-    """Check run input parameters from: https://developer.github.com/v3/checks/runs/"""
+    """Check run input parameters from: https://developer.github.com/v3/checks/runs/
+
+    Runs are fetched `per_page` at a time, following pagination links, and
+    optionally filtered server-side by `check_name` and `filter` ("latest"
+    or "all").
+    """
     owner: str
     repo: str
     ref: str
+    check_name: Optional[str] = None
+    filter: Optional[str] = None
+    per_page: int = 100
 
-    async def execute(self, session: aiohttp.ClientSession)->List[RunDetails]:
-        checks_url = (
+    @property
+    def url(self) -> str:
+        return (
             f"https://api.github.com"
             f"/repos/{self.owner}/{self.repo}/commits/{self.ref}/check-runs")
 
-        async with session.get(checks_url, headers=api_headers) as resp:
-            logger.debug(resp)
-            resp.raise_for_status()
-            raw_result = await resp.json()
+    @property
+    def params(self) -> Dict[str, str]:
+        params = dict(per_page=str(self.per_page))
+        if self.check_name is not None:
+            params["check_name"] = self.check_name
+        if self.filter is not None:
+            params["filter"] = self.filter
+        return params
+
+    async def iterate(self, session: Session) -> AsyncIterator[RunDetails]:
+        """Iterate over runs, fetching and structuring pages on demand.
+
+        Pages fetched via a `GithubSession` are revalidated by ETag, runs of
+        unchanged pages are structured afresh from the cached page.
+        """
+        url = self.url
+        params = self.params
+
+        while url:
+            if isinstance(session, GithubSession):
+                runs, url = await session.cached_get(
+                    url, self._parse_page, headers=api_headers, params=params)
+            else:
+                async with session.get(
+                        url, headers=api_headers, params=params) as resp:
+                    resp.raise_for_status()
+                    runs, url = await self._parse_page(resp)
+
+            # Next link includes the query parameters.
+            params = None
+
+            for run in runs:
+                yield run
+
+    @staticmethod
+    async def _parse_page(
+            resp: aiohttp.ClientResponse
+    ) -> Tuple[List[RunDetails], Optional[str]]:
+        """Structured runs and next page url of a listing response."""
+        logger.debug(resp)
+        raw_result = await resp.json()
+        runs = [
+            cattr.structure(_without_empty_output(raw_run), RunDetails)
+            for raw_run in raw_result["check_runs"]
+        ]
+
+        next_link = resp.links.get("next")
+        return runs, str(next_link["url"]) if next_link else None
+
+    async def find(self, session: Session,
+                   predicate: Callable[[RunDetails], bool]
+                   ) -> Optional[RunDetails]:
+        """First run matching predicate, fetching no further pages."""
+        async for run in self.iterate(session):
+            if predicate(run):
+                return run
+
+        return None
 
-            return cattr.structure(raw_result["check_runs"], List[RunDetails])
+    async def execute(self, session: Session)->List[RunDetails]:
+        return [run async for run in self.iterate(session)]
@@ -0,0 +1,415 @@
+from typing import Any, Awaitable, Callable, Hashable, Optional, Dict, Tuple
+
+import json
+import asyncio
+import hashlib
+import logging
+
+import attr
+import aiohttp
+from yarl import URL
+
+from ..cache import LRUCache
+from .identity import AppIdentity
+from .etags import ETagCache
+from .ratelimit import (
+    OutboundScheduler, Priority, is_rate_limited, rate_limit_message)
+from .retry import (
+    CircuitBreaker, CircuitOpenError, RetryPolicy,
+    IDEMPOTENT_METHODS, RETRY_STATUSES)
+
+logger = logging.getLogger(__name__)
+
+
+def body_digest(body: Any) -> bytes:
+    """Digest of a json request body, independent of key order."""
+    encoded = json.dumps(body, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(encoded.encode(), digest_size=16).digest()
+
+
+@attr.s(auto_attribs=True)
+class SkippedResponse:
+    """Stand-in response of a request skipped as a no-op."""
+    method: str
+    url: str
+    body: Any = None
+    status: int = 304
+
+    headers: Dict[str, str] = attr.Factory(dict)
+    links: Dict[str, Any] = attr.Factory(dict)
+
+    def raise_for_status(self):
+        pass
+
+    def release(self):
+        pass
+
+    async def json(self) -> Any:
+        return self.body
+
+
+@attr.s(auto_attribs=True)
+class CachedResponse:
+    """Stand-in response replaying a cached body after a 304."""
+    url: str
+    body: bytes = attr.ib(repr=False)
+    status: int = 200
+
+    headers: Dict[str, str] = attr.Factory(dict)
+    links: Dict[str, Any] = attr.Factory(dict)
+
+    def raise_for_status(self):
+        pass
+
+    def release(self):
+        pass
+
+    async def read(self) -> bytes:
+        return self.body
+
+    async def json(self) -> Any:
+        return json.loads(self.body)
+
+
+@attr.s(auto_attribs=True)
+class GithubRequest:
+    """Pending request, usable via `async with` or `await` like aiohttp's.
+
+    Auth headers are resolved when the request is sent. Installation requests
+    rejected with a 401 evict the cached installation token and are retried
+    once with a freshly issued token. Rate limited requests are retried, up
+    to `GithubClient.rate_limit_retries` times, once the scheduler releases
+    them.
+
+    Connection errors, timeouts and 5xx responses are retried with backoff
+    under the client's `RetryPolicy` if the request is idempotent. Other
+    requests are retried only if `retry_guard` confirms a resend is safe,
+    the guard may rewrite the request before it is resent.
+
+    Requests with a `dedupe_key` are skipped, returning a `SkippedResponse`
+    of `skipped_body`, if their json body matches the body last sent
+    successfully for the key.
+    """
+    session: "GithubSession"
+    method: str
+    url: str
+    kwargs: dict
+
+    retry_guard: Optional[Callable[["GithubRequest"], Awaitable[bool]]] = (
+        attr.ib(default=None, repr=False))
+    dedupe_key: Optional[Hashable] = None
+    skipped_body: Any = attr.ib(default=None, repr=False)
+    response: Optional[aiohttp.ClientResponse] = attr.ib(
+        default=None, repr=False)
+
+    async def send(self) -> aiohttp.ClientResponse:
+        client = self.session.client
+
+        digest = None
+        if self.dedupe_key is not None:
+            digest = body_digest(self.kwargs.get("json"))
+            if client.sent_bodies.get(self.dedupe_key) == digest:
+                logger.info("Skipping unchanged: %s %s",
+                            self.method, self.url)
+                client.skipped += 1
+                self.response = SkippedResponse(
+                    self.method, self.url, self.skipped_body)
+                return self.response
+
+        resp = await self._send()
+
+        if digest is not None:
+            if 200 <= resp.status < 300:
+                client.sent_bodies.put(self.dedupe_key, digest)
+            else:
+                client.sent_bodies.pop(self.dedupe_key)
+
+        return resp
+
+    async def _send(self) -> aiohttp.ClientResponse:
+        client = self.session.client
+        refreshed = False
+        rate_limited = 0
+        attempt = 0
+
+        while True:
+            try:
+                resp = await self.session.send(
+                    self.method, self.url, **self.kwargs)
+            except CircuitOpenError:
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                if not await self._may_retry(attempt):
+                    raise
+                logger.info("Retrying: %s %s after: %r",
+                            self.method, self.url, exc)
+                await asyncio.sleep(client.retry.delay(attempt))
+                attempt += 1
+                continue
+
+            if (resp.status == 401 and self.session.account is not None
+                    and not refreshed):
+                logger.info("Unauthorized, refreshing token for: %s",
+                            self.session.account)
+                resp.release()
+                client.identity.evict_installation_token(self.session.account)
+                refreshed = True
+            elif (is_rate_limited(resp, await rate_limit_message(resp))
+                  and rate_limited < client.rate_limit_retries):
+                logger.info("Rate limited, requeuing: %s %s",
+                            self.method, self.url)
+                resp.release()
+                rate_limited += 1
+            elif (resp.status in RETRY_STATUSES
+                  and await self._may_retry(attempt)):
+                logger.info("Retrying: %s %s after status: %s",
+                            self.method, self.url, resp.status)
+                resp.release()
+                await asyncio.sleep(client.retry.delay(attempt))
+                attempt += 1
+            else:
+                break
+
+        self.response = resp
+        return resp
+
+    async def _may_retry(self, attempt: int) -> bool:
+        client = self.session.client
+        if attempt + 1 >= client.retry.attempts:
+            return False
+
+        if self.method.upper() in IDEMPOTENT_METHODS:
+            may_retry = True
+        elif self.retry_guard is not None:
+            may_retry = await self.retry_guard(self)
+        else:
+            may_retry = False
+
+        if may_retry:
+            client.retried += 1
+        return may_retry
+
+    def __await__(self):
+        return self.send().__await__()
+
+    async def __aenter__(self) -> aiohttp.ClientResponse:
+        return await self.send()
+
+    async def __aexit__(self, *exc):
+        if self.response is not None:
+            self.response.release()
+
+
+@attr.s(auto_attribs=True)
+class GithubSession:
+    """ClientSession-like interface authenticated as the app or an installation.
+
+    Requests are scheduled against the installation's rate limit budget in
+    the `priority` lane.
+    """
+    client: "GithubClient"
+    account: Optional[str] = None
+    priority: Priority = Priority.normal
+
+    async def headers(self) -> Dict[str, str]:
+        if self.account is None:
+            return await self.client.identity.aapp_headers()
+        else:
+            return await self.client.installation_headers(self.account)
+
+    async def send(self, method: str, url: str,
+                   **kwargs) -> aiohttp.ClientResponse:
+        breaker = self.client.breaker(URL(url).host)
+        breaker.check()
+
+        headers = dict(await self.headers())
+        headers.update(kwargs.pop("headers", None) or {})
+
+        await self.client.scheduler.acquire(self.account, self.priority)
+        try:
+            resp = await self.client.session.request(
+                method, url, headers=headers, **kwargs)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            breaker.failure()
+            raise
+        self.client.scheduler.update(
+            self.account, resp, await rate_limit_message(resp))
+
+        if resp.status in RETRY_STATUSES:
+            breaker.failure()
+        else:
+            breaker.success()
+
+        return resp
+
+    def request(self, method: str, url: str, **kwargs) -> GithubRequest:
+        return GithubRequest(self, method, url, kwargs)
+
+    def get(self, url: str, **kwargs) -> GithubRequest:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> GithubRequest:
+        return self.request("POST", url, **kwargs)
+
+    def patch(self, url: str, **kwargs) -> GithubRequest:
+        return self.request("PATCH", url, **kwargs)
+
+    async def cached_get(
+            self, url: str,
+            parse: Callable[[aiohttp.ClientResponse], Awaitable[Any]],
+            **kwargs) -> Any:
+        """GET parsed via `parse`, revalidating a cached body by ETag.
+
+        Sends `If-None-Match` with the ETag of the last response for the url,
+        parsing the previously received body on a 304. Results are parsed
+        afresh for each call, so callers may modify them.
+        """
+        etags = self.client.etags
+        key = (self.account, str(URL(url).update_query(
+            kwargs.pop("params", None) or {})))
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        cached = etags.get(key)
+        if cached is not None:
+            headers["If-None-Match"] = cached[0]
+
+        async with self.get(key[1], headers=headers, **kwargs) as resp:
+            if resp.status == 304 and cached is not None:
+                logger.debug("Not modified: %s", key[1])
+                etags.not_modified += 1
+                body, links = cached[1]
+                return await parse(CachedResponse(key[1], body, links=links))
+
+            resp.raise_for_status()
+            body = await resp.read()
+            links = {rel: dict(link) for rel, link in resp.links.items()}
+            etags.put(key, resp.headers.get("ETag"), (body, links), len(body))
+            return await parse(resp)
+
+
+@attr.s(auto_attribs=True)
+class GithubClient:
+    """Shared github api client over a single pooled connection.
+
+    Owns one aiohttp session with a keep-alive, connection limited and DNS
+    caching connector, shared by the app identity's token requests and all
+    checks api calls. `app()` and `installation(account)` return
+    ClientSession-like views authenticated as the app or installation, with
+    requests scheduled against rate limits by the `OutboundScheduler`.
+
+    Listings fetched via `GithubSession.cached_get` are revalidated against
+    the `etags` cache, a 304 serving the previously received body.
+
+    `sent_bodies` holds digests of the last bodies sent for deduplicated
+    requests, `skipped` counting requests skipped as unchanged.
+
+    Transient failures are retried under `retry`, and requests to a host
+    fail fast with `CircuitOpenError` once `breaker_threshold` consecutive
+    requests have failed, probing the host every `breaker_cooldown` seconds.
+
+    Usable as an async context manager, closing the underlying session.
+    """
+    identity: AppIdentity
+
+    limit: int = 100
+    limit_per_host: int = 50
+    keepalive_timeout: float = 60
+    dns_cache_ttl: int = 5 * 60
+    timeout: float = 60
+    rate_limit_retries: int = 3
+    breaker_threshold: int = 5
+    breaker_cooldown: float = 30
+
+    scheduler: OutboundScheduler = attr.Factory(OutboundScheduler)
+    etags: ETagCache = attr.Factory(ETagCache)
+    retry: RetryPolicy = attr.Factory(RetryPolicy)
+    retried: int = 0
+    skipped: int = 0
+
+    sent_bodies: LRUCache = attr.ib(
+        default=attr.Factory(lambda: LRUCache(maxsize=4096)), repr=False)
+
+    breakers: Dict[str, CircuitBreaker] = attr.ib(
+        default=attr.Factory(dict), repr=False)
+
+    _session: Optional[aiohttp.ClientSession] = attr.ib(
+        default=None, repr=False)
+    _installation_headers: Dict[str, Tuple[str, Dict[str, str]]] = attr.ib(
+        default=attr.Factory(dict), repr=False)
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_cache_ttl,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+
+        return self._session
+
+    def app(self, priority: Priority = Priority.normal) -> GithubSession:
+        return GithubSession(self, None, priority)
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = self.breakers[host] = CircuitBreaker(
+                host,
+                threshold=self.breaker_threshold,
+                cooldown=self.breaker_cooldown)
+        return breaker
+
+    def installation(self, account: str,
+                     priority: Priority = Priority.normal) -> GithubSession:
+        return GithubSession(self, account, priority)
+
+    async def installation_headers(self, account: str) -> Dict[str, str]:
+        """Auth headers for account, rebuilt when the installation token rotates."""
+        # Issuing a token unblocks requests of any priority, so may spend the
+        # reserve held for final updates.
+        access_token = await self.identity.installation_token_for(
+            account, session=self.app(Priority.final))
+        if access_token is None:
+            raise ValueError(
+                f"Unable to resolve installation for owner: {account}")
+
+        token, headers = self._installation_headers.get(account, (None, None))
+        if token != access_token["token"]:
+            token = access_token["token"]
+            headers = {
+                "Authorization": f"token {token}",
+                "Accept": "application/vnd.github.machine-man-preview+json"
+            }
+            self._installation_headers[account] = (token, headers)
+
+        return headers
+
+    def stats(self) -> dict:
+        return dict(
+            scheduler=self.scheduler.stats(),
+            etags=self.etags.stats(),
+            retried=self.retried,
+            skipped=self.skipped,
+            breakers={
+                host: breaker.stats()
+                for host, breaker in self.breakers.items()
+            },
+        )
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self) -> "GithubClient":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
@@ -0,0 +1,117 @@
+from typing import Dict
+
+import os
+import time
+import socket
+import asyncio
+import logging
+
+import attr
+
+from .identity import AppIdentity
+from .gitcredentials import credential_helper, credential_eraser
+from .credentialclient import RESPONSE_OK
+
+logger = logging.getLogger(__name__)
+
+
+@attr.s(auto_attribs=True)
+class CredentialBroker:
+    """Long-lived git-credential server on a unix socket.
+
+    Serves `get` and `erase` requests from `credentialclient`, holding
+    installation tokens in process. Tokens for accounts requested within
+    `warm_for` seconds are reissued in the background as they approach
+    expiry, so requests are served from cache.
+    """
+    identity: AppIdentity
+    path: str
+
+    refresh_interval: float = 60
+    warm_for: float = 60 * 60
+
+    served: int = 0
+    accounts: Dict[str, float] = attr.ib(
+        default=attr.Factory(dict), repr=False)
+
+    async def token_for(self, account: str):
+        self.accounts[account] = time.monotonic()
+        return await self.identity.installation_token(account)
+
+    async def handle(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter):
+        try:
+            operation, _, credential_input = (
+                await reader.read()).decode().partition("\n")
+            logger.debug("operation: %s", operation)
+
+            if operation == "get":
+                output = await credential_helper(
+                    credential_input, self.token_for)
+            elif operation == "erase":
+                credential_eraser(
+                    credential_input, self.identity.evict_installation_token)
+                output = ""
+            else:
+                raise ValueError("Unknown operation: %r" % operation)
+
+            self.served += 1
+            writer.write((RESPONSE_OK + output).encode())
+            await writer.drain()
+        except Exception:
+            logger.exception("Error handling credential request.")
+        finally:
+            writer.close()
+
+    async def keep_warm(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+
+            now = time.monotonic()
+            for account, last in list(self.accounts.items()):
+                if now - last > self.warm_for:
+                    del self.accounts[account]
+                    continue
+
+                try:
+                    await self.identity.installation_token_for(account)
+                except Exception:
+                    logger.exception("Error refreshing token: %s", account)
+
+    def _bind(self) -> socket.socket:
+        """Unix socket bound at `path`, accessible only by the owner.
+
+        Bound under a restrictive umask, so the socket is never reachable by
+        other users, and then chmod-ed regardless of the filesystem.
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            umask = os.umask(0o177)
+            try:
+                sock.bind(self.path)
+            finally:
+                os.umask(umask)
+            os.chmod(self.path, 0o600)
+        except BaseException:
+            sock.close()
+            raise
+        return sock
+
+    async def serve_forever(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        server = await asyncio.start_unix_server(
+            self.handle, sock=self._bind())
+        logger.info("Serving credentials on: %s", self.path)
+
+        warm = asyncio.ensure_future(self.keep_warm())
+        try:
+            # Serve until cancelled.
+            await asyncio.Event().wait()
+        finally:
+            warm.cancel()
+            server.close()
+            await server.wait_closed()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
@@ -0,0 +1,73 @@
+"""Thin git-credential client for the `ghapp credential serve` broker.
+
+Imports only the standard library, so `git-credential-github-app-auth get`
+skips app startup when a broker is listening on
+`$GITHUB_APP_AUTH_CREDENTIAL_SOCKET`, and falls back to the in-process
+`ghapp.cli` implementation otherwise.
+"""
+from typing import List, Optional
+
+import io
+import os
+import sys
+import socket
+
+SOCKET_ENV_VAR = "GITHUB_APP_AUTH_CREDENTIAL_SOCKET"
+
+# Broker responses are prefixed by a status line.
+RESPONSE_OK = "ok\n"
+
+BROKER_OPERATIONS = ("get", "erase")
+
+
+class BrokerUnavailable(Exception):
+    pass
+
+
+def request(path: str, operation: str, credential_input: str,
+            timeout: float = 30.0) -> str:
+    """Send git-credential operation to broker at path, returning output."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            sock.sendall(("%s\n%s" % (operation, credential_input)).encode())
+            sock.shutdown(socket.SHUT_WR)
+
+            chunks = []
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+    except OSError as ex:
+        raise BrokerUnavailable(ex)
+
+    response = b"".join(chunks).decode()
+    if not response.startswith(RESPONSE_OK):
+        raise BrokerUnavailable("broker error: %r" % response)
+
+    return response[len(RESPONSE_OK):]
+
+
+def main(argv: Optional[List[str]] = None):
+    """`git-credential-github-app-auth` entry point, preferring the broker."""
+    if argv is None:
+        argv = sys.argv[1:]
+
+    path = os.getenv(SOCKET_ENV_VAR)
+    if path and len(argv) == 1 and argv[0] in BROKER_OPERATIONS:
+        credential_input = sys.stdin.read()
+        try:
+            output = request(path, argv[0], credential_input)
+        except BrokerUnavailable as ex:
+            if os.getenv("GITHUB_APP_AUTH_DEBUG"):
+                sys.stderr.write("credential broker unavailable: %s\n" % ex)
+            sys.stdin = io.StringIO(credential_input)
+        else:
+            if output:
+                sys.stdout.write(output + "\n")
+            return
+
+    from ..cli import credential
+    credential(args=argv, prog_name="git-credential-github-app-auth")
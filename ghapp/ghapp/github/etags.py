@@ -0,0 +1,56 @@
+from typing import Any, Hashable, Optional, Tuple
+
+import logging
+
+import attr
+
+from ..cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+@attr.s(auto_attribs=True)
+class ETagCache:
+    """Bounded cache of GET responses by ETag, for conditional requests.
+
+    Holds up to `maxsize` raw responses, keyed by installation and url, and
+    up to `maxbytes` of response bodies, evicting least-recently-used.
+    `not_modified` counts responses served from the cache on a 304, which do
+    not count against the rate limit.
+    """
+    maxsize: int = 1024
+    maxbytes: int = 32 * 1024 * 1024
+
+    not_modified: int = 0
+
+    entries: LRUCache = attr.ib(default=None, repr=False)
+
+    def __attrs_post_init__(self):
+        if self.entries is None:
+            self.entries = LRUCache(
+                maxsize=self.maxsize,
+                weigh=lambda entry: entry[2],
+                maxweight=self.maxbytes)
+
+    def get(self, key: Hashable) -> Optional[Tuple[str, Any]]:
+        """Cached (etag, value) for key, or None."""
+        entry = self.entries.get(key)
+        return entry[:2] if entry is not None else None
+
+    def put(self, key: Hashable, etag: Optional[str], value: Any,
+            nbytes: int = 0):
+        """Cache value, of `nbytes` bytes, under etag, or drop key if None."""
+        if etag is None:
+            self.entries.pop(key)
+        else:
+            self.entries.put(key, (etag, value, nbytes))
+
+    def stats(self) -> dict:
+        return dict(
+            entries=len(self.entries),
+            maxsize=self.maxsize,
+            bytes=self.entries.weight,
+            maxbytes=self.maxbytes,
+            not_modified=self.not_modified,
+            hit_rate=self.entries.hit_rate,
+        )
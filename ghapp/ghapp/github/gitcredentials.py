@@ -1,5 +1,5 @@
 import logging
-from typing import Callable, Awaitable
+from typing import Callable, Awaitable, Dict, Optional
 from .identity import AppIdentity
 
 import aiohttp
@@ -7,26 +7,39 @@ import aiohttp
 logger = logging.getLogger(__name__)
 
 
-async def credential_helper(credential_input: str,
-                      get_token_for_account: Callable[[str], Awaitable[str]]) -> str:
-    logger.info("credential_input: %s", credential_input)
-
+def parse_credential_input(credential_input: str) -> Dict[str, str]:
     cvals = dict(l.strip().split("=", 1) for l in credential_input.split("\n")
                  if l.strip())
     logger.debug("cvals: %s", cvals)
+    return cvals
+
 
+def credential_account(cvals: Dict[str, str]) -> Optional[str]:
+    """Resolve target github account of git-credential input, if any."""
     if not cvals.get("host", None) == "github.com":
         logger.debug("Host does not match github.com")
-        return credential_input
+        return None
     if not cvals.get("protocol", "").startswith("http"):
         logger.debug("Protocol does not match http*")
-        return credential_input
+        return None
 
     if not cvals.get("path", ""):
         logger.debug("Not path provided.")
+        return None
+
+    return cvals.get("path", "").split("/")[0]
+
+
+async def credential_helper(credential_input: str,
+                      get_token_for_account: Callable[[str], Awaitable[str]]) -> str:
+    logger.info("credential_input: %s", credential_input)
+
+    cvals = parse_credential_input(credential_input)
+
+    account = credential_account(cvals)
+    if not account:
         return credential_input
 
-    account = cvals.get("path", "").split("/")[0]
     token = await get_token_for_account(account)
     if not token:
         return credential_input
@@ -35,3 +48,13 @@ async def credential_helper(credential_input: str,
     cvals["password"] = token
 
     return "\n".join("=".join(i) for i in cvals.items())
+
+
+def credential_eraser(credential_input: str,
+                      evict_token_for_account: Callable[[str], None]):
+    """Evict rejected credentials, git calls `erase` after an auth failure."""
+    cvals = parse_credential_input(credential_input)
+
+    account = credential_account(cvals)
+    if account and cvals.get("username") == "x-access-token":
+        evict_token_for_account(account)
@@ -1,16 +1,40 @@
-from typing import Optional, Union, Dict
+from typing import (Optional, Union, Dict, List, Any, Tuple, Awaitable,
+                    Callable, TYPE_CHECKING)
 
 import os
 import time
+import asyncio
 import logging
+import concurrent.futures
 
 import attr
 import jwt
 
 import aiohttp
 
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+
+from .tokens import TokenCache, InstallationIndex
+from .tokenstore import FileTokenStore
+from ..singleflight import SingleFlight
+
+if TYPE_CHECKING:
+    from .client import GithubSession
+
 logger = logging.getLogger(__name__)
 
+# App JWTs are valid for at most 10 minutes, and are reissued 1 minute early.
+JWT_LIFETIME = 10 * 60
+JWT_REFRESH_MARGIN = 60
+
+
+@attr.s(auto_attribs=True)
+class SigningState:
+    """Parsed private key and most recently signed (jwt, expiry) pair."""
+    key: Any = None
+    signed: Optional[Tuple[str, float]] = None
+
 
 @attr.s(frozen=True)
 class AppIdentity:
@@ -21,10 +45,23 @@ class AppIdentity:
     `GITHUB_APP_AUTH_KEY` environment variable.  Both the id and key may be
     provided as the target value *or* a path in the local filesystem containing
     the value.
+
+    The private key is parsed once and signed app JWTs are reused until
+    shortly before expiry. The async interface, `ajwt` and `aapp_headers`,
+    parses and signs in `executor`, a thread pool by default, rather than
+    blocking the event loop.
+
+    Installation access tokens are cached per-account until shortly before
+    expiry, see `TokenCache`, and installation ids are resolved via direct
+    org/user lookup into a bounded `InstallationIndex`. If a token cache
+    path is provided, or set via `GITHUB_APP_AUTH_TOKEN_CACHE`, tokens are
+    also shared between processes via a `FileTokenStore`. Concurrent lookups
+    for an account are coalesced into a single request, see `SingleFlight`.
     """
 
     APP_ID_ENV_VAR = "GITHUB_APP_AUTH_ID"
     PRIVATE_KEY_ENV_VAR = "GITHUB_APP_AUTH_KEY"
+    TOKEN_CACHE_ENV_VAR = "GITHUB_APP_AUTH_TOKEN_CACHE"
 
     @staticmethod
     def _resolve_app_id(app_id: Optional[Union[int, str]] = None):
@@ -70,6 +107,23 @@ class AppIdentity:
         logger.info("Resolved private key.")
         return private_key
 
+    @staticmethod
+    def _resolve_token_store(
+            token_store: Optional[Union[str, FileTokenStore]] = None
+    ) -> Optional[FileTokenStore]:
+        """Resolve token store from path, falling back to `GITHUB_APP_AUTH_TOKEN_CACHE`."""
+        if token_store is None:
+            token_store = os.getenv(AppIdentity.TOKEN_CACHE_ENV_VAR)
+            if not token_store:
+                return None
+            logger.info("Resolved %s to token cache: %s",
+                        AppIdentity.TOKEN_CACHE_ENV_VAR, token_store)
+
+        if isinstance(token_store, str):
+            token_store = FileTokenStore(token_store)
+
+        return token_store
+
     app_id: int = attr.attrib(
         converter=_resolve_app_id.__func__,
         default=attr.Factory(lambda: AppIdentity._resolve_app_id()))
@@ -77,45 +131,261 @@ class AppIdentity:
         repr=False,
         converter=_resolve_key.__func__,
         default=attr.Factory(lambda: AppIdentity._resolve_key()))
+    token_cache: TokenCache = attr.attrib(
+        repr=False, eq=False, default=attr.Factory(TokenCache))
+    installation_index: InstallationIndex = attr.attrib(
+        repr=False, eq=False, default=attr.Factory(InstallationIndex))
+    signing: SigningState = attr.attrib(
+        repr=False, eq=False, default=attr.Factory(SigningState))
+    executor: Optional[concurrent.futures.Executor] = attr.attrib(
+        repr=False, eq=False, default=None)
+    token_store: Optional[FileTokenStore] = attr.attrib(
+        repr=False, eq=False, default=None,
+        converter=_resolve_token_store.__func__)
+    inflight: SingleFlight = attr.attrib(
+        repr=False, eq=False, default=attr.Factory(SingleFlight))
+
+    def signing_key(self):
+        """Parsed private key, loaded on first use."""
+        if self.signing.key is None:
+            logger.debug("Loading private key.")
+            self.signing.key = serialization.load_pem_private_key(
+                self.private_key.encode(),
+                password=None,
+                backend=default_backend())
 
-    def jwt(self) -> str:
+        return self.signing.key
+
+    def jwt(self, reuse: bool = True) -> str:
         """Generate JWT token for the app identity.
 
+        Returns the previously signed token while it has more than
+        `JWT_REFRESH_MARGIN` seconds remaining, unless `reuse` is False.
+
         See:
             https://developer.github.com/apps/building-github-apps/authenticating-with-github-apps/#authenticating-as-an-installation
         """
         issue_time = int(time.time())
+
+        signed = self.signing.signed
+        if reuse and signed and signed[1] - JWT_REFRESH_MARGIN > issue_time:
+            return signed[0]
+
         payload = dict(
-            iat=issue_time, exp=issue_time + (10 * 60), iss=self.app_id)
+            iat=issue_time, exp=issue_time + JWT_LIFETIME, iss=str(self.app_id))
 
         logging.debug("Issuing app jwt: %s", payload)
 
-        return jwt.encode(
-            payload, self.private_key, algorithm='RS256').decode()
+        token = jwt.encode(payload, self.signing_key(), algorithm='RS256')
+        if isinstance(token, bytes):
+            token = token.decode()
+
+        self.signing.signed = (token, payload["exp"])
+        return token
+
+    async def ajwt(self, reuse: bool = True) -> str:
+        """Generate JWT token for the app identity, signing in `executor`."""
+        signed = self.signing.signed
+        if reuse and signed and signed[1] - JWT_REFRESH_MARGIN > time.time():
+            return signed[0]
+
+        return await asyncio.get_event_loop().run_in_executor(
+            self.executor, self.jwt, reuse)
 
     def app_headers(self) -> Dict[str, str]:
+        return self._app_headers(self.jwt())
+
+    async def aapp_headers(self) -> Dict[str, str]:
+        return self._app_headers(await self.ajwt())
+
+    @staticmethod
+    def _app_headers(token: str) -> Dict[str, str]:
         return {
-            "Authorization": "Bearer %s" % self.jwt(),
+            "Authorization": "Bearer %s" % token,
             "Accept": "application/vnd.github.machine-man-preview+json"
         }
 
+    async def _app_session(self) -> aiohttp.ClientSession:
+        return aiohttp.ClientSession(headers=await self.aapp_headers())
+
+    @staticmethod
+    def _session_owner(session: Optional[aiohttp.ClientSession]) -> int:
+        """Identity of the owner of `session`, for callers sharing a call.
+
+        Shared calls run on the first caller's session, so are only shared by
+        callers whose session outlives that caller: GithubClient sessions are
+        owned by their client, and calls without a session open their own.
+        """
+        return id(getattr(session, "client", session))
+
+    async def installation_id_for(
+            self, account: str,
+            session: Optional[aiohttp.ClientSession] = None) -> Optional[int]:
+        """Resolve installation id for account, or None if not installed.
+
+        Resolves via the org, and then user, installation of the account.
+        """
+        installation_id = self.installation_index.get(account)
+        if installation_id is not None:
+            return installation_id
+        if self.installation_index.is_missing(account):
+            logger.debug("No installation for: %s (cached)", account)
+            return None
+
+        return await self.inflight.do(
+            ("installation", account, self._session_owner(session)),
+            lambda: self._lookup_installation_id(account, session))
+
+    async def _lookup_installation_id(
+            self, account: str,
+            session: Optional[aiohttp.ClientSession]) -> Optional[int]:
+        if session is None:
+            async with await self._app_session() as session:
+                return await self._lookup_installation_id(account, session)
+
+        installation_id = None
+
+        #https://developer.github.com/v3/apps/#find-organization-installation
+        lookup_urls = [
+            f"https://api.github.com/orgs/{account}/installation",
+            f"https://api.github.com/users/{account}/installation",
+        ]
+
+        for url in lookup_urls:
+            async with session.get(url) as resp:
+                if resp.status == 404:
+                    continue
+                resp.raise_for_status()
+                installation_id = (await resp.json())["id"]
+                break
+
+        logger.info("Resolved installation: %s id: %s",
+                    account, installation_id)
+        self.installation_index.put(account, installation_id)
+
+        return installation_id
+
+    async def installations(
+            self, session: Optional["GithubSession"] = None) -> List[dict]:
+        """List all app installations, walking all pages of the listing.
+
+        Pages are revalidated by ETag via a GithubClient app `session`, or
+        fetched on a new app session if not provided.
+        """
+        if session is not None:
+            return await self._list_installations(
+                lambda url: session.cached_get(
+                    url, self._parse_installations_page))
+
+        async with await self._app_session() as app_session:
+
+            async def get_page(url):
+                async with app_session.get(url) as resp:
+                    resp.raise_for_status()
+                    return await self._parse_installations_page(resp)
+
+            return await self._list_installations(get_page)
+
+    async def _list_installations(
+            self, get_page: Callable[[str], Awaitable[Tuple[List[dict],
+                                                             Optional[str]]]]
+    ) -> List[dict]:
+        installations = []
+        url = "https://api.github.com/app/installations?per_page=100"
+        while url:
+            page, url = await get_page(url)
+            installations.extend(page)
+
+        for i in installations:
+            self.installation_index.put(i["account"]["login"], i["id"])
+
+        return installations
+
+    @staticmethod
+    async def _parse_installations_page(
+            resp: aiohttp.ClientResponse) -> Tuple[List[dict], Optional[str]]:
+        next_link = resp.links.get("next")
+        return await resp.json(), str(next_link["url"]) if next_link else None
+
     async def installation_token_for(
             self, account: str,
             session: Optional[aiohttp.ClientSession] = None):
+        """Resolve installation access token for account, or None if not installed.
+
+        Returns the cached or stored token if available, otherwise issues a
+        new token.
+        """
+        access_token = self.token_cache.get(account)
+        if access_token is not None:
+            logger.debug("Using cached token for: %s", account)
+            return access_token
+
+        if self.token_store is not None:
+            # Read in executor, as the store lock may be held by another process.
+            access_token = await asyncio.get_event_loop().run_in_executor(
+                self.executor, self.token_store.get,
+                self._token_store_key(account))
+            if access_token is not None:
+                self.token_cache.put(account, access_token)
+                return access_token
+
+        return await self.inflight.do(
+            ("token", account, self._session_owner(session)),
+            lambda: self._resolve_installation_token(account, session))
+
+    async def _resolve_installation_token(
+            self, account: str, session: Optional[aiohttp.ClientSession]):
         if session is None:
-            async with aiohttp.ClientSession(
-                    headers=self.app_headers(), ) as session:
-                return await self.installation_token_for(account, session)
+            async with await self._app_session() as session:
+                return await self._resolve_installation_token(
+                    account, session)
 
-        async with session.get(
-                'https://api.github.com/app/installations') as resp:
-            resp.raise_for_status()
-            installations = await resp.json()
+        if self.token_store is None:
+            access_token = await self._issue_installation_token(
+                account, session)
+        else:
+            access_token = await self._issue_stored_installation_token(
+                account, session)
+
+        if access_token is not None:
+            self.token_cache.put(account, access_token)
+        return access_token
+
+    def _token_store_key(self, account: str) -> str:
+        return f"{self.app_id}/{account}"
+
+    async def _issue_stored_installation_token(
+            self, account: str, session: aiohttp.ClientSession):
+        """Issue and store a token, unless another process has stored one.
+
+        The store lock is held to re-check and to write, but not across the
+        token request.
+        """
+        key = self._token_store_key(account)
+
+        lock = self.token_store.lock(shared=True)
+        await lock.acquire_async(self.executor)
+        try:
+            access_token = self.token_store.get_locked(key)
+        finally:
+            lock.release()
+        if access_token is not None:
+            return access_token
 
-        installation_id = {
-            i["account"]["login"]: i["id"]
-            for i in installations
-        }.get(account)
+        access_token = await self._issue_installation_token(account, session)
+        if access_token is not None:
+            lock = self.token_store.lock()
+            await lock.acquire_async(self.executor)
+            try:
+                self.token_store.put_locked(key, access_token)
+            finally:
+                lock.release()
+
+        return access_token
+
+    async def _issue_installation_token(
+            self, account: str, session: aiohttp.ClientSession):
+        installation_id = await self.installation_id_for(account, session)
 
         if installation_id is None:
             return None
@@ -124,9 +394,33 @@ class AppIdentity:
                      f"/app/installations/{installation_id}/access_tokens")
 
         async with session.post(token_url) as resp:
+            if resp.status == 404:
+                # Installation removed since index lookup.
+                self.installation_index.evict(account)
             resp.raise_for_status()
             return await resp.json()
 
+    async def installation_token(self, account: str) -> Optional[str]:
+        """Resolve installation access token string for account."""
+        access_token = await self.installation_token_for(account)
+        if access_token is None:
+            return None
+
+        return access_token["token"]
+
+    def evict_installation_token(self, account: str):
+        """Drop cached token for account, eg. after a 401 response."""
+        self.token_cache.evict(account)
+        if self.token_store is not None:
+            self.token_store.evict(self._token_store_key(account))
+
+    def stats(self) -> dict:
+        return dict(
+            tokens=self.token_cache.stats(),
+            installations=self.installation_index.stats(),
+            inflight=self.inflight.stats(),
+        )
+
     async def installation_headers(self, account: str) -> Dict[str, str]:
         access_token = await self.installation_token_for(account)
         if access_token is None:
@@ -0,0 +1,207 @@
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+import time
+import enum
+import heapq
+import asyncio
+import logging
+import itertools
+import email.utils
+
+import attr
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Delay after a secondary rate limit response without `Retry-After`.
+#https://developer.github.com/v3/#abuse-rate-limits
+SECONDARY_LIMIT_DELAY = 60
+
+
+class Priority(enum.IntEnum):
+    """Request lanes, lower values are sent first."""
+    final = 0
+    normal = 1
+    progress = 2
+
+
+def is_rate_limited(resp: aiohttp.ClientResponse, message: str = "") -> bool:
+    """Whether `resp` is a rate limit response.
+
+    Secondary rate limits may be reported by a 403 without rate limit
+    headers, identified by the response's error `message`.
+    """
+    if resp.status == 429:
+        return True
+
+    return resp.status == 403 and (
+        "Retry-After" in resp.headers
+        or resp.headers.get("X-RateLimit-Remaining") == "0"
+        or "rate limit" in message.lower())
+
+
+async def rate_limit_message(resp: aiohttp.ClientResponse) -> str:
+    """Error message of a 403 response, empty for other responses."""
+    if resp.status != 403:
+        return ""
+    try:
+        body = await resp.json(content_type=None)
+    except (ValueError, aiohttp.ClientError):
+        return ""
+    return str(body.get("message", "")) if isinstance(body, dict) else ""
+
+
+def retry_after(value: str, now: float) -> Optional[float]:
+    """Delay of a `Retry-After` header in seconds or HTTP-date form."""
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - now,
+                   0)
+    except (TypeError, ValueError):
+        logger.warning("Ignoring invalid Retry-After: %r", value)
+        return None
+
+
+@attr.s(auto_attribs=True)
+class Budget:
+    """Rate limit state of an installation, from github response headers."""
+    limit: Optional[int] = None
+    remaining: Optional[int] = None
+    reset: float = 0.0
+    blocked_until: float = 0.0
+
+    queue: List[Tuple[int, int, asyncio.Future]] = attr.ib(
+        default=attr.Factory(list), repr=False)
+    draining: Optional[asyncio.Future] = attr.ib(default=None, repr=False)
+
+    def allows(self, priority: Priority, reserve: int, now: float) -> bool:
+        if now < self.blocked_until:
+            return False
+        if self.remaining is None or now >= self.reset:
+            return True
+        if self.remaining <= 0:
+            return False
+        if self.remaining <= reserve:
+            return priority == Priority.final
+        return True
+
+    def wait_time(self, now: float) -> float:
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        return max(self.reset - now, 0)
+
+    def take(self, now: float):
+        if now >= self.reset:
+            # Budget replenished, unknown until the next response.
+            self.remaining = None
+        elif self.remaining is not None:
+            self.remaining -= 1
+
+
+@attr.s(auto_attribs=True)
+class OutboundScheduler:
+    """Schedules outbound requests against per-installation rate limits.
+
+    Tracks each installation's budget from `X-RateLimit-*` response headers.
+    Once the remaining budget falls to `reserve` only `Priority.final`
+    requests are sent, and when exhausted, or blocked by a `Retry-After` or
+    secondary rate limit, requests queue until the budget resets and are
+    then released in priority order.
+    """
+    reserve: int = 100
+    clock: Callable[[], float] = time.time
+
+    budgets: Dict[Hashable, Budget] = attr.ib(
+        default=attr.Factory(dict), repr=False)
+    _seq: "itertools.count" = attr.ib(
+        default=attr.Factory(itertools.count), repr=False)
+
+    async def acquire(self, key: Hashable,
+                      priority: Priority = Priority.normal):
+        budget = self.budgets.setdefault(key, Budget())
+
+        # Requests may pass lower priority queued requests.
+        ahead = budget.queue and budget.queue[0][0] <= priority
+        if not ahead and budget.allows(priority, self.reserve, self.clock()):
+            budget.take(self.clock())
+            return
+
+        logger.info("Queuing %s request for: %s budget: %s",
+                    priority.name, key, budget)
+        waiter = asyncio.get_event_loop().create_future()
+        heapq.heappush(budget.queue, (priority, next(self._seq), waiter))
+        if budget.draining is None or budget.draining.done():
+            budget.draining = asyncio.ensure_future(self._drain(budget))
+
+        await waiter
+
+    async def _drain(self, budget: Budget):
+        while budget.queue:
+            priority, _, waiter = budget.queue[0]
+            if waiter.done():
+                # Cancelled waiter.
+                heapq.heappop(budget.queue)
+                continue
+
+            now = self.clock()
+            if budget.allows(Priority(priority), self.reserve, now):
+                heapq.heappop(budget.queue)
+                budget.take(now)
+                waiter.set_result(None)
+                continue
+
+            await asyncio.sleep(max(budget.wait_time(now), .01))
+
+    def update(self, key: Hashable, resp: aiohttp.ClientResponse,
+               message: str = "") -> bool:
+        """Update budget from response headers, returning if rate limited.
+
+        `message` is the error message of the response, see `is_rate_limited`.
+        """
+        budget = self.budgets.setdefault(key, Budget())
+        headers = resp.headers
+        now = self.clock()
+
+        if "X-RateLimit-Limit" in headers:
+            budget.limit = int(headers["X-RateLimit-Limit"])
+        if "X-RateLimit-Remaining" in headers:
+            budget.remaining = int(headers["X-RateLimit-Remaining"])
+        if "X-RateLimit-Reset" in headers:
+            budget.reset = float(headers["X-RateLimit-Reset"])
+
+        if not is_rate_limited(resp, message):
+            return False
+
+        delay = None
+        if "Retry-After" in headers:
+            delay = retry_after(headers["Retry-After"], now)
+
+        if delay is not None:
+            blocked_until = now + delay
+        elif budget.remaining == 0 and budget.reset > now:
+            blocked_until = budget.reset
+        else:
+            blocked_until = now + SECONDARY_LIMIT_DELAY
+
+        logger.warning("Rate limited: %s for %.0fs", key, blocked_until - now)
+        budget.blocked_until = max(budget.blocked_until, blocked_until)
+        return True
+
+    def stats(self) -> dict:
+        now = self.clock()
+        return dict(
+            queued=sum(len(b.queue) for b in self.budgets.values()),
+            budgets={
+                str(key): dict(
+                    limit=b.limit,
+                    remaining=b.remaining,
+                    reset_in=max(b.reset - now, 0),
+                    blocked_for=max(b.blocked_until - now, 0),
+                    queued=len(b.queue),
+                )
+                for key, b in self.budgets.items()
+            },
+        )
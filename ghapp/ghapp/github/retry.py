@@ -0,0 +1,91 @@
+from typing import Callable, Optional
+
+import time
+import random
+import logging
+
+import attr
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Responses indicating github is degraded, rather than a request error.
+RETRY_STATUSES = frozenset((500, 502, 503, 504))
+
+# Methods safe to resend after a failure with unknown outcome.
+IDEMPOTENT_METHODS = frozenset(
+    ("GET", "HEAD", "OPTIONS", "PUT", "PATCH", "DELETE"))
+
+
+class CircuitOpenError(aiohttp.ClientError):
+    """Request failed fast, without sending, while its host is degraded."""
+
+
+@attr.s(auto_attribs=True)
+class RetryPolicy:
+    """Retry limits for transient failures, with full-jitter exponential backoff."""
+    attempts: int = 4
+    backoff: float = 0.5
+    max_backoff: float = 10.0
+    random: Callable[[], float] = random.random
+
+    def delay(self, attempt: int) -> float:
+        """Delay before the retry following `attempt`, counting from zero."""
+        return self.random() * min(self.max_backoff, self.backoff * 2**attempt)
+
+
+@attr.s(auto_attribs=True)
+class CircuitBreaker:
+    """Fails requests to a host fast after consecutive failures.
+
+    Opens after `threshold` consecutive failures. While open requests raise
+    `CircuitOpenError`, except for a single probe request allowed through
+    each `cooldown` seconds. A successful response closes the circuit.
+    """
+    host: str
+    threshold: int = 5
+    cooldown: float = 30.0
+    clock: Callable[[], float] = time.monotonic
+
+    failures: int = 0
+    opened_at: Optional[float] = None
+    rejected: int = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def check(self):
+        """Raise `CircuitOpenError` unless a request may be sent."""
+        if self.opened_at is None:
+            return
+
+        now = self.clock()
+        if now - self.opened_at >= self.cooldown:
+            logger.info("Probing degraded host: %s", self.host)
+            self.opened_at = now
+            return
+
+        self.rejected += 1
+        raise CircuitOpenError(f"Circuit open for host: {self.host}")
+
+    def success(self):
+        if self.opened_at is not None:
+            logger.warning("Closing circuit for host: %s", self.host)
+        self.failures = 0
+        self.opened_at = None
+
+    def failure(self):
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.threshold:
+            if self.opened_at is None:
+                logger.warning("Opening circuit for host: %s after %s failures",
+                               self.host, self.failures)
+            self.opened_at = self.clock()
+
+    def stats(self) -> dict:
+        return dict(
+            open=self.is_open,
+            failures=self.failures,
+            rejected=self.rejected,
+        )
@@ -0,0 +1,120 @@
+from typing import Optional, Callable
+
+import time
+import datetime
+import logging
+
+import attr
+
+from ..cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Installation tokens are issued with a one hour lifetime.
+#https://developer.github.com/apps/building-github-apps/authenticating-with-github-apps/#authenticating-as-an-installation
+TOKEN_LIFETIME = 60 * 60
+
+
+def parse_timestamp(timestamp: str) -> float:
+    """Parse a github ISO 8601 UTC timestamp, eg. "2016-07-11T22:14:10Z"."""
+    return datetime.datetime.strptime(
+        timestamp, "%Y-%m-%dT%H:%M:%SZ").replace(
+            tzinfo=datetime.timezone.utc).timestamp()
+
+
+def token_expiry(access_token: dict, issued: Optional[float] = None) -> float:
+    """Resolve access token expiry time, falling back to the default lifetime."""
+    if access_token.get("expires_at"):
+        return parse_timestamp(access_token["expires_at"])
+
+    if issued is None:
+        issued = time.time()
+    return issued + TOKEN_LIFETIME
+
+
+@attr.s(auto_attribs=True)
+class TokenCache:
+    """In-process cache of installation access tokens, keyed by account.
+
+    Tokens are held until `refresh_margin` seconds before their `expires_at`,
+    so that callers receive a token with a useful remaining lifetime and
+    refresh early rather than racing expiry.
+    """
+    refresh_margin: float = 5 * 60
+    maxsize: int = 256
+    clock: Callable[[], float] = time.time
+
+    tokens: LRUCache = attr.ib(default=None, repr=False)
+
+    def __attrs_post_init__(self):
+        if self.tokens is None:
+            self.tokens = LRUCache(maxsize=self.maxsize, clock=self.clock)
+
+    def get(self, account: str) -> Optional[dict]:
+        return self.tokens.get(account)
+
+    def put(self, account: str, access_token: dict):
+        now = self.clock()
+        ttl = token_expiry(access_token, issued=now) - self.refresh_margin - now
+
+        if ttl <= 0:
+            logger.info("Not caching near-expiry token for: %s", account)
+            return
+
+        logger.debug("Caching token for: %s ttl: %.0fs", account, ttl)
+        self.tokens.put(account, access_token, ttl=ttl)
+
+    def evict(self, account: str):
+        logger.info("Evicting token for: %s", account)
+        self.tokens.pop(account)
+
+    def stats(self) -> dict:
+        return self.tokens.stats()
+
+
+@attr.s(auto_attribs=True)
+class InstallationIndex:
+    """Bounded account to installation id index.
+
+    Accounts without an installation are negatively cached for `missing_ttl`
+    seconds, so repeated lookups for unknown accounts do not each cost a
+    round trip while still picking up new installations.
+    """
+    maxsize: int = 1024
+    missing_ttl: float = 5 * 60
+    clock: Callable[[], float] = time.monotonic
+
+    installations: LRUCache = attr.ib(default=None, repr=False)
+    missing: LRUCache = attr.ib(default=None, repr=False)
+
+    def __attrs_post_init__(self):
+        if self.installations is None:
+            self.installations = LRUCache(
+                maxsize=self.maxsize, clock=self.clock)
+        if self.missing is None:
+            self.missing = LRUCache(
+                maxsize=self.maxsize, ttl=self.missing_ttl, clock=self.clock)
+
+    def get(self, account: str) -> Optional[int]:
+        return self.installations.get(account)
+
+    def is_missing(self, account: str) -> bool:
+        return account in self.missing
+
+    def put(self, account: str, installation_id: Optional[int]):
+        if installation_id is None:
+            self.installations.pop(account)
+            self.missing.put(account, True)
+        else:
+            self.missing.pop(account)
+            self.installations.put(account, installation_id)
+
+    def evict(self, account: str):
+        self.installations.pop(account)
+        self.missing.pop(account)
+
+    def stats(self) -> dict:
+        return dict(
+            installations=self.installations.stats(),
+            missing=len(self.missing),
+        )
@@ -0,0 +1,141 @@
+from typing import Optional, Dict
+
+import os
+import asyncio
+import concurrent.futures
+import json
+import time
+import fcntl
+import logging
+import tempfile
+
+import attr
+
+from .tokens import token_expiry
+
+logger = logging.getLogger(__name__)
+
+
+@attr.s(auto_attribs=True)
+class FileLock:
+    """Advisory `flock` on a lock file, shared or exclusive."""
+    path: str
+    shared: bool = False
+    fd: Optional[int] = attr.ib(default=None, repr=False)
+
+    def acquire(self):
+        assert self.fd is None
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        except BaseException:
+            os.close(fd)
+            raise
+        self.fd = fd
+
+    async def acquire_async(
+            self, executor: Optional[concurrent.futures.Executor] = None):
+        """Acquire in `executor`, releasing if cancelled once acquired."""
+        acquiring = asyncio.get_event_loop().run_in_executor(
+            executor, self.acquire)
+        try:
+            # Shielded, so the lock can be released when the thread acquires
+            # it after the waiting task is cancelled.
+            await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            acquiring.add_done_callback(
+                lambda f: f.exception() is None and self.release())
+            raise
+
+    def release(self):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+@attr.s(auto_attribs=True)
+class FileTokenStore:
+    """Installation token cache shared between processes via a json file.
+
+    Readers take a shared lock, writers an exclusive lock on `<path>.lock`,
+    and the token file is replaced atomically so readers never observe a
+    partial write. Callers minting a token should re-check the store before
+    requesting one, but not hold `lock()` across the request, so a slow or
+    abandoned request never blocks other processes.
+    """
+    path: str
+    refresh_margin: float = 5 * 60
+
+    @property
+    def lock_path(self) -> str:
+        return self.path + ".lock"
+
+    def lock(self, shared: bool = False) -> FileLock:
+        return FileLock(self.lock_path, shared=shared)
+
+    def get(self, key: str) -> Optional[dict]:
+        with self.lock(shared=True):
+            return self.get_locked(key)
+
+    def put(self, key: str, access_token: dict):
+        with self.lock():
+            self.put_locked(key, access_token)
+
+    def evict(self, key: str):
+        with self.lock():
+            tokens = self._load()
+            if tokens.pop(key, None) is not None:
+                self._dump(tokens)
+
+    def get_locked(self, key: str) -> Optional[dict]:
+        access_token = self._load().get(key)
+        if access_token is None or not self._valid(access_token):
+            return None
+
+        logger.debug("Using stored token for: %s", key)
+        return access_token
+
+    def put_locked(self, key: str, access_token: dict):
+        tokens = {
+            k: t
+            for k, t in self._load().items() if self._valid(t)
+        }
+        tokens[key] = access_token
+        self._dump(tokens)
+
+    def _valid(self, access_token: dict) -> bool:
+        if not access_token.get("expires_at"):
+            return False
+        return token_expiry(access_token) - self.refresh_margin > time.time()
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, "r") as inf:
+                return json.load(inf)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            logger.warning("Discarding unreadable token cache: %s", self.path)
+            return {}
+
+    def _dump(self, tokens: Dict[str, dict]):
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(self.path)),
+            prefix=os.path.basename(self.path) + ".")
+        try:
+            with os.fdopen(fd, "w") as outf:
+                json.dump(tokens, outf)
+                outf.flush()
+                os.fsync(outf.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -8,7 +8,10 @@ import attr
 
 from aiohttp import web
 
+from ..dedup import DeliveryDedup
+from ..payload import BodyTooLarge, parse_body, read_body, resolve_max_body
 from ..signalset import SignalSet
+from ..workqueue import WorkQueue
 
 logger = logging.getLogger(__name__)
 
@@ -46,28 +49,69 @@ class GithubHooks:
         default=attr.Factory(lambda: GithubHooks._resolve_secret()))
 
     signals: SignalSet = attr.Factory(SignalSet)
+    # Handles signals in the background if given, otherwise before responding.
+    work: Optional[WorkQueue] = None
+    # Drops redelivered webhooks if given.
+    dedup: Optional[DeliveryDedup] = None
+    # Rejects larger bodies, resolved from `GHAPP_MAX_WEBHOOK_BYTES`.
+    max_body: int = attr.ib(converter=resolve_max_body, default=None)
+
+    async def read_verified(
+            self, req: web.Request) -> Union[bytes, web.Response]:
+        """Read the body, verifying its signature, or the rejecting response."""
+        # Get signature, preferring sha256, verified as the body is read
+        for header, digestmod in (("x-hub-signature-256", "sha256"),
+                                  ("x-hub-signature", "sha1")):
+            sig = req.headers.get(header)
+            if sig:
+                logger.debug("%s: %s", header, sig)
+                mac = hmac.new(self.secret, digestmod=digestmod)
+                break
+        else:
+            mac = None
 
-    async def handler(self, req: web.Request):
-        # Get and validate signature
-        sig = req.headers.get('x-hub-signature')
-        if sig:
-            raw_body = await req.read()
-
-            mac = hmac.new(self.secret, msg=raw_body, digestmod='sha1')
-            local_sig = "sha1=" + mac.hexdigest()
+        try:
+            raw_body = await read_body(
+                req, self.max_body, [mac] if mac else [])
+        except BodyTooLarge:
+            return web.Response(status=413, text="webhook body too large")
 
-            logger.info("x-hub-sig: %s", sig)
-            logger.info("payload-sig: %s", local_sig)
+        if mac is not None:
+            local_sig = "%s=%s" % (digestmod, mac.hexdigest())
+            if not hmac.compare_digest(local_sig.encode(), sig.encode()):
+                return web.Response(status=401, text="invalid %s" % header)
 
-            if not sig == local_sig:
-                return web.Response(status=401, text="invalid x-hub-signature")
+        return raw_body
 
-        # Get body and unpack content type
-        logger.info("content-type: %s", req.headers["content-type"])
-        if req.headers["content-type"] == "application/x-www-form-urlencoded":
-            body = (await req.post())["payload"]
-        else:
-            body = await req.json()
+    async def handler(self, req: web.Request):
+        raw_body = await self.read_verified(req)
+        if isinstance(raw_body, web.Response):
+            return raw_body
+
+        # Drop redeliveries before parsing or dispatch
+        key = None
+        if self.dedup is not None:
+            key = self.dedup.key(
+                "github", req.headers.get("x-github-delivery"), raw_body)
+            if self.dedup.is_duplicate(key):
+                return web.Response(status=200, text="duplicate delivery")
+
+        # Forget deliveries that are not accepted, so redeliveries are handled
+        try:
+            resp = await self._dispatch(req, raw_body)
+        except BaseException:
+            if key is not None:
+                self.dedup.forget(key)
+            raise
+        if key is not None and resp.status >= 300:
+            self.dedup.forget(key)
+        return resp
+
+    async def _dispatch(self, req: web.Request,
+                        raw_body: bytes) -> web.Response:
+        # Parse body, unpacking form encoded payloads
+        logger.info("content-type: %s", req.content_type)
+        body = parse_body(req, raw_body)
 
         name = req.headers['x-github-event']
         logger.debug("name: %s", name)
@@ -75,6 +119,12 @@ class GithubHooks:
         signal = self.signals.signals.get(name)
         if signal:
             logger.debug("resolved signals: %s", name)
-            await signal.send(name = name, body=body)
+            if self.work is None:
+                await signal.send(name = name, body=body)
+            elif not await self.work.deliver(
+                    "github", signal.send, name=name, body=body):
+                return web.Response(
+                    status=503, text="webhook queue full",
+                    headers={"Retry-After": "1"})
 
         return web.Response(status=200)
@@ -1,7 +1,7 @@
 import attr
 import datetime
 
-from typing import Optional, Union, List
+from typing import Optional, Union, List, Tuple
 
 from .buildkite import jobs
 from .github import checks
@@ -53,8 +53,10 @@ def buildkite_state_github_conclusion(
 def job_hook_to_check_action(
         job_hook: jobs.JobHook,
         checks_for_commit: List[checks.RunDetails],
+        check_details: Optional[checks.RunDetails] = None,
 ) -> Union[checks.CreateRun, checks.UpdateRun]:
-    check_details = job_to_run_details(job_hook.job)
+    if check_details is None:
+        check_details = job_to_run_details(job_hook.job)
 
     repo = RepoName.parse(job_hook.pipeline.repository)
 
@@ -82,6 +84,21 @@ def job_hook_to_check_action(
     return action
 
 
+JOB_STAGES = ("created_at", "scheduled_at", "started_at", "finished_at")
+
+
+def job_progress(job: jobs.Job) -> Tuple[int, str]:
+    """Sortable progress of a job, as its latest lifecycle stage and time.
+
+    Buildkite timestamps are fixed-width UTC, so sort as strings.
+    """
+    for stage in reversed(range(len(JOB_STAGES))):
+        at = getattr(job, JOB_STAGES[stage])
+        if at is not None:
+            return (stage, at)
+    return (-1, "")
+
+
 def job_to_run_details(job: jobs.Job) -> checks.RunDetails:
     return checks.RunDetails(
         name=job.name,
@@ -0,0 +1,133 @@
+from typing import List, Optional
+
+import os
+import logging
+
+import attr
+import cattr
+
+from .buildkite import jobs
+from .github import checks
+from .github.client import GithubClient
+from .cache import LRUCache
+from .handlers import (
+    RepoName, job_hook_to_check_action, job_progress, job_to_run_details)
+from .runindex import RunIndex
+from .batcher import UpdateBatcher
+from . import workqueue
+
+logger = logging.getLogger(__name__)
+
+
+@attr.s(auto_attribs=True)
+class JobChecks:
+    """Pushes buildkite job webhook events to github check runs.
+
+    Current runs for a job are resolved via the `RunIndex`, querying github
+    only on an index miss. Updates for a job are coalesced over `debounce`
+    seconds, resolved from `GHAPP_CHECK_DEBOUNCE` and defaulting to 2s, so
+    that a short job's events cost a single create or update.
+
+    Updates for a job are applied serially, and events older than the
+    latest seen for their job, by `job_progress`, are dropped so that a
+    delayed `job.started` cannot reopen a finished run.
+    """
+    DEBOUNCE_ENV_VAR = "GHAPP_CHECK_DEBOUNCE"
+
+    @staticmethod
+    def _resolve_debounce(debounce: Optional[float] = None) -> float:
+        if debounce is None:
+            debounce = os.getenv(JobChecks.DEBOUNCE_ENV_VAR, 2.0)
+        return float(debounce)
+
+    github: GithubClient
+    index: RunIndex = attr.Factory(RunIndex)
+    debounce: float = attr.ib(
+        converter=_resolve_debounce.__func__, default=None)
+    progress: LRUCache = attr.Factory(lambda: LRUCache(maxsize=16384))
+    batcher: UpdateBatcher = attr.ib(init=False, repr=False)
+
+    stale: int = 0
+
+    def __attrs_post_init__(self):
+        self.batcher = UpdateBatcher(self.flush, window=self.debounce)
+
+    async def handle_job_hook(self, name: str, body: dict):
+        job_hook = cattr.structure(body, jobs.JobHook)
+        logger.info("%s: %s %s", name, job_hook.job.id, job_hook.job.state)
+
+        progress = job_progress(job_hook.job)
+        latest = self.progress.get(job_hook.job.id)
+        if latest is not None and progress < latest:
+            logger.info("Dropping stale %s: %s %s < %s",
+                        name, job_hook.job.id, progress, latest)
+            self.stale += 1
+            return
+        self.progress.put(job_hook.job.id, progress)
+
+        sent = await self.batcher.submit(
+            job_hook.job.id, job_to_run_details(job_hook.job), job_hook)
+        # The delivery is complete once its debounced update is sent.
+        workqueue.defer(sent)
+
+    async def flush(self, job_id: str, run: checks.RunDetails,
+                    job_hook: jobs.JobHook):
+        await self.push(job_hook, run)
+
+    async def current_runs(self, job_hook: jobs.JobHook,
+                           session) -> List[checks.RunDetails]:
+        sha = job_hook.build.commit
+
+        run_id = self.index.get(sha, job_hook.job.id)
+        if run_id is not None:
+            return [
+                checks.RunDetails(
+                    name=job_hook.job.name,
+                    id=run_id,
+                    external_id=job_hook.job.id)
+            ]
+
+        repo = RepoName.parse(job_hook.pipeline.repository)
+        runs = await checks.GetRuns(
+            owner=repo.owner,
+            repo=repo.repo,
+            ref=sha,
+            check_name=job_hook.job.name,
+        ).execute(session)
+
+        self.index.update(sha, runs)
+        return runs
+
+    async def push(self, job_hook: jobs.JobHook,
+                   run: Optional[checks.RunDetails] = None):
+        if run is None:
+            run = job_to_run_details(job_hook.job)
+
+        repo = RepoName.parse(job_hook.pipeline.repository)
+        session = self.github.installation(
+            repo.owner, priority=checks.run_priority(run))
+
+        action = job_hook_to_check_action(
+            job_hook, await self.current_runs(job_hook, session), run)
+        logger.info("action: %s", action)
+
+        async with action.execute(session) as resp:
+            resp.raise_for_status()
+
+            if isinstance(action, checks.CreateRun):
+                created = await resp.json()
+                self.index.put(
+                    job_hook.build.commit, action.run.external_id,
+                    created["id"])
+
+    async def close(self):
+        await self.batcher.close()
+        await self.github.close()
+
+    def stats(self) -> dict:
+        return dict(
+            run_index=self.index.stats(),
+            updates=self.batcher.stats(),
+            stale=self.stale,
+            github=self.github.stats(),
+        )
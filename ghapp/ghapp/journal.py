@@ -0,0 +1,248 @@
+from typing import Any, List, Optional, Tuple
+
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import collections
+import concurrent.futures
+
+import attr
+
+logger = logging.getLogger(__name__)
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class Delivery:
+    id: int
+    source: str
+    name: str
+    body: Any
+    # Times replayed after a restart.
+    attempts: int = 0
+
+
+@attr.s(auto_attribs=True)
+class DeliveryJournal:
+    """Durable SQLite journal of webhook deliveries pending processing.
+
+    Deliveries are appended before being acknowledged and removed once
+    processed, so unfinished deliveries can be replayed after a restart. The
+    database, at `path` resolved from `GHAPP_JOURNAL`, is written in WAL mode
+    with full sync from a dedicated thread. Appends arriving while a commit is
+    in progress are group committed, amortizing each fsync over a batch.
+
+    Each replay is counted, and deliveries still unfinished after
+    `max_replays` replays are moved to the `dead_deliveries` table rather than
+    replayed again, so a delivery failing on every attempt is not retried on
+    every restart.
+
+    `stats` reports append latency, from append to durable commit, over the
+    most recent `latency_window` appends.
+    """
+    PATH_ENV_VAR = "GHAPP_JOURNAL"
+
+    @staticmethod
+    def _resolve_path(path: Optional[str] = None) -> str:
+        if path is None:
+            path = os.getenv(DeliveryJournal.PATH_ENV_VAR)
+            if path is None:
+                raise ValueError("Unable to resolve journal path from env: %s"
+                                 % DeliveryJournal.PATH_ENV_VAR)
+        return path
+
+    path: str = attr.ib(converter=_resolve_path.__func__, default=None)
+    latency_window: int = 1024
+    max_replays: int = 5
+
+    appended: int = 0
+    completed: int = 0
+    commits: int = 0
+    dead_lettered: int = 0
+
+    _db: Optional[sqlite3.Connection] = attr.ib(default=None, repr=False)
+    _executor: concurrent.futures.ThreadPoolExecutor = attr.ib(
+        default=attr.Factory(
+            lambda: concurrent.futures.ThreadPoolExecutor(max_workers=1)),
+        repr=False)
+    _appends: List[Tuple[str, str, str, float, asyncio.Future]] = attr.ib(
+        default=attr.Factory(list), repr=False)
+    _completes: List[int] = attr.ib(default=attr.Factory(list), repr=False)
+    _flushing: Optional[asyncio.Future] = attr.ib(default=None, repr=False)
+    _latencies: "collections.deque" = attr.ib(default=None, repr=False)
+
+    def __attrs_post_init__(self):
+        self._latencies = collections.deque(maxlen=self.latency_window)
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_event_loop().run_in_executor(
+            self._executor, fn, *args)
+
+    def _open(self):
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=FULL")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS deliveries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source TEXT NOT NULL,
+                name TEXT NOT NULL,
+                body TEXT NOT NULL,
+                received REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )""")
+        columns = [row[1] for row in db.execute(
+            "PRAGMA table_info(deliveries)")]
+        if "attempts" not in columns:
+            db.execute("ALTER TABLE deliveries "
+                       "ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS dead_deliveries (
+                id INTEGER PRIMARY KEY,
+                source TEXT NOT NULL,
+                name TEXT NOT NULL,
+                body TEXT NOT NULL,
+                received REAL NOT NULL,
+                attempts INTEGER NOT NULL,
+                dead REAL NOT NULL
+            )""")
+        db.commit()
+        self._db = db
+
+    async def open(self):
+        await self._run(self._open)
+        logger.info("Opened delivery journal: %s", self.path)
+
+    def _pending(self) -> List[Delivery]:
+        rows = self._db.execute(
+            "SELECT id, source, name, body, attempts FROM deliveries "
+            "ORDER BY id")
+        return [
+            Delivery(id, source, name, json.loads(body), attempts)
+            for id, source, name, body, attempts in rows
+        ]
+
+    async def pending(self) -> List[Delivery]:
+        """Unfinished deliveries, in the order received."""
+        return await self._run(self._pending)
+
+    def _replay(self) -> Tuple[List[Delivery], List[Delivery]]:
+        with self._db:
+            dead = [
+                d for d in self._pending() if d.attempts >= self.max_replays
+            ]
+            self._db.executemany(
+                "INSERT INTO dead_deliveries "
+                "SELECT id, source, name, body, received, attempts, ? "
+                "FROM deliveries WHERE id = ?",
+                [(time.time(), d.id) for d in dead])
+            self._db.executemany(
+                "DELETE FROM deliveries WHERE id = ?",
+                [(d.id, ) for d in dead])
+            self._db.execute(
+                "UPDATE deliveries SET attempts = attempts + 1")
+        return self._pending(), dead
+
+    async def replay(self) -> List[Delivery]:
+        """Unfinished deliveries to replay, in the order received.
+
+        Counts a replay of each delivery, first moving those already replayed
+        `max_replays` times to `dead_deliveries`.
+        """
+        pending, dead = await self._run(self._replay)
+        for delivery in dead:
+            logger.error(
+                "Dead-lettering delivery after %s replays: %s %s %s",
+                delivery.attempts, delivery.source, delivery.name,
+                delivery.id)
+        self.dead_lettered += len(dead)
+        return pending
+
+    async def append(self, source: str, name: str, body: Any) -> int:
+        """Durably append a delivery, returning its id."""
+        done = asyncio.get_event_loop().create_future()
+        self._appends.append(
+            (source, name, json.dumps(body), time.perf_counter(), done))
+        self._schedule()
+        return await done
+
+    def complete(self, id: int):
+        """Remove a processed delivery, with the next commit."""
+        if self._db is None:
+            logger.warning("Journal closed, leaving delivery: %s", id)
+            return
+        self._completes.append(id)
+        self._schedule()
+
+    def _schedule(self):
+        if self._flushing is None or self._flushing.done():
+            self._flushing = asyncio.ensure_future(self._flush())
+
+    def _write(self, appends, completes) -> List[int]:
+        ids = []
+        with self._db:
+            for source, name, body, received, _ in appends:
+                ids.append(self._db.execute(
+                    "INSERT INTO deliveries (source, name, body, received) "
+                    "VALUES (?, ?, ?, ?)",
+                    (source, name, body, time.time())).lastrowid)
+            self._db.executemany(
+                "DELETE FROM deliveries WHERE id = ?",
+                [(id, ) for id in completes])
+        return ids
+
+    async def _flush(self):
+        while self._appends or self._completes:
+            appends, self._appends = self._appends, []
+            completes, self._completes = self._completes, []
+
+            try:
+                ids = await self._run(self._write, appends, completes)
+            except Exception as ex:
+                logger.exception("Error writing delivery journal.")
+                for *_, done in appends:
+                    if not done.done():
+                        done.set_exception(ex)
+                # Completions are retried with the next commit.
+                self._completes[:0] = completes
+                if not self._appends:
+                    return
+                continue
+
+            self.commits += 1
+            self.appended += len(appends)
+            self.completed += len(completes)
+
+            now = time.perf_counter()
+            for id, (*_, received, done) in zip(ids, appends):
+                self._latencies.append(now - received)
+                if not done.done():
+                    done.set_result(id)
+
+    async def close(self):
+        if self._flushing is not None:
+            await self._flushing
+        if self._db is not None:
+            await self._run(self._db.close)
+            self._db = None
+        self._executor.shutdown()
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+
+        def ms(q):
+            if not latencies:
+                return None
+            return 1e3 * latencies[min(int(q * len(latencies)),
+                                       len(latencies) - 1)]
+
+        return dict(
+            appended=self.appended,
+            completed=self.completed,
+            commits=self.commits,
+            dead_lettered=self.dead_lettered,
+            batch_size=self.appended / self.commits if self.commits else None,
+            latency_ms=dict(p50=ms(.5), p99=ms(.99), max=ms(1)),
+        )
@@ -0,0 +1,129 @@
+"""Size-bounded loading of check run output text.
+
+Github rejects output `summary` and `text` over 65535 characters. Oversized
+values are cut to head and tail windows around a truncation marker, files
+being read only for the windows via seek, cutting at UTF-8 character and,
+where nearby, line boundaries, and closing code fences left open by the cut.
+"""
+from typing import Optional, Tuple
+
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Maximum characters of a check run output summary or text.
+MAX_OUTPUT_CHARS = 65535
+
+TRUNCATION_MARKER = "\n\n*... {omitted} {unit} truncated ...*\n\n"
+FENCE = "```"
+
+
+def _fence_open(text: str) -> bool:
+    """Whether text leaves a code fence open, counting fence lines."""
+    fences = sum(
+        1 for line in text.splitlines() if line.lstrip().startswith(FENCE))
+    return fences % 2 == 1
+
+
+def _budget(limit: int, total: int, unit: str) -> int:
+    """Characters available to each of the head and tail windows."""
+    marker = TRUNCATION_MARKER.format(omitted=total, unit=unit)
+    # Reserve for closing and reopening a fence across the marker.
+    reserve = len(marker) + 2 * (len(FENCE) + 1)
+    return max((limit - reserve) // 2, 0)
+
+
+def _align_lines(head: str, tail: str) -> Tuple[str, str]:
+    """Cut head and tail at line boundaries within a quarter window."""
+    newline = head.rfind("\n")
+    if newline >= len(head) * 3 // 4:
+        head = head[:newline + 1]
+
+    newline = tail.find("\n")
+    if 0 <= newline <= len(tail) // 4:
+        tail = tail[newline + 1:]
+
+    return head, tail
+
+
+def _join(head: str, tail: str, omitted: int, unit: str) -> str:
+    if _fence_open(head):
+        head = head.rstrip("\n") + "\n" + FENCE
+    if _fence_open(tail):
+        # Tail cut inside a fence, closed within the tail.
+        tail = FENCE + "\n" + tail
+
+    return head + TRUNCATION_MARKER.format(
+        omitted=omitted, unit=unit) + tail
+
+
+def truncate_text(text: Optional[str],
+                  limit: int = MAX_OUTPUT_CHARS) -> Optional[str]:
+    """Text, cut to head and tail windows if over `limit` characters."""
+    if text is None or len(text) <= limit:
+        return text
+
+    budget = _budget(limit, len(text), "characters")
+    head, tail = _align_lines(text[:budget], text[len(text) - budget:])
+    return _join(head, tail, len(text) - len(head) - len(tail), "characters")
+
+
+def _utf8_head(data: bytes) -> bytes:
+    """Drop a partial multi-byte character from the end of data."""
+    for back in range(1, min(4, len(data)) + 1):
+        byte = data[-back]
+        if byte & 0xC0 == 0x80:
+            # Continuation byte
+            continue
+        if byte >= 0xC0:
+            length = 2 if byte < 0xE0 else 3 if byte < 0xF0 else 4
+            if length > back:
+                return data[:-back]
+        break
+    return data
+
+
+def _utf8_tail(data: bytes) -> bytes:
+    """Drop continuation bytes of a character cut from the start of data."""
+    start = 0
+    while start < min(3, len(data)) and data[start] & 0xC0 == 0x80:
+        start += 1
+    return data[start:]
+
+
+def read_text(path: str, limit: int = MAX_OUTPUT_CHARS) -> str:
+    """Read a UTF-8 file, reading only head and tail windows if oversized.
+
+    Windows are measured in bytes, bounding the characters read regardless
+    of encoding width.
+    """
+    size = os.path.getsize(path)
+
+    with open(path, "rb") as inf:
+        if size <= limit:
+            return inf.read().decode("utf-8", errors="replace")
+
+        budget = _budget(limit, size, "bytes")
+        head = _utf8_head(inf.read(budget))
+        inf.seek(size - budget)
+        tail = _utf8_tail(inf.read(budget))
+
+    logger.info("Truncating: %s from %s bytes", path, size)
+    head, tail = _align_lines(
+        head.decode("utf-8", errors="replace"),
+        tail.decode("utf-8", errors="replace"))
+
+    omitted = (
+        size - len(head.encode("utf-8", errors="replace"))
+        - len(tail.encode("utf-8", errors="replace")))
+    return _join(head, tail, omitted, "bytes")
+
+
+def read_if_file(val: str, limit: int = MAX_OUTPUT_CHARS) -> str:
+    """Bounded contents of `val` if it is a file path, otherwise val itself."""
+    if os.path.isfile(val):
+        logger.info("Reading file: %s", val)
+        return read_text(val, limit)
+    else:
+        return truncate_text(val, limit)
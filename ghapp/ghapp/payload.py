@@ -0,0 +1,80 @@
+"""Bounded, single-pass reading and parsing of webhook request bodies.
+
+Bodies are capped at `max_body` bytes and fed to any signature MACs. Bodies
+of a declared Content-Length, checked against the cap up front, are read in
+one piece, and others are read and fed to the MACs chunk by chunk as they
+arrive. The raw and parsed body are cached on the
+request, so routing, verification, de-duplication and dispatch share one
+read and one parse. Once read, the request's content stream is consumed, so
+handlers must use `read_body` rather than `Request.read`.
+"""
+from typing import Any, Iterable, Optional
+
+import os
+import json
+import urllib.parse
+
+from aiohttp import web
+
+MAX_BODY_ENV_VAR = "GHAPP_MAX_WEBHOOK_BYTES"
+
+# github caps webhook payloads at 25MB
+MAX_BODY_BYTES = 25 * 1024 * 1024
+
+_RAW_KEY = "ghapp.payload.raw"
+_PARSED_KEY = "ghapp.payload.parsed"
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+def resolve_max_body(max_body: Optional[int] = None) -> int:
+    if max_body is None:
+        max_body = os.getenv(MAX_BODY_ENV_VAR, MAX_BODY_BYTES)
+    return int(max_body)
+
+
+async def read_body(req: web.Request, max_body: int,
+                    macs: Iterable[Any] = ()) -> bytes:
+    """Read the request body, updating `macs` with each chunk.
+
+    Raises BodyTooLarge if the body exceeds `max_body` bytes.
+    """
+    raw = req.get(_RAW_KEY)
+    if raw is not None:
+        for mac in macs:
+            mac.update(raw)
+        return raw
+
+    if req.content_length is not None:
+        if req.content_length > max_body:
+            raise BodyTooLarge(req.content_length)
+        raw = await req.content.read()
+        for mac in macs:
+            mac.update(raw)
+    else:
+        chunks = []
+        size = 0
+        async for chunk in req.content.iter_any():
+            size += len(chunk)
+            if size > max_body:
+                raise BodyTooLarge(size)
+            for mac in macs:
+                mac.update(chunk)
+            chunks.append(chunk)
+        raw = b"".join(chunks)
+
+    req[_RAW_KEY] = raw
+    return raw
+
+
+def parse_body(req: web.Request, raw: bytes) -> Any:
+    """JSON body, unpacked from the `payload` field of form encoded bodies."""
+    if _PARSED_KEY not in req:
+        if req.content_type == "application/x-www-form-urlencoded":
+            form = urllib.parse.parse_qs(raw.decode())
+            req[_PARSED_KEY] = json.loads(form["payload"][0])
+        else:
+            req[_PARSED_KEY] = json.loads(raw)
+    return req[_PARSED_KEY]
@@ -0,0 +1,444 @@
+"""Streaming ingestion of test and lint reports into check run output.
+
+JUnit XML and checkstyle reports are read with `iterparse`, discarding each
+element once handled, and SARIF with an incremental scan for its result
+arrays, so memory is bounded by `ReportSummary.max_findings` rather than
+report size.
+"""
+from typing import Any, Callable, Counter, Dict, IO, Iterator, List, Optional, Tuple
+
+import re
+import json
+import heapq
+import logging
+import itertools
+import collections
+import xml.etree.ElementTree as ET
+
+import attr
+
+from .github import checks
+from .github.annotations import AnnotationBuffer
+from .output import truncate_text
+
+logger = logging.getLogger(__name__)
+
+# Per-finding message and details cap, in characters.
+MAX_MESSAGE = 4096
+
+_level_rank = {
+    checks.AnnotationLevel.notice: 0,
+    checks.AnnotationLevel.warning: 1,
+    checks.AnnotationLevel.failure: 2,
+}
+
+
+def _truncate(value: Optional[str], limit: int = MAX_MESSAGE) -> Optional[str]:
+    if value is None or len(value) <= limit:
+        return value
+    return value[:limit - 3] + "..."
+
+
+def _int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@attr.s(auto_attribs=True)
+class Finding:
+    """A failed test or lint result, annotating a line if it has a path."""
+    level: checks.AnnotationLevel
+    name: str
+    message: str
+    path: Optional[str] = None
+    line: Optional[int] = None
+    end_line: Optional[int] = None
+    column: Optional[int] = None
+    end_column: Optional[int] = None
+    details: Optional[str] = None
+
+    def annotation(self) -> Optional[checks.Annotation]:
+        if self.path is None:
+            return None
+
+        line = self.line or 1
+        end_line = self.end_line or line
+        single_line = line == end_line
+        return checks.Annotation(
+            path=self.path,
+            start_line=line,
+            end_line=end_line,
+            annotation_level=self.level,
+            message=self.message or self.name,
+            start_column=self.column if single_line else None,
+            end_column=self.end_column if single_line else None,
+            title=self.name,
+            raw_details=self.details,
+        )
+
+
+@attr.s(auto_attribs=True)
+class ReportSummary:
+    """Counts and the most severe findings over any number of reports.
+
+    Keeps the `max_findings` most severe findings, earliest first within a
+    level, in a bounded heap. `top` and `annotations` are drawn from the
+    retained findings.
+    """
+    max_findings: int = 1000
+
+    counts: Counter[str] = attr.Factory(collections.Counter)
+
+    _findings: List[Tuple[int, int, Finding]] = attr.ib(
+        default=attr.Factory(list), repr=False)
+    _seq: "itertools.count" = attr.ib(
+        default=attr.Factory(itertools.count), repr=False)
+
+    def add(self, finding: Finding):
+        self.counts[finding.level.value] += 1
+
+        # Min-heap on (severity, -order), the least severe and latest first.
+        entry = (_level_rank[finding.level], -next(self._seq), finding)
+        if len(self._findings) < self.max_findings:
+            heapq.heappush(self._findings, entry)
+        elif entry[:2] > self._findings[0][:2]:
+            heapq.heapreplace(self._findings, entry)
+
+    def findings(self) -> List[Finding]:
+        """Retained findings, most severe first."""
+        return [f for _, _, f in sorted(
+            self._findings, key=lambda e: e[:2], reverse=True)]
+
+    def top(self, n: int = 10) -> List[Finding]:
+        return [f for _, _, f in heapq.nlargest(
+            n, self._findings, key=lambda e: e[:2])]
+
+    def annotations(self) -> AnnotationBuffer:
+        buffer = AnnotationBuffer()
+        for finding in self.findings():
+            annotation = finding.annotation()
+            if annotation is not None:
+                buffer.append(annotation)
+        return buffer
+
+    @property
+    def title(self) -> str:
+        parts = []
+        if "tests" in self.counts:
+            parts.append("%s tests" % self.counts["tests"])
+        for key in ("failures", "errors", "skipped"):
+            if self.counts[key]:
+                parts.append("%s %s" % (self.counts[key], key))
+        for level in sorted(_level_rank, key=_level_rank.get, reverse=True):
+            if "tests" not in self.counts and self.counts[level.value]:
+                parts.append("%s %s" % (self.counts[level.value], level.value))
+        return ", ".join(parts) or "No findings"
+
+    def output(self, title: Optional[str] = None,
+               top: int = 10) -> checks.Output:
+        """Check run output listing counts and the `top` findings."""
+        lines = []
+        for finding in self.top(top):
+            location = (
+                " `%s:%s`" % (finding.path, finding.line or 1)
+                if finding.path else "")
+            lines.append("* **%s**%s: %s" % (
+                finding.name, location, finding.message))
+            if finding.details:
+                lines.extend(["  ```", finding.details, "  ```"])
+
+        omitted = sum(
+            self.counts[level.value] for level in checks.AnnotationLevel
+        ) - min(top, len(self._findings))
+        if omitted > 0:
+            lines.append("\n%s more not shown." % omitted)
+
+        return checks.Output(
+            title=title or self.title,
+            summary=self.title,
+            text=truncate_text("\n".join(lines)) or None,
+        )
+
+
+def _iterparse_discarding(inf: IO) -> Iterator[Tuple[str, ET.Element]]:
+    """iterparse start/end events, removing elements after their end event."""
+    stack: List[ET.Element] = []
+    for event, elem in ET.iterparse(inf, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            yield event, elem
+        else:
+            yield event, elem
+            stack.pop()
+            elem.clear()
+            if stack:
+                # Drop all of the parent's children, later siblings parsed
+                # ahead of their events are still referenced by the events.
+                del stack[-1][:]
+
+
+def _tag(elem: ET.Element) -> str:
+    # Drop any xml namespace
+    return elem.tag.rpartition("}")[2]
+
+
+_junit_outcomes = {
+    "failure": "failures",
+    "error": "errors",
+    "skipped": "skipped",
+}
+# Testcase outcome precedence, lowest first.
+_junit_outcomes_rank = ["skipped", "errors", "failures"]
+
+
+def ingest_junit(inf: IO, summary: ReportSummary):
+    """Add testcase counts and failures from a JUnit XML report."""
+    case: Optional[Dict[str, Any]] = None
+
+    for event, elem in _iterparse_discarding(inf):
+        tag = _tag(elem)
+
+        if tag == "testcase":
+            if event == "start":
+                case = dict(elem.attrib, outcome=None)
+                continue
+
+            summary.counts["tests"] += 1
+            if case["outcome"] is None:
+                summary.counts["passed"] += 1
+            elif case["outcome"] == "skipped":
+                summary.counts["skipped"] += 1
+            else:
+                summary.counts[case["outcome"]] += 1
+                name = ".".join(
+                    filter(None, (case.get("classname"), case.get("name"))))
+                summary.add(Finding(
+                    level=checks.AnnotationLevel.failure,
+                    name=name,
+                    message=_truncate(case["message"] or case["outcome"]),
+                    path=case.get("file"),
+                    line=_int(case.get("line")),
+                    details=_truncate(case["details"]),
+                ))
+            case = None
+
+        elif (tag in ("failure", "error", "skipped") and event == "end"
+              and case is not None):
+            outcome = _junit_outcomes[tag]
+            if (case["outcome"] is None or
+                    _junit_outcomes_rank.index(outcome)
+                    > _junit_outcomes_rank.index(case["outcome"])):
+                case["outcome"] = outcome
+                case["message"] = elem.get("message") or elem.get("type")
+                case["details"] = (elem.text or "").strip() or None
+
+
+_checkstyle_levels = {
+    "error": checks.AnnotationLevel.failure,
+    "warning": checks.AnnotationLevel.warning,
+}
+
+
+def ingest_checkstyle(inf: IO, summary: ReportSummary):
+    """Add findings from a checkstyle XML report."""
+    path = None
+
+    for event, elem in _iterparse_discarding(inf):
+        if event != "start":
+            continue
+
+        tag = _tag(elem)
+        if tag == "file":
+            path = elem.get("name")
+        elif tag == "error":
+            summary.add(Finding(
+                level=_checkstyle_levels.get(
+                    elem.get("severity"), checks.AnnotationLevel.notice),
+                name=elem.get("source") or "checkstyle",
+                message=_truncate(elem.get("message") or ""),
+                path=path,
+                line=_int(elem.get("line")),
+                column=_int(elem.get("column")),
+            ))
+
+
+_json_token = re.compile(r'[{}\[\]",:]')
+_json_string = re.compile(r'"(?:[^"\\]|\\.)*"', re.S)
+_json_space = re.compile(r'\s*')
+_json_scalar_end = re.compile(r'[\s,\]}]')
+
+
+def iter_json_items(inf: IO[str], path: Tuple[Optional[str], ...],
+                    chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """Incrementally decode items of the json arrays at `path`.
+
+    `path` is a sequence of object keys, None matching any array item. Only
+    the matched items are decoded, the remainder of the document is scanned
+    without being parsed, so memory is bounded by item rather than document
+    size.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+
+    # Frames of [key, expecting_key] for objects, or None for arrays.
+    stack: List[Optional[List[Any]]] = []
+
+    def fill() -> bool:
+        nonlocal buf, pos, eof
+        if eof:
+            return False
+        chunk = inf.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+
+    def current_path() -> Tuple[Optional[str], ...]:
+        return tuple(frame[0] if frame else None for frame in stack)
+
+    while True:
+        token = _json_token.search(buf, pos)
+        if token is None:
+            pos = len(buf)
+            if not fill():
+                return
+            continue
+
+        pos = token.end()
+        char = token.group()
+        top = stack[-1] if stack else None
+
+        if char == '"':
+            string = _json_string.match(buf, token.start())
+            while string is None:
+                pos = token.start()
+                if not fill():
+                    raise ValueError("Unterminated json string")
+                token = _json_token.search(buf, pos)
+                string = _json_string.match(buf, token.start())
+            pos = string.end()
+            if top and top[1]:
+                top[0] = json.loads(string.group())
+                top[1] = False
+
+        elif char == "{":
+            stack.append([None, True])
+
+        elif char == ",":
+            if top:
+                top[1] = True
+
+        elif char in "}]":
+            stack.pop()
+
+        elif char == "[":
+            if current_path() != tuple(path):
+                stack.append(None)
+                continue
+
+            # Decode matched items in place, to the array's end.
+            while True:
+                space = _json_space.match(buf, pos)
+                pos = space.end()
+                if pos == len(buf):
+                    if not fill():
+                        raise ValueError("Unterminated json array")
+                    continue
+
+                if buf[pos] == "]":
+                    pos += 1
+                    break
+                if buf[pos] == ",":
+                    pos += 1
+                    continue
+
+                if (buf[pos] not in '{["' and
+                        _json_scalar_end.search(buf, pos) is None):
+                    # Scalars may continue into the next chunk, decode once
+                    # delimited.
+                    if fill():
+                        continue
+
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                except ValueError:
+                    # Partial item, or invalid at end of file.
+                    if not fill():
+                        raise
+                    continue
+
+                pos = end
+                yield item
+
+
+_sarif_levels = {
+    "error": checks.AnnotationLevel.failure,
+    "warning": checks.AnnotationLevel.warning,
+    "note": checks.AnnotationLevel.notice,
+}
+
+
+def ingest_sarif(inf: IO[str], summary: ReportSummary):
+    """Add findings from the results of a SARIF report."""
+    for result in iter_json_items(inf, ("runs", None, "results")):
+        level = result.get("level", "warning")
+        if level == "none":
+            continue
+
+        location: Dict[str, Any] = {}
+        region: Dict[str, Any] = {}
+        if result.get("locations"):
+            location = result["locations"][0].get("physicalLocation", {})
+            region = location.get("region", {})
+
+        summary.add(Finding(
+            level=_sarif_levels.get(level, checks.AnnotationLevel.warning),
+            name=result.get("ruleId") or "sarif",
+            message=_truncate(result.get("message", {}).get("text", "")),
+            path=location.get("artifactLocation", {}).get("uri"),
+            line=region.get("startLine"),
+            end_line=region.get("endLine"),
+            column=region.get("startColumn"),
+            end_column=region.get("endColumn"),
+        ))
+
+
+ingesters: Dict[str, Callable[[IO, ReportSummary], None]] = {
+    "junit": ingest_junit,
+    "checkstyle": ingest_checkstyle,
+    "sarif": ingest_sarif,
+}
+
+
+def detect_format(path: str) -> str:
+    """Report format, by extension or from the document's root element."""
+    if path.endswith((".sarif", ".json")):
+        return "sarif"
+
+    with open(path, "rb") as inf:
+        for _, elem in ET.iterparse(inf, events=("start",)):
+            return "checkstyle" if _tag(elem) == "checkstyle" else "junit"
+
+    raise ValueError(f"Empty report: {path}")
+
+
+def ingest(path: str, summary: Optional[ReportSummary] = None,
+           format: Optional[str] = None) -> ReportSummary:
+    """Ingest a report file, by default detecting its format."""
+    if summary is None:
+        summary = ReportSummary()
+    if format is None:
+        format = detect_format(path)
+
+    logger.info("Ingesting %s report: %s", format, path)
+    mode = "r" if format == "sarif" else "rb"
+    with open(path, mode) as inf:
+        ingesters[format](inf, summary)
+
+    return summary
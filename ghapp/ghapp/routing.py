@@ -0,0 +1,165 @@
+from typing import Awaitable, Callable, Dict, Optional, Union
+
+import os
+import hashlib
+import logging
+
+import attr
+import aiohttp
+from aiohttp import web
+
+from .payload import parse_body, read_body, resolve_max_body
+
+logger = logging.getLogger(__name__)
+
+# Marks requests forwarded between workers, handled where received. Only
+# honoured on a worker's own unix socket.
+ROUTED_HEADER = "X-Ghapp-Routed-From"
+
+# Headers describing the original connection, not forwarded.
+HOP_HEADERS = {
+    "connection", "content-length", "host", "keep-alive",
+    "transfer-encoding"
+}
+
+
+def route_key(source: str, body: dict) -> Optional[str]:
+    """Commit, or failing that repository, a webhook event concerns."""
+    if source == "buildkite":
+        build = body.get("build") or {}
+        pipeline = body.get("pipeline") or {}
+        return build.get("commit") or pipeline.get("repository")
+
+    for subject in ("check_run", "check_suite"):
+        sha = (body.get(subject) or {}).get("head_sha")
+        if sha:
+            return sha
+    return (body.get("repository") or {}).get("full_name")
+
+
+@attr.s(auto_attribs=True)
+class WorkerRouter:
+    """Routes webhook events to the worker process owning their commit.
+
+    Workers share a listening port, so any worker may receive an event. Each
+    event is owned by one of `workers` workers, by a stable hash of its
+    `route_key`, and forwarded to its owner's unix socket in `socket_dir` if
+    received elsewhere. Events for a commit are then handled by a single
+    worker, keeping its caches and per-job ordering local. Events forwarded
+    while their owner is unavailable are handled where received.
+
+    Events are verified before they are parsed or forwarded, and forwarded
+    events are only accepted on the worker's unix socket, so unauthenticated
+    requests can neither skip routing nor cost a parse.
+    """
+    index: int
+    workers: int
+    socket_dir: str
+
+    local: int = 0
+    forwarded: int = 0
+    fallback: int = 0
+
+    # Rejects larger bodies, resolved from `GHAPP_MAX_WEBHOOK_BYTES`.
+    max_body: int = attr.ib(converter=resolve_max_body, default=None)
+
+    _sessions: Dict[int, aiohttp.ClientSession] = attr.ib(
+        default=attr.Factory(dict), repr=False)
+
+    def socket_path(self, index: Optional[int] = None) -> str:
+        if index is None:
+            index = self.index
+        return os.path.join(self.socket_dir, "worker-%s.sock" % index)
+
+    def owner(self, key: Optional[str]) -> int:
+        if key is None or self.workers <= 1:
+            return self.index
+        digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big") % self.workers
+
+    def route(self, source: str,
+              handler: Callable[[web.Request], Awaitable[web.Response]],
+              verify: Callable[[web.Request],
+                               Awaitable[Union[bytes, web.Response]]]):
+        """Wrap a webhook handler, forwarding events owned by other workers.
+
+        `verify` reads and authenticates the body, returning the rejecting
+        response of unauthenticated events.
+        """
+
+        async def routed(req: web.Request) -> web.Response:
+            if self.workers > 1 and not self._forwarded(req):
+                raw_body = await verify(req)
+                if isinstance(raw_body, web.Response):
+                    return raw_body
+
+                owner = self.owner(route_key(source, _event_body(
+                    req, raw_body)))
+                if owner != self.index:
+                    try:
+                        return await self._forward(owner, req)
+                    except aiohttp.ClientError:
+                        logger.warning(
+                            "Worker %s unavailable, handling locally.", owner,
+                            exc_info=True)
+                        self.fallback += 1
+
+            self.local += 1
+            return await handler(req)
+
+        return routed
+
+    def _forwarded(self, req: web.Request) -> bool:
+        """Whether req was forwarded by another worker, via our unix socket."""
+        if ROUTED_HEADER not in req.headers or req.transport is None:
+            return False
+        return req.transport.get_extra_info("sockname") == self.socket_path()
+
+    async def _forward(self, owner: int, req: web.Request) -> web.Response:
+        session = self._sessions.get(owner)
+        if session is None:
+            session = self._sessions[owner] = aiohttp.ClientSession(
+                connector=aiohttp.UnixConnector(path=self.socket_path(owner)))
+
+        headers = {
+            k: v
+            for k, v in req.headers.items() if k.lower() not in HOP_HEADERS
+        }
+        headers[ROUTED_HEADER] = str(self.index)
+
+        async with session.post(
+                "http://worker%s" % req.path_qs,
+                data=await read_body(req, self.max_body),
+                headers=headers) as resp:
+            body = await resp.read()
+            self.forwarded += 1
+            return web.Response(
+                status=resp.status,
+                body=body,
+                headers={
+                    k: v
+                    for k, v in resp.headers.items()
+                    if k in ("Content-Type", "Retry-After")
+                })
+
+    async def close(self):
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions.clear()
+
+    def stats(self) -> dict:
+        return dict(
+            index=self.index,
+            workers=self.workers,
+            local=self.local,
+            forwarded=self.forwarded,
+            fallback=self.fallback,
+        )
+
+
+def _event_body(req: web.Request, raw_body: bytes) -> dict:
+    try:
+        body = parse_body(req, raw_body)
+    except (ValueError, KeyError):
+        return {}
+    return body if isinstance(body, dict) else {}
@@ -0,0 +1,68 @@
+from typing import Dict, Iterable, Optional
+
+import time
+import logging
+
+import attr
+
+from .cache import LRUCache
+from .github import checks
+
+logger = logging.getLogger(__name__)
+
+
+@attr.s(auto_attribs=True)
+class RunIndex:
+    """Per-commit index of check run ids by external id.
+
+    Maps commit sha to {external_id: run id}, filled from runs created by the
+    server and from github listings, so that job events for known runs do not
+    require a `GetRuns` call. Commits are evicted least-recently-used beyond
+    `maxsize`, or `ttl` seconds after they were last filled.
+
+    `hits` and `misses` count run lookups, a miss costing a github query.
+    """
+    maxsize: int = 4096
+    ttl: float = 60 * 60
+
+    hits: int = 0
+    misses: int = 0
+
+    commits: LRUCache = attr.ib(default=None, repr=False)
+
+    def __attrs_post_init__(self):
+        if self.commits is None:
+            self.commits = LRUCache(
+                maxsize=self.maxsize, ttl=self.ttl, clock=time.monotonic)
+
+    def get(self, sha: str, external_id: str) -> Optional[str]:
+        """Indexed run id, counting a hit or miss."""
+        runs = self.commits.get(sha)
+        run_id = runs.get(external_id) if runs else None
+
+        if run_id is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        return run_id
+
+    def put(self, sha: str, external_id: str, run_id: str):
+        runs: Dict[str, str] = self.commits.pop(sha) or {}
+        runs[external_id] = str(run_id)
+        self.commits.put(sha, runs)
+
+    def update(self, sha: str, runs: Iterable[checks.RunDetails]):
+        for run in runs:
+            if run.external_id and run.id:
+                self.put(sha, run.external_id, run.id)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return dict(
+            commits=len(self.commits),
+            maxsize=self.maxsize,
+            hits=self.hits,
+            misses=self.misses,
+            hit_rate=self.hits / lookups if lookups else None,
+        )
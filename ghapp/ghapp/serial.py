@@ -0,0 +1,53 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+import asyncio
+import logging
+
+import attr
+
+logger = logging.getLogger(__name__)
+
+
+@attr.s(auto_attribs=True)
+class KeyedSerial:
+    """Runs calls for a key one at a time, in submission order.
+
+    Each key has a logical lane: a call waits for the previous call for its
+    key to finish, whether or not it succeeded, while calls for different
+    keys run concurrently. Lanes are dropped once idle. `ran` counts calls
+    run and `waited` those queued behind an earlier call for their key.
+    """
+    ran: int = 0
+    waited: int = 0
+
+    _tails: Dict[Hashable, asyncio.Future] = attr.ib(
+        default=attr.Factory(dict), repr=False)
+
+    async def run(self, key: Hashable, fn: Callable[..., Awaitable[Any]],
+                  *args, **kwargs) -> Any:
+        previous = self._tails.get(key)
+        if previous is not None:
+            self.waited += 1
+
+        call = asyncio.ensure_future(
+            self._run(previous, fn, *args, **kwargs))
+        self._tails[key] = call
+        call.add_done_callback(
+            lambda f: self._tails.pop(key, None)
+            if self._tails.get(key) is f else None)
+
+        return await call
+
+    async def _run(self, previous, fn, *args, **kwargs):
+        if previous is not None:
+            await asyncio.wait([previous])
+
+        self.ran += 1
+        return await fn(*args, **kwargs)
+
+    def stats(self) -> dict:
+        return dict(
+            ran=self.ran,
+            waited=self.waited,
+            lanes=len(self._tails),
+        )
@@ -0,0 +1,131 @@
+"""Serve webhooks from multiple worker processes sharing a port.
+
+Each worker runs the app on its own event loop, optionally uvloop, and binds
+the listening port with SO_REUSEPORT, so the kernel balances connections
+across workers. Events are then routed to the worker owning their commit,
+see `WorkerRouter`. The parent process restarts workers that exit, and stops
+them on SIGTERM or SIGINT.
+"""
+from typing import Dict, Optional
+
+import os
+import time
+import signal
+import shutil
+import asyncio
+import logging
+import tempfile
+import multiprocessing
+
+from aiohttp import web
+
+from .app import Main
+from .github.identity import AppIdentity
+from .journal import DeliveryJournal
+from .routing import WorkerRouter
+
+logger = logging.getLogger(__name__)
+
+
+def new_event_loop(use_uvloop: bool = False) -> asyncio.AbstractEventLoop:
+    if use_uvloop:
+        try:
+            import uvloop
+        except ImportError:
+            raise ValueError("uvloop requested, but not installed.")
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    return loop
+
+
+def run_worker(router: WorkerRouter, host: str, port: int,
+               identity: Optional[AppIdentity] = None,
+               use_uvloop: bool = False):
+    """Run a single worker's app until SIGTERM or SIGINT."""
+    # Drop the supervisor's handlers inherited over fork, until the loop's
+    # own are installed.
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, signal.SIG_DFL)
+
+    loop = new_event_loop(use_uvloop)
+
+    # Each worker journals the deliveries it owns.
+    journal_path = os.getenv(DeliveryJournal.PATH_ENV_VAR)
+    journal = None
+    if journal_path:
+        if router.workers > 1:
+            journal_path = "%s.%s" % (journal_path, router.index)
+        journal = DeliveryJournal(journal_path)
+
+    main = Main.setup(
+        loop=loop, identity=identity, journal=journal, router=router)
+    runner = web.AppRunner(main.app)
+    loop.run_until_complete(runner.setup())
+
+    sites = [
+        web.TCPSite(runner, host, port, reuse_port=True),
+        web.UnixSite(runner, router.socket_path()),
+    ]
+    for site in sites:
+        loop.run_until_complete(site.start())
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, loop.stop)
+
+    logger.info("Worker %s/%s serving on %s:%s", router.index,
+                router.workers, host, port)
+    try:
+        loop.run_forever()
+    finally:
+        loop.run_until_complete(runner.cleanup())
+        loop.close()
+
+
+def run(host: str = "0.0.0.0",
+        port: int = 8080,
+        workers: Optional[int] = None,
+        identity: Optional[AppIdentity] = None,
+        use_uvloop: bool = False):
+    """Fork and supervise `workers` worker processes, defaulting to one per cpu."""
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    socket_dir = tempfile.mkdtemp(prefix="ghapp-workers-")
+    context = multiprocessing.get_context("fork")
+    processes: Dict[int, multiprocessing.Process] = {}
+
+    def start(index):
+        router = WorkerRouter(
+            index=index, workers=workers, socket_dir=socket_dir)
+        process = processes[index] = context.Process(
+            target=run_worker,
+            name="ghapp-worker-%s" % index,
+            args=(router, host, port, identity, use_uvloop))
+        process.start()
+
+    stopping = []
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stopping.append(True))
+
+    try:
+        for index in range(workers):
+            start(index)
+
+        while not stopping:
+            for index, process in processes.items():
+                if not process.is_alive():
+                    logger.warning("Worker %s exited: %s, restarting.", index,
+                                   process.exitcode)
+                    start(index)
+            time.sleep(.5)
+    finally:
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in processes.values():
+            process.join(timeout=35)
+            if process.is_alive():
+                process.kill()
+        shutil.rmtree(socket_dir, ignore_errors=True)
@@ -0,0 +1,46 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+import asyncio
+import logging
+
+import attr
+
+logger = logging.getLogger(__name__)
+
+
+@attr.s(auto_attribs=True)
+class SingleFlight:
+    """Coalesces concurrent calls for a key into a single in-flight call.
+
+    The first caller for a key issues the call, and callers arriving while it
+    is in flight await the same result. `issued` and `coalesced` count calls
+    made and calls served by an in-flight result.
+    """
+    issued: int = 0
+    coalesced: int = 0
+
+    _inflight: Dict[Hashable, asyncio.Future] = attr.ib(
+        default=attr.Factory(dict), repr=False)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]):
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            logger.debug("Coalescing in-flight call: %s", key)
+            self.coalesced += 1
+        else:
+            self.issued += 1
+            inflight = asyncio.ensure_future(fn())
+            self._inflight[key] = inflight
+            inflight.add_done_callback(
+                lambda f: self._inflight.pop(key, None)
+                if self._inflight.get(key) is f else None)
+
+        # Shield the shared call from cancellation of any single caller.
+        return await asyncio.shield(inflight)
+
+    def stats(self) -> dict:
+        return dict(
+            issued=self.issued,
+            coalesced=self.coalesced,
+            inflight=len(self._inflight),
+        )
@@ -0,0 +1,100 @@
+"""Stand-ins for aiohttp and github client sessions, shared between tests."""
+import json
+import asyncio
+
+import aiohttp
+
+
+class FakeResponse:
+    """aiohttp.ClientResponse stand-in, also usable as a request context."""
+
+    def __init__(self, status=200, body=None, headers=None, links=None,
+                 delay=0):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+        self.links = links or {}
+        self.delay = delay
+        self.released = False
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise aiohttp.ClientResponseError(
+                None, (), status=self.status)
+
+    async def read(self):
+        return json.dumps(self.body).encode()
+
+    async def json(self, **kwargs):
+        return self.body
+
+    def release(self):
+        self.released = True
+
+    async def __aenter__(self):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+
+def canned(responses):
+    """Respond with `responses[(method, url)]`, or a 404."""
+
+    def respond(method, url, kwargs):
+        return responses.get((method, url), (404, {}))
+
+    return respond
+
+
+class FakeSession:
+    """Session stand-in answering requests with `respond`.
+
+    `respond(method, url, kwargs)` returns FakeResponse arguments, and
+    requests are recorded as `(method, url, kwargs)`. Serves as an
+    aiohttp.ClientSession, the pooled session of a GithubClient, or a
+    GithubClient handing out installation sessions.
+    """
+
+    def __init__(self, respond, delay=0):
+        self.respond = respond
+        self.delay = delay
+        self.requests = []
+        self.closed = False
+        self.account = None
+        self.priority = None
+
+    def sent(self):
+        return [(method, url) for method, url, _ in self.requests]
+
+    def _response(self, method, url, kwargs):
+        if self.closed:
+            raise RuntimeError("Session is closed")
+        self.requests.append((method, url, kwargs))
+        return FakeResponse(
+            *self.respond(method, url, kwargs), delay=self.delay)
+
+    async def request(self, method, url, **kwargs):
+        return self._response(method, url, kwargs)
+
+    def get(self, url, **kwargs):
+        return self._response("GET", url, kwargs)
+
+    def post(self, url, **kwargs):
+        return self._response("POST", url, kwargs)
+
+    def patch(self, url, **kwargs):
+        return self._response("PATCH", url, kwargs)
+
+    def installation(self, account, priority=None):
+        self.account = account
+        self.priority = priority
+        return self
+
+    def stats(self):
+        return {}
+
+    async def close(self):
+        self.closed = True
@@ -0,0 +1,70 @@
+import io
+import json
+
+import pytest
+
+from ...github import checks
+from ...github.annotations import (
+    AnnotationBuffer, read_annotations, upload_annotations)
+from ..fakes import FakeSession
+
+
+def annotation(i):
+    return checks.Annotation(
+        path="src/%s.py" % (i % 3),
+        start_line=i,
+        end_line=i,
+        annotation_level=checks.AnnotationLevel.warning,
+        message="unused import",
+        start_column=(i % 2) or None,
+    )
+
+
+def test_annotation_buffer():
+    annotations = [annotation(i) for i in range(1, 121)]
+
+    buffer = AnnotationBuffer()
+    buffer.extend(annotations)
+    assert len(buffer) == 120
+    assert list(buffer) == annotations
+
+    # Repeated strings are shared
+    assert buffer[0].message is buffer[119].message
+
+    batches = list(buffer.batches())
+    assert [len(b) for b in batches] == [50, 50, 20]
+    assert sum(batches, []) == annotations
+
+
+def test_read_annotations():
+    lines = "\n".join(json.dumps({
+        "path": "src/a.py",
+        "start_line": i,
+        "end_line": i,
+        "annotation_level": "failure",
+        "message": "test failure",
+        "unknown": "ignored",
+    }) for i in range(3)) + "\n\n"
+
+    annotations = list(read_annotations(io.StringIO(lines)))
+    assert [a.start_line for a in annotations] == [0, 1, 2]
+    assert annotations[0].annotation_level == checks.AnnotationLevel.failure
+
+
+@pytest.mark.asyncio
+async def test_upload_annotations():
+    session = FakeSession(lambda method, url, kwargs: (200, {}))
+    output = checks.Output(title="lint", summary="120 warnings")
+
+    sent = await upload_annotations(
+        session, "owner", "repo", checks.RunDetails(name="lint", id="42"),
+        output, (annotation(i) for i in range(1, 121)))
+    assert sent == 3
+
+    urls = {url for _, url, _ in session.requests}
+    assert urls == {"https://api.github.com/repos/owner/repo/check-runs/42"}
+
+    bodies = [kwargs["json"] for _, _, kwargs in session.requests]
+    assert [len(b["output"]["annotations"]) for b in bodies] == [50, 50, 20]
+    assert bodies[0]["output"]["title"] == "lint"
+    assert bodies[-1]["output"]["annotations"][-1]["start_line"] == 120
@@ -0,0 +1,72 @@
+import pytest
+
+from ...github import checks
+from ..fakes import FakeSession
+
+
+def run_page(names):
+    return {
+        "total_count": len(names),
+        "check_runs": [{"name": n, "id": n, "external_id": n} for n in names],
+    }
+
+
+@pytest.fixture
+def paged_session():
+    url = "https://api.github.com/repos/o/r/commits/sha/check-runs"
+    pages = {
+        url: (run_page(["a", "b"]), {"next": {"url": url + "?page=2"}}),
+        url + "?page=2": (run_page(["c", "d"]), {"next": {"url": url + "?page=3"}}),
+        url + "?page=3": (run_page(["e"]), None),
+    }
+
+    def respond(method, url, kwargs):
+        body, links = pages[url]
+        return 200, body, None, links
+
+    return FakeSession(respond)
+
+
+@pytest.mark.asyncio
+async def test_get_runs_pagination(paged_session):
+    get = checks.GetRuns(
+        owner="o", repo="r", ref="sha", check_name="c", filter="latest")
+
+    runs = await get.execute(paged_session)
+    assert [r.name for r in runs] == ["a", "b", "c", "d", "e"]
+    assert all(isinstance(r, checks.RunDetails) for r in runs)
+
+    assert len(paged_session.requests) == 3
+    assert [(u, kw.get("params")) for _, u, kw in paged_session.requests] == [
+        (get.url, dict(per_page="100", check_name="c", filter="latest")),
+        (get.url + "?page=2", None),
+        (get.url + "?page=3", None),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_get_runs_find(paged_session):
+    get = checks.GetRuns(owner="o", repo="r", ref="sha")
+
+    run = await get.find(paged_session, lambda r: r.external_id == "c")
+    assert run.id == "c"
+    # Stops after the page containing the match
+    assert len(paged_session.requests) == 2
+
+    assert await get.find(paged_session, lambda r: False) is None
+
+
+@pytest.mark.asyncio
+async def test_get_runs_output():
+    page = run_page(["a", "b"])
+    page["check_runs"][0]["output"] = {
+        "title": None, "summary": None, "annotations_count": 0}
+    page["check_runs"][1]["output"] = {
+        "title": "lint", "summary": "2 warnings", "annotations_count": 2}
+    session = FakeSession(lambda method, url, kwargs: (200, page))
+
+    a, b = await checks.GetRuns(owner="o", repo="r", ref="sha").execute(
+        session)
+    # Runs without output are listed with a null title and summary
+    assert a.output is None
+    assert b.output == checks.Output(title="lint", summary="2 warnings")
@@ -1,10 +1,9 @@
 import pytest
 
-from ...github.gitcredentials import credential_helper
-
-pytestmark = pytest.mark.asyncio
+from ...github.gitcredentials import credential_helper, credential_eraser
 
 
+@pytest.mark.asyncio
 async def test_credential_helper():
     async def test_token(name):
         return {"test": "testtoken", "test2": "testtoken2"}.get(name)
@@ -77,3 +76,24 @@ wat
     """.strip()
     with pytest.raises(ValueError):
         await credential_helper(invalid_input, test_token)
+
+
+def test_credential_eraser():
+    evicted = []
+
+    credential_eraser(
+        "host=github.com\nprotocol=https\npath=test/repo\n"
+        "username=x-access-token\npassword=testtoken",
+        evicted.append)
+    assert evicted == ["test"]
+
+    # Ignores credentials not issued by the helper
+    credential_eraser(
+        "host=github.com\nprotocol=https\npath=test2/repo\n"
+        "username=user\npassword=pass",
+        evicted.append)
+    credential_eraser(
+        "host=gitlab.com\nprotocol=https\npath=test2/repo\n"
+        "username=x-access-token\npassword=testtoken",
+        evicted.append)
+    assert evicted == ["test"]
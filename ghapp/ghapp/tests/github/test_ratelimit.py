@@ -0,0 +1,94 @@
+import time
+import asyncio
+import email.utils
+
+import pytest
+
+from ...github.ratelimit import (
+    OutboundScheduler, Priority, is_rate_limited, rate_limit_message,
+    retry_after)
+from ..fakes import FakeResponse
+
+
+@pytest.mark.asyncio
+async def test_is_rate_limited():
+    assert not is_rate_limited(FakeResponse(200))
+    assert not is_rate_limited(FakeResponse(403))
+    assert is_rate_limited(FakeResponse(429))
+    assert is_rate_limited(FakeResponse(403, headers={"Retry-After": "1"}))
+    assert is_rate_limited(
+        FakeResponse(403, headers={"X-RateLimit-Remaining": "0"}))
+
+    # Secondary rate limits, identified by message
+    secondary = FakeResponse(403, {
+        "message": "You have exceeded a secondary rate limit."})
+    assert not is_rate_limited(secondary)
+    assert is_rate_limited(secondary, await rate_limit_message(secondary))
+    assert await rate_limit_message(FakeResponse(404, {"message": "x"})) == ""
+
+
+def test_retry_after():
+    now = time.time()
+    assert retry_after("30", now) == 30
+    assert retry_after(
+        email.utils.formatdate(now + 120, usegmt=True), now) == pytest.approx(
+            120, abs=1)
+    assert retry_after(email.utils.formatdate(now - 5, usegmt=True), now) == 0
+    assert retry_after("soon", now) is None
+
+    scheduler = OutboundScheduler(clock=lambda: now)
+    assert scheduler.update("test", FakeResponse(403, headers={
+        "Retry-After": email.utils.formatdate(now + 120, usegmt=True)}))
+    assert scheduler.stats()["budgets"]["test"]["blocked_for"] == (
+        pytest.approx(120, abs=1))
+
+
+@pytest.mark.asyncio
+async def test_reserve():
+    scheduler = OutboundScheduler(reserve=2)
+
+    assert not scheduler.update("test", FakeResponse(200, headers={
+        "X-RateLimit-Limit": "5000",
+        "X-RateLimit-Remaining": "2",
+        "X-RateLimit-Reset": str(time.time() + .2),
+    }))
+
+    # Final updates spend the reserve, progress waits for the reset.
+    await asyncio.wait_for(scheduler.acquire("test", Priority.final), .1)
+    progress = asyncio.ensure_future(
+        scheduler.acquire("test", Priority.progress))
+    await asyncio.sleep(.05)
+    assert not progress.done()
+    assert scheduler.stats()["queued"] == 1
+
+    await asyncio.wait_for(progress, 1)
+    assert scheduler.stats()["queued"] == 0
+
+    # Other installations have independent budgets.
+    await asyncio.wait_for(scheduler.acquire("other", Priority.progress), .1)
+
+
+@pytest.mark.asyncio
+async def test_retry_after_priority():
+    scheduler = OutboundScheduler()
+
+    assert scheduler.update(
+        "test", FakeResponse(403, headers={"Retry-After": ".1"}))
+    assert scheduler.stats()["budgets"]["test"]["blocked_for"] > 0
+
+    sent = []
+
+    async def send(name, priority):
+        await scheduler.acquire("test", priority)
+        sent.append(name)
+
+    waiting = [
+        asyncio.ensure_future(send("progress", Priority.progress)),
+        asyncio.ensure_future(send("normal", Priority.normal)),
+        asyncio.ensure_future(send("final", Priority.final)),
+    ]
+    await asyncio.sleep(.05)
+    assert sent == []
+
+    await asyncio.wait_for(asyncio.gather(*waiting), 1)
+    assert sent == ["final", "normal", "progress"]
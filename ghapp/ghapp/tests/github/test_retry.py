@@ -0,0 +1,48 @@
+import pytest
+
+from ...github.retry import CircuitBreaker, CircuitOpenError, RetryPolicy
+from ..test_cache import FakeClock
+
+
+def test_retry_delay():
+    policy = RetryPolicy(backoff=.5, max_backoff=3, random=lambda: 1.0)
+    assert [policy.delay(a) for a in range(4)] == [.5, 1, 2, 3]
+
+    jittered = RetryPolicy(backoff=.5, random=lambda: .5)
+    assert jittered.delay(2) == 1
+
+
+def test_circuit_breaker():
+    clock = FakeClock()
+    breaker = CircuitBreaker("api.github.com", threshold=2, cooldown=30,
+                             clock=clock)
+
+    breaker.failure()
+    breaker.check()
+    breaker.success()
+
+    # Opens after consecutive failures, failing fast
+    breaker.failure()
+    breaker.failure()
+    assert breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+    # Single probe per cooldown, a failed probe reopening the circuit
+    clock.now += 30
+    breaker.check()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    breaker.failure()
+
+    clock.now += 29
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+    clock.now += 1
+    breaker.check()
+    breaker.success()
+    assert not breaker.is_open
+    breaker.check()
+
+    assert breaker.stats() == dict(open=False, failures=0, rejected=3)
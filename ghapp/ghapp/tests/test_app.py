@@ -1,8 +1,11 @@
 import pytest
 import os
 import hmac
+import asyncio
 
 from ..app import Main, BuildkiteHooks, GithubHooks
+from ..payload import MAX_BODY_ENV_VAR
+from ..workqueue import WorkQueue
 
 
 @pytest.fixture
@@ -38,7 +41,14 @@ async def test_zen(
     monkeypatch.setenv(GithubHooks.SECRET_ENV_VAR, github_ping_secret)
     monkeypatch.setenv(BuildkiteHooks.SECRET_ENV_VAR, buildkite_ping_secret)
 
-    client = await test_client(lambda loop: Main.setup(loop=loop).app)
+    mains = []
+
+    def setup(loop):
+        mains.append(Main.setup(loop=loop))
+        return mains[-1].app
+
+    client = await test_client(setup)
+    main, = mains
 
     resp = await client.get('/')
     assert resp.status == 404
@@ -63,6 +73,9 @@ async def test_zen(
         data=github_ping_body)
     assert resp.status == 200, await resp.text()
 
+    # Handled after acknowledgement by work queue
+    await main.work.join()
+
     resp = await client.get('/zen')
     assert resp.status == 200
     text = await resp.text()
@@ -77,3 +90,165 @@ async def test_zen(
         },
         data=buildkite_ping_body)
     assert resp.status == 200, await resp.text()
+
+
+async def test_metrics(
+        test_client,
+        github_ping_secret,
+        buildkite_ping_secret,
+        monkeypatch,
+):
+    monkeypatch.setenv(GithubHooks.SECRET_ENV_VAR, github_ping_secret)
+    monkeypatch.setenv(BuildkiteHooks.SECRET_ENV_VAR, buildkite_ping_secret)
+
+    client = await test_client(lambda loop: Main.setup(loop=loop).app)
+
+    # No job checks without an app identity
+    resp = await client.get('/metrics')
+    assert resp.status == 200
+    assert set(await resp.json()) == {"work", "dedup"}
+
+
+async def test_webhook_backpressure(
+        test_client,
+        github_ping_body,
+        github_ping_secret,
+        buildkite_ping_secret,
+        monkeypatch,
+):
+    monkeypatch.setenv(GithubHooks.SECRET_ENV_VAR, github_ping_secret)
+    monkeypatch.setenv(BuildkiteHooks.SECRET_ENV_VAR, buildkite_ping_secret)
+    monkeypatch.setenv(WorkQueue.QUEUE_SIZE_ENV_VAR, "1")
+    monkeypatch.setenv(WorkQueue.WORKERS_ENV_VAR, "1")
+
+    mains = []
+
+    def setup(loop):
+        mains.append(Main.setup(loop=loop))
+        return mains[-1].app
+
+    client = await test_client(setup)
+    main, = mains
+
+    # Block the single worker, filling the queue
+    blocked = asyncio.Event()
+    main.work.submit(blocked.wait)
+    await asyncio.sleep(0)
+    main.work.submit(blocked.wait)
+
+    async def post():
+        return await client.post(
+            "/webhooks/github",
+            headers={
+                "X-GitHub-Event": "ping",
+                "X-Hub-Signature": 'sha1=' + hmac.new(
+                    github_ping_secret.encode(), msg=github_ping_body,
+                    digestmod='sha1').hexdigest(),
+                "content-type": "application/json",
+            },
+            data=github_ping_body)
+
+    resp = await post()
+    assert resp.status == 503
+    assert main.work.stats()["rejected"] == 1
+
+    # Rejected deliveries are accepted when resent, then deduplicated
+    blocked.set()
+    await main.work.join()
+    resp = await post()
+    assert resp.status == 200
+    assert await resp.text() == ""
+
+    resp = await post()
+    assert resp.status == 200
+    assert await resp.text() == "duplicate delivery"
+    assert main.dedup.stats()["dropped"] == 1
+
+
+async def test_github_signature(
+        test_client,
+        github_ping_body,
+        github_ping_secret,
+        buildkite_ping_secret,
+        monkeypatch,
+):
+    monkeypatch.setenv(GithubHooks.SECRET_ENV_VAR, github_ping_secret)
+    monkeypatch.setenv(BuildkiteHooks.SECRET_ENV_VAR, buildkite_ping_secret)
+    monkeypatch.setenv(MAX_BODY_ENV_VAR, str(len(github_ping_body)))
+
+    client = await test_client(lambda loop: Main.setup(loop=loop).app)
+
+    def sign(digestmod, body=github_ping_body):
+        return digestmod + "=" + hmac.new(
+            github_ping_secret.encode(), msg=body,
+            digestmod=digestmod).hexdigest()
+
+    async def post(headers, body=github_ping_body):
+        return await client.post(
+            "/webhooks/github",
+            headers=dict(
+                headers, **{
+                    "X-GitHub-Event": "ping",
+                    "content-type": "application/json",
+                }),
+            data=body)
+
+    resp = await post({"X-Hub-Signature-256": sign("sha256")})
+    assert resp.status == 200, await resp.text()
+
+    # sha256 is verified in preference to sha1
+    resp = await post({
+        "X-Hub-Signature-256": sign("sha256", b"other"),
+        "X-Hub-Signature": sign("sha1"),
+    })
+    assert resp.status == 401
+    assert await resp.text() == "invalid x-hub-signature-256"
+
+    resp = await post({"X-Hub-Signature": sign("sha1", b"other")})
+    assert resp.status == 401
+
+    body = github_ping_body + b" "
+    resp = await post({"X-Hub-Signature-256": sign("sha256", body)}, body)
+    assert resp.status == 413
+
+
+async def test_webhook_redelivery_after_failure(
+        test_client,
+        github_ping_body,
+        github_ping_secret,
+        buildkite_ping_secret,
+        monkeypatch,
+):
+    monkeypatch.setenv(GithubHooks.SECRET_ENV_VAR, github_ping_secret)
+    monkeypatch.setenv(BuildkiteHooks.SECRET_ENV_VAR, buildkite_ping_secret)
+
+    mains = []
+
+    def setup(loop):
+        mains.append(Main.setup(loop=loop))
+        return mains[-1].app
+
+    client = await test_client(setup)
+    main, = mains
+
+    async def post(body):
+        return await client.post(
+            "/webhooks/github",
+            headers={
+                "X-GitHub-Event": "ping",
+                "X-GitHub-Delivery": "72d3162e",
+                "X-Hub-Signature-256": "sha256=" + hmac.new(
+                    github_ping_secret.encode(), msg=body,
+                    digestmod="sha256").hexdigest(),
+                "content-type": "application/json",
+            },
+            data=body)
+
+    # Deliveries failing to parse are forgotten, and accepted when resent
+    resp = await post(github_ping_body[:-10])
+    assert resp.status == 500
+
+    resp = await post(github_ping_body)
+    assert resp.status == 200
+    assert await resp.text() == ""
+    assert main.dedup.stats()["dropped"] == 0
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from ..github import checks
+from ..batcher import UpdateBatcher, merge_run_details
+
+
+def test_merge_run_details():
+    started = checks.RunDetails(
+        name="job",
+        status=checks.Status.in_progress,
+        started_at="2018-06-14T02:39:59Z")
+    finished = checks.RunDetails(
+        name="job",
+        status=checks.Status.completed,
+        conclusion=checks.Conclusion.success,
+        completed_at="2018-06-14T02:41:12Z")
+
+    merged = merge_run_details(started, finished)
+    assert merged.status == checks.Status.completed
+    assert merged.conclusion == checks.Conclusion.success
+    assert merged.started_at == "2018-06-14T02:39:59Z"
+    assert merged.completed_at == "2018-06-14T02:41:12Z"
+
+
+@pytest.mark.asyncio
+async def test_update_batcher():
+    sent = []
+
+    async def flush(key, run, context):
+        sent.append((key, run.status, context))
+
+    batcher = UpdateBatcher(flush, window=.05)
+
+    queued = checks.RunDetails(name="a", status=checks.Status.queued)
+    running = checks.RunDetails(name="a", status=checks.Status.in_progress)
+    done = checks.RunDetails(name="a", status=checks.Status.completed)
+
+    # In progress updates are merged within the window
+    merged = [
+        await batcher.submit("a", queued, 1),
+        await batcher.submit("a", running, 2),
+    ]
+    await batcher.submit("b", queued, 3)
+    assert sent == []
+    assert merged[0] is merged[1] and not merged[0].done()
+
+    await asyncio.sleep(.1)
+    assert merged[0].result() is True
+    assert sorted(sent) == [
+        ("a", checks.Status.in_progress, 2),
+        ("b", checks.Status.queued, 3),
+    ]
+
+    # Completed updates flush immediately
+    sent.clear()
+    await batcher.submit("a", running, 4)
+    await batcher.submit("a", done, 5)
+    assert sent == [("a", checks.Status.completed, 5)]
+
+    await batcher.submit("c", running, 6)
+    await batcher.close()
+    assert sent[-1] == ("c", checks.Status.in_progress, 6)
+
+    stats = batcher.stats()
+    assert stats["sent"] == 4 and stats["pending"] == 0
+    assert stats["lanes"]["lanes"] == 0
+
+
+@pytest.mark.asyncio
+async def test_update_batcher_failed():
+    async def flush(key, run, context):
+        raise ValueError("failed")
+
+    batcher = UpdateBatcher(flush, window=.01)
+    sent = await batcher.submit("a", checks.RunDetails(name="a"))
+
+    # Failed flushes resolve False, rather than raising
+    assert await asyncio.wait_for(sent, 1) is False
@@ -0,0 +1,69 @@
+from ..cache import LRUCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_cache_eviction():
+    cache = LRUCache(maxsize=2)
+
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+
+    # "b" is least recently used
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+    assert cache.pop("a") == 1
+    assert cache.get("a") is None
+
+
+def test_lru_cache_ttl():
+    clock = FakeClock()
+    cache = LRUCache(maxsize=4, ttl=10, clock=clock)
+
+    cache.put("default", 1)
+    cache.put("short", 2, ttl=1)
+
+    clock.now = 5
+    assert cache.get("default") == 1
+    assert cache.get("short") is None
+
+    clock.now = 10
+    assert cache.get("default") is None
+    assert len(cache) == 0
+
+    assert cache.hits == 1
+    assert cache.misses == 2
+    assert cache.stats()["hit_rate"] == 1 / 3
+
+
+def test_lru_cache_weight():
+    cache = LRUCache(maxsize=4, weigh=len, maxweight=10)
+
+    cache.put("a", "xxxx")
+    cache.put("b", "xxxx")
+    assert cache.weight == 8
+
+    # Least recently used entries are evicted to fit
+    assert cache.get("a") == "xxxx"
+    cache.put("c", "xxxx")
+    assert "b" not in cache
+    assert cache.weight == 8
+
+    # Replaced and popped entries are unweighed, oversize entries not kept
+    cache.put("a", "xx")
+    assert cache.weight == 6
+    cache.pop("c")
+    assert cache.weight == 2
+    cache.put("d", "x" * 11)
+    assert len(cache) == 0 and cache.weight == 0
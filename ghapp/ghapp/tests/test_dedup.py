@@ -0,0 +1,28 @@
+from ..dedup import DeliveryDedup
+from .test_cache import FakeClock
+
+
+def test_dedup():
+    clock = FakeClock()
+    dedup = DeliveryDedup(maxsize=2, ttl=60, clock=clock)
+
+    delivery = dedup.key("github", "72d3162e", b"{}")
+    assert not dedup.is_duplicate(delivery)
+    assert dedup.is_duplicate(delivery)
+
+    # Keyed on content without a delivery id
+    body = dedup.key("buildkite", None, b'{"event": "job.started"}')
+    assert body == dedup.key("buildkite", None, b'{"event": "job.started"}')
+    assert body != dedup.key("buildkite", None, b'{"event": "job.finished"}')
+    assert not dedup.is_duplicate(body)
+    assert dedup.is_duplicate(body)
+
+    # Rejected deliveries are forgotten
+    dedup.forget(body)
+    assert not dedup.is_duplicate(body)
+
+    # Repeats outside the window are accepted
+    clock.now += 61
+    assert not dedup.is_duplicate(delivery)
+
+    assert dedup.stats() == dict(size=2, maxsize=2, seen=6, dropped=2)
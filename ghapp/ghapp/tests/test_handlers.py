@@ -9,7 +9,7 @@ import cattr
 from ..buildkite import jobs
 from ..github import checks
 
-from ..handlers import job_hook_to_check_action, job_environ_to_run_details, job_environ_to_check_action, RepoName
+from ..handlers import job_hook_to_check_action, job_environ_to_run_details, job_environ_to_check_action, job_progress, RepoName
 
 
 def test_check_from_job_env(test_environs):
@@ -889,3 +889,13 @@ def test_repo_parsing():
         n = RepoName.parse(r)
         assert n.owner == "testo", r
         assert n.repo == "testr", r
+
+
+def test_job_progress(test_events):
+    started = cattr.structure(test_events["job.started"], jobs.JobHook).job
+    finished = cattr.structure(test_events["job.finished"], jobs.JobHook).job
+
+    assert job_progress(started) == (2, "2018-06-14 02:39:59 UTC")
+    assert job_progress(started) < job_progress(finished)
+    assert job_progress(attr.evolve(started, created_at=None, scheduled_at=None,
+                                    started_at=None)) == (-1, "")
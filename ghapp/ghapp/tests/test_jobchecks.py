@@ -0,0 +1,135 @@
+import os
+import json
+
+import pytest
+
+from ..github import checks
+from ..github.ratelimit import Priority
+from ..jobchecks import JobChecks
+from ..runindex import RunIndex
+from .fakes import FakeSession
+
+
+def fake_github(runs=()):
+    """Installation session stand-in serving check api requests."""
+
+    def respond(method, url, kwargs):
+        if method == "GET":
+            return 200, {"check_runs": list(runs)}
+        if method == "POST":
+            return 201, {"id": 1234}
+        return 200, {}
+
+    return FakeSession(respond)
+
+
+@pytest.fixture
+def test_events():
+    bd = os.path.dirname(__file__)
+
+    return {
+        "job.finished": json.load(open(bd + "/buildkite.job.finished.json")),
+        "job.started": json.load(open(bd + "/buildkite.job.started.json")),
+    }
+
+
+def test_run_index():
+    index = RunIndex(maxsize=2)
+
+    assert index.get("a", "job") is None
+    index.update("a", [
+        checks.RunDetails(name="job", id="1", external_id="job"),
+        checks.RunDetails(name="other", id="2"),
+    ])
+    assert index.get("a", "job") == "1"
+    assert index.get("a", "other") is None
+
+    index.put("b", "job", 2)
+    index.put("c", "job", 3)
+    assert index.get("b", "job") == "2"
+    # "a" evicted as least recently used
+    assert index.get("a", "job") is None
+
+    assert index.stats()["hits"] == 2
+    assert index.stats()["misses"] == 3
+
+
+@pytest.mark.asyncio
+async def test_job_checks_index(test_events):
+    github = fake_github()
+    job_checks = JobChecks(github, debounce=0)
+
+    runs_url = ("https://api.github.com/repos/uw-ipd/tmol/commits/"
+                "45c4577a6292036db032e30614fe13107d503204/check-runs")
+    run_url = "https://api.github.com/repos/uw-ipd/tmol/check-runs"
+
+    # Miss, listing runs before creating
+    await job_checks.handle_job_hook("job.started", test_events["job.started"])
+    assert github.sent() == [("GET", runs_url), ("POST", run_url)]
+    assert github.account == "uw-ipd"
+    assert github.priority == Priority.progress
+
+    # Hit on run created by server, updating without listing
+    github.requests.clear()
+    await job_checks.handle_job_hook(
+        "job.finished", test_events["job.finished"])
+    assert github.sent() == [("PATCH", run_url + "/1234")]
+    assert github.priority == Priority.final
+
+    assert job_checks.stats()["run_index"]["hits"] == 1
+    assert job_checks.stats()["run_index"]["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_job_checks_existing_run(test_events):
+    github = fake_github(runs=[{
+        "name": ":shrug: Testing",
+        "id": 42,
+        "external_id": "61f6162e-e06c-4c1d-ba43-b1e13e276f3f",
+    }])
+    job_checks = JobChecks(github, debounce=0)
+
+    # Miss, updating run found in listing
+    await job_checks.handle_job_hook(
+        "job.finished", test_events["job.finished"])
+    assert github.sent()[-1] == (
+        "PATCH", "https://api.github.com/repos/uw-ipd/tmol/check-runs/42")
+    assert job_checks.index.get(
+        "45c4577a6292036db032e30614fe13107d503204",
+        "61f6162e-e06c-4c1d-ba43-b1e13e276f3f") == "42"
+
+
+@pytest.mark.asyncio
+async def test_job_checks_debounce(test_events):
+    github = fake_github()
+    job_checks = JobChecks(github, debounce=60)
+
+    # Started event is held, and merged into the final update.
+    await job_checks.handle_job_hook("job.started", test_events["job.started"])
+    assert github.sent() == []
+
+    await job_checks.handle_job_hook(
+        "job.finished", test_events["job.finished"])
+    assert [m for m, _ in github.sent()] == ["GET", "POST"]
+    assert job_checks.stats()["updates"] == dict(
+        submitted=2, sent=1, pending=0,
+        lanes=dict(ran=1, waited=0, lanes=0))
+
+
+@pytest.mark.asyncio
+async def test_job_checks_stale(test_events):
+    github = fake_github()
+    job_checks = JobChecks(github, debounce=0)
+
+    # Started event delivered after finished is dropped
+    await job_checks.handle_job_hook(
+        "job.finished", test_events["job.finished"])
+    await job_checks.handle_job_hook("job.started", test_events["job.started"])
+    assert [m for m, _ in github.sent()] == ["GET", "POST"]
+    assert job_checks.stats()["stale"] == 1
+
+    # Repeats of the latest event are applied
+    await job_checks.handle_job_hook(
+        "job.finished", test_events["job.finished"])
+    assert [m for m, _ in github.sent()] == ["GET", "POST", "PATCH"]
+    assert job_checks.stats()["stale"] == 1
@@ -0,0 +1,184 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from ..journal import Delivery, DeliveryJournal
+from ..workqueue import WorkQueue
+from .. import workqueue
+
+
+@pytest.mark.asyncio
+async def test_journal(tmpdir):
+    path = str(tmpdir.join("journal.db"))
+
+    journal = DeliveryJournal(path)
+    await journal.open()
+
+    # Concurrent appends are group committed
+    ids = await asyncio.gather(*[
+        journal.append("buildkite", "job.started", {"n": n})
+        for n in range(100)
+    ])
+    assert ids == sorted(set(ids))
+    assert journal.commits < 100
+
+    for id in ids[:98]:
+        journal.complete(id)
+    await journal.close()
+
+    stats = journal.stats()
+    assert stats["appended"] == 100
+    assert stats["completed"] == 98
+    assert stats["batch_size"] > 1
+    assert stats["latency_ms"]["p50"] <= stats["latency_ms"]["max"]
+
+    # Unfinished deliveries survive reopening
+    journal = DeliveryJournal(path)
+    await journal.open()
+    assert await journal.pending() == [
+        Delivery(ids[98], "buildkite", "job.started", {"n": 98}),
+        Delivery(ids[99], "buildkite", "job.started", {"n": 99}),
+    ]
+    await journal.close()
+
+
+def test_resolve(monkeypatch):
+    monkeypatch.delenv(DeliveryJournal.PATH_ENV_VAR, raising=False)
+    with pytest.raises(ValueError):
+        DeliveryJournal()
+
+    monkeypatch.setenv(DeliveryJournal.PATH_ENV_VAR, "/tmp/journal.db")
+    assert DeliveryJournal().path == "/tmp/journal.db"
+
+
+@pytest.mark.asyncio
+async def test_replay(tmpdir):
+    path = str(tmpdir.join("journal.db"))
+
+    handled = []
+
+    async def send(name, body):
+        handled.append((name, body))
+
+    async def interrupted(name, body):
+        await asyncio.Event().wait()
+
+    # Deliveries in progress at shutdown are left in the journal
+    work = WorkQueue(maxsize=10, workers=1, journal=DeliveryJournal(path))
+    await work.start()
+    assert await work.deliver("github", send, "ping", {"zen": "a"})
+    assert await work.deliver("github", interrupted, "ping", {"zen": "b"})
+    assert await work.deliver("github", send, "unknown", {})
+    await asyncio.sleep(.05)
+    await work.close(timeout=.05)
+    assert handled == [("ping", {"zen": "a"})]
+
+    # And replayed at startup
+    handled.clear()
+    work = WorkQueue(maxsize=1, workers=1, journal=DeliveryJournal(path))
+    await work.start()
+    await work.replay(
+        lambda source, name: send if name == "ping" else None)
+    await work.join()
+    assert handled == [("ping", {"zen": "b"})]
+    assert work.stats()["replayed"] == 1
+    await work.close()
+
+    journal = DeliveryJournal(path)
+    await journal.open()
+    assert await journal.pending() == []
+    await journal.close()
+
+
+@pytest.mark.asyncio
+async def test_completion(tmpdir):
+    path = str(tmpdir.join("journal.db"))
+    updates = {}
+
+    async def fail(name, body):
+        raise ValueError("failed")
+
+    async def debounced(name, body):
+        workqueue.defer(updates.setdefault(
+            body["n"], asyncio.get_event_loop().create_future()))
+
+    work = WorkQueue(maxsize=10, workers=1, journal=DeliveryJournal(path))
+    await work.start()
+    assert await work.deliver("buildkite", fail, "job.started", {"n": 0})
+    for n in (1, 2):
+        assert await work.deliver("buildkite", debounced, "job.started",
+                                  {"n": n})
+    await work.join()
+    assert work.stats()["deferred"] == 2
+
+    # Deliveries complete once deferred updates are sent, failed deliveries
+    # and unsent updates are left for replay
+    updates[1].set_result(True)
+    updates[2].set_result(False)
+    await work.close()
+
+    journal = DeliveryJournal(path)
+    await journal.open()
+    assert [d.body["n"] for d in await journal.pending()] == [0, 2]
+    await journal.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_completion(tmpdir):
+    journal = DeliveryJournal(str(tmpdir.join("journal.db")))
+    await journal.open()
+    id = await journal.append("github", "ping", {})
+
+    write = journal._write
+
+    def failing(appends, completes):
+        raise OSError("disk full")
+
+    # Completions are retried with the next commit after a failed write
+    journal._write = failing
+    journal.complete(id)
+    await journal._flushing
+    journal._write = write
+    await journal.append("github", "ping", {})
+    assert journal.completed == 1
+    await journal.close()
+
+
+@pytest.mark.asyncio
+async def test_dead_letter(tmpdir):
+    path = str(tmpdir.join("journal.db"))
+    attempts = []
+
+    async def fail(name, body):
+        attempts.append(body["n"])
+        raise ValueError("failed")
+
+    work = WorkQueue(maxsize=10, workers=1,
+                     journal=DeliveryJournal(path, max_replays=2))
+    await work.start()
+    assert await work.deliver("github", fail, "ping", {"n": 0})
+    await work.close()
+
+    # Failing deliveries are replayed up to max_replays times
+    for _ in range(3):
+        journal = DeliveryJournal(path, max_replays=2)
+        work = WorkQueue(maxsize=10, workers=1, journal=journal)
+        await work.start()
+        work.start_replay(lambda source, name: fail)
+        await asyncio.sleep(.05)
+        await work.close()
+
+    assert attempts == [0, 0, 0]
+    assert journal.stats()["dead_lettered"] == 1
+
+    # And then dead-lettered
+    journal = DeliveryJournal(path)
+    await journal.open()
+    assert await journal.pending() == []
+    await journal.close()
+
+    db = sqlite3.connect(path)
+    assert db.execute(
+        "SELECT id, attempts FROM dead_deliveries").fetchall() == [(1, 2)]
+    db.close()
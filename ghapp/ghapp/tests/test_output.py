@@ -0,0 +1,54 @@
+from ..output import (
+    MAX_OUTPUT_CHARS, read_if_file, read_text, truncate_text)
+
+
+def test_truncate_text():
+    assert truncate_text(None) is None
+    assert truncate_text("short") == "short"
+
+    lines = ["line %s" % i for i in range(20000)]
+    text = truncate_text("\n".join(lines))
+    assert len(text) <= MAX_OUTPUT_CHARS
+    assert text.startswith("line 0\n")
+    assert text.endswith("line 19999")
+    assert "characters truncated" in text
+
+    # Cut at line boundaries
+    head, _, tail = text.partition("\n\n*...")
+    assert head.splitlines()[-1] in lines
+    assert tail.splitlines()[2] in lines
+
+
+def test_truncate_fences():
+    text = "```\n" + "x\n" * 100 + "```\n"
+    cut = truncate_text(text, limit=100)
+    assert len(cut) <= 100
+
+    head, _, tail = cut.partition("\n\n*...")
+    assert head.endswith("\n```")
+    assert tail.split("\n")[2] == "```"
+    assert cut.count("```") == 4
+
+
+def test_read_text(tmpdir):
+    small = tmpdir.join("small.md")
+    small.write_text("héllo", encoding="utf-8")
+    assert read_text(str(small)) == "héllo"
+
+    # Multi-byte characters at every offset
+    big = tmpdir.join("big.log")
+    big.write_text("é€😀" * 100000, encoding="utf-8")
+
+    for limit in (1000, 1001, 1002, 1003):
+        text = read_text(str(big), limit=limit)
+        assert len(text) <= limit
+        assert "�" not in text
+        assert "bytes truncated" in text
+
+
+def test_read_if_file(tmpdir):
+    path = tmpdir.join("summary.md")
+    path.write("summary")
+    assert read_if_file(str(path)) == "summary"
+    assert read_if_file("literal") == "literal"
+    assert len(read_if_file("x" * 100000)) <= MAX_OUTPUT_CHARS
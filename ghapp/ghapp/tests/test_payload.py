@@ -0,0 +1,91 @@
+import hmac
+import json
+import hashlib
+
+import pytest
+import aiohttp
+from aiohttp import web
+
+from ..payload import BodyTooLarge, parse_body, read_body
+
+
+async def serve_post(path, handler, **kwargs):
+    """Post to a handler served over a unix socket, returning its response."""
+    app = web.Application()
+    app.router.add_post("/", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.UnixSite(runner, path).start()
+
+    try:
+        async with aiohttp.ClientSession(
+                connector=aiohttp.UnixConnector(path=path)) as session:
+            async with session.post("http://ghapp/", **kwargs) as resp:
+                return resp.status, await resp.text()
+    finally:
+        await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_read_body(tmpdir):
+    path = str(tmpdir.join("payload.sock"))
+    payload = json.dumps({"data": "x" * 200000}).encode()
+    results = {}
+
+    async def handler(req):
+        mac = hmac.new(b"secret", digestmod="sha256")
+        raw = await read_body(req, len(payload), [mac])
+        results["mac"] = mac.hexdigest()
+
+        # Cached for later readers
+        again = hmac.new(b"secret", digestmod="sha256")
+        assert await read_body(req, len(payload), [again]) is raw
+        assert again.hexdigest() == results["mac"]
+
+        results["body"] = parse_body(req, raw)
+        assert parse_body(req, raw) is results["body"]
+        return web.Response()
+
+    assert (await serve_post(path, handler, data=payload))[0] == 200
+    assert results["mac"] == hmac.new(
+        b"secret", payload, hashlib.sha256).hexdigest()
+    assert results["body"] == {"data": "x" * 200000}
+
+    # Bodies without a content length are verified as streamed
+    async def chunks():
+        for start in range(0, len(payload), 65536):
+            yield payload[start:start + 65536]
+
+    results.clear()
+    assert (await serve_post(path, handler, data=chunks()))[0] == 200
+    assert results["mac"] == hmac.new(
+        b"secret", payload, hashlib.sha256).hexdigest()
+    assert results["body"] == {"data": "x" * 200000}
+
+    async def form_handler(req):
+        results["form"] = parse_body(req, await read_body(req, 1024))
+        return web.Response()
+
+    await serve_post(path, form_handler, data={"payload": json.dumps({"zen": "ping"})})
+    assert results["form"] == {"zen": "ping"}
+
+
+@pytest.mark.asyncio
+async def test_read_body_limit(tmpdir):
+    path = str(tmpdir.join("payload.sock"))
+    async def handler(req):
+        try:
+            await read_body(req, 1024)
+        except BodyTooLarge:
+            return web.Response(status=413)
+        return web.Response()
+
+    assert (await serve_post(path, handler, data=b"x" * 1024))[0] == 200
+    assert (await serve_post(path, handler, data=b"x" * 1025))[0] == 413
+
+    # Bodies without a content length are capped while streamed
+    async def chunks():
+        for _ in range(4):
+            yield b"x" * 512
+
+    assert (await serve_post(path, handler, data=chunks()))[0] == 413
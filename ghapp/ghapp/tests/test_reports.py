@@ -0,0 +1,170 @@
+import io
+import json
+
+import pytest
+
+from ..github import checks
+from .. import reports
+
+junit_report = b"""<?xml version="1.0" encoding="UTF-8"?>
+<testsuites>
+  <testsuite name="tests" tests="5">
+    <testcase classname="tests.test_a" name="test_pass" time="0.1"/>
+    <testcase classname="tests.test_a" name="test_fail"
+              file="tests/test_a.py" line="12">
+      <failure message="assert 1 == 2" type="AssertionError">trace</failure>
+      <system-out>output</system-out>
+    </testcase>
+    <testcase classname="tests.test_a" name="test_error">
+      <error message="boom"/>
+    </testcase>
+    <testcase classname="tests.test_a" name="test_skip">
+      <skipped message="later"/>
+    </testcase>
+    <testcase classname="tests.test_b" name="test_pass"/>
+  </testsuite>
+</testsuites>
+"""
+
+checkstyle_report = b"""<?xml version="1.0" encoding="UTF-8"?>
+<checkstyle version="4.3">
+  <file name="src/a.py">
+    <error line="1" column="4" severity="error" message="E1" source="lint.E1"/>
+    <error line="2" severity="warning" message="W1" source="lint.W1"/>
+  </file>
+  <file name="src/b.py">
+    <error line="3" severity="info" message="I1" source="lint.I1"/>
+  </file>
+</checkstyle>
+"""
+
+sarif_report = {
+    "version": "2.1.0",
+    "runs": [{
+        "tool": {"driver": {"name": "lint", "rules": [{"id": "R1"}]}},
+        "results": [{
+            "ruleId": "R1",
+            "level": "error",
+            "message": {"text": "brace } in [message]"},
+            "locations": [{"physicalLocation": {
+                "artifactLocation": {"uri": "src/a.py"},
+                "region": {"startLine": 5, "startColumn": 2},
+            }}],
+        }, {
+            "ruleId": "R2",
+            "message": {"text": "default level"},
+        }, {
+            "ruleId": "R3",
+            "level": "none",
+            "message": {"text": "ignored"},
+        }],
+    }],
+}
+
+
+def test_junit():
+    summary = reports.ReportSummary()
+    reports.ingest_junit(io.BytesIO(junit_report), summary)
+
+    assert summary.counts["tests"] == 5
+    assert summary.counts["passed"] == 2
+    assert summary.counts["failures"] == 1
+    assert summary.counts["errors"] == 1
+    assert summary.counts["skipped"] == 1
+
+    failure, error = summary.findings()
+    assert failure.name == "tests.test_a.test_fail"
+    assert failure.message == "assert 1 == 2"
+    assert failure.details == "trace"
+    assert error.message == "boom"
+
+    # Only findings with a path are annotations
+    annotation, = summary.annotations()
+    assert annotation.path == "tests/test_a.py"
+    assert annotation.start_line == 12
+
+    output = summary.output()
+    assert output.title == "5 tests, 1 failures, 1 errors, 1 skipped"
+    assert "tests.test_a.test_fail" in output.text
+
+
+def test_checkstyle():
+    summary = reports.ReportSummary()
+    reports.ingest_checkstyle(io.BytesIO(checkstyle_report), summary)
+
+    assert [(f.level, f.path, f.line) for f in summary.findings()] == [
+        (checks.AnnotationLevel.failure, "src/a.py", 1),
+        (checks.AnnotationLevel.warning, "src/a.py", 2),
+        (checks.AnnotationLevel.notice, "src/b.py", 3),
+    ]
+    assert summary.findings()[0].column == 4
+    assert summary.title == "1 failure, 1 warning, 1 notice"
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 16])
+def test_iter_json_items(chunk_size):
+    doc = json.dumps(sarif_report, indent=1)
+    results = list(reports.iter_json_items(
+        io.StringIO(doc), ("runs", None, "results"), chunk_size=chunk_size))
+    assert results == sarif_report["runs"][0]["results"]
+
+    # Scalar items, and arrays not matching the path
+    doc = '{"a": [[1]], "b": {"a": [12, "x", true]}}'
+    assert list(reports.iter_json_items(
+        io.StringIO(doc), ("b", "a"), chunk_size=chunk_size)) == [12, "x", True]
+
+
+scalars_doc = (
+    '{"a": [[1]], "b": {"a": [1.5, -2e3, 12, "x", true, null, [1], {"c": 1}]}}')
+
+
+@pytest.mark.parametrize("chunk_size", range(1, len(scalars_doc) + 1))
+def test_iter_json_scalars(chunk_size):
+    # Items straddling a read boundary are decoded whole
+    assert list(reports.iter_json_items(
+        io.StringIO(scalars_doc), ("b", "a"), chunk_size=chunk_size)) == [
+            1.5, -2e3, 12, "x", True, None, [1], {"c": 1}]
+
+
+def test_sarif():
+    summary = reports.ReportSummary()
+    reports.ingest_sarif(io.StringIO(json.dumps(sarif_report)), summary)
+
+    error, warning = summary.findings()
+    assert error.level == checks.AnnotationLevel.failure
+    assert (error.path, error.line, error.column) == ("src/a.py", 5, 2)
+    assert warning.level == checks.AnnotationLevel.warning
+    assert warning.path is None
+
+
+def test_bounded_findings():
+    summary = reports.ReportSummary(max_findings=3)
+    for i in range(100):
+        summary.add(reports.Finding(
+            level=(checks.AnnotationLevel.failure if i in (50, 70)
+                   else checks.AnnotationLevel.notice),
+            name=str(i), message=""))
+
+    # Most severe retained, earliest first within a level
+    assert [f.name for f in summary.findings()] == ["50", "70", "0"]
+    assert [f.name for f in summary.top(1)] == ["50"]
+    assert summary.counts["notice"] == 98
+    assert "99 more not shown." in summary.output(top=1).text
+
+
+def test_ingest(tmpdir):
+    junit = tmpdir.join("junit.xml")
+    junit.write_binary(junit_report)
+    checkstyle = tmpdir.join("lint.xml")
+    checkstyle.write_binary(checkstyle_report)
+    sarif = tmpdir.join("lint.sarif")
+    sarif.write(json.dumps(sarif_report))
+
+    assert reports.detect_format(str(junit)) == "junit"
+    assert reports.detect_format(str(checkstyle)) == "checkstyle"
+    assert reports.detect_format(str(sarif)) == "sarif"
+
+    summary = reports.ingest(str(junit))
+    reports.ingest(str(checkstyle), summary)
+    reports.ingest(str(sarif), summary)
+    assert summary.counts["failure"] == 2 + 1 + 1
@@ -0,0 +1,131 @@
+import json
+
+import pytest
+import aiohttp
+from aiohttp import web
+
+from ..payload import parse_body, read_body
+from ..routing import ROUTED_HEADER, WorkerRouter, route_key
+
+
+def test_route_key():
+    assert route_key("buildkite", {
+        "build": {"commit": "abc"},
+        "pipeline": {"repository": "git@github.com:uw-ipd/tmol.git"},
+    }) == "abc"
+    assert route_key("buildkite", {
+        "pipeline": {"repository": "git@github.com:uw-ipd/tmol.git"},
+    }) == "git@github.com:uw-ipd/tmol.git"
+
+    assert route_key("github", {
+        "check_suite": {"head_sha": "def"},
+        "repository": {"full_name": "uw-ipd/tmol"},
+    }) == "def"
+    assert route_key("github", {
+        "repository": {"full_name": "uw-ipd/tmol"},
+    }) == "uw-ipd/tmol"
+    assert route_key("github", {"zen": "ping"}) is None
+
+
+def test_owner(tmpdir):
+    routers = [WorkerRouter(i, 4, str(tmpdir)) for i in range(4)]
+
+    # Owners are stable across processes, and spread keys over workers
+    owners = {routers[0].owner("%040x" % n) for n in range(100)}
+    assert owners == {0, 1, 2, 3}
+    assert len({r.owner("abc") for r in routers}) == 1
+
+    # Events without a key are handled where received
+    assert [r.owner(None) for r in routers] == [0, 1, 2, 3]
+    assert WorkerRouter(0, 1, str(tmpdir)).owner("abc") == 0
+
+
+async def verify(req):
+    if req.headers.get("x-token") != "secret":
+        return web.Response(status=401)
+    return await read_body(req, 1024)
+
+
+@pytest.mark.asyncio
+async def test_forward(tmpdir, unused_tcp_port):
+    handled = []
+    routers = [WorkerRouter(i, 2, str(tmpdir)) for i in range(2)]
+    runners = []
+
+    for router in routers:
+
+        async def handler(req, index=router.index):
+            body = parse_body(req, await read_body(req, 1024))
+            handled.append((index, body, req.headers.get(ROUTED_HEADER)))
+            return web.Response(status=202, headers={"Retry-After": "1"})
+
+        app = web.Application()
+        app.router.add_post("/webhooks/buildkite",
+                            router.route("buildkite", handler, verify))
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.UnixSite(runner, router.socket_path()).start()
+        runners.append(runner)
+    await web.TCPSite(runners[0], "127.0.0.1", unused_tcp_port).start()
+
+    commits = {}
+    for n in range(20):
+        commits.setdefault(routers[0].owner(str(n)), str(n))
+    local, remote = commits[0], commits[1]
+
+    try:
+        async with aiohttp.ClientSession(
+                connector=aiohttp.UnixConnector(
+                    path=routers[0].socket_path())) as session:
+            for commit in (local, remote):
+                async with session.post(
+                        "http://ghapp/webhooks/buildkite",
+                        data=json.dumps({"build": {"commit": commit}}),
+                        headers={
+                            "Content-Type": "application/json",
+                            "x-token": "secret",
+                        }) as resp:
+                    assert resp.status == 202
+                    assert resp.headers["Retry-After"] == "1"
+
+            # Unverified events are rejected before parsing
+            async with session.post(
+                    "http://ghapp/webhooks/buildkite",
+                    json={"build": {"commit": remote}}) as resp:
+                assert resp.status == 401
+
+        # Forwarded events are only accepted on the worker's unix socket
+        async with aiohttp.ClientSession() as session:
+            async with session.post(
+                    "http://127.0.0.1:%s/webhooks/buildkite" % unused_tcp_port,
+                    json={"build": {"commit": remote}},
+                    headers={ROUTED_HEADER: "1", "x-token": "secret"}) as resp:
+                assert resp.status == 202
+
+        async with aiohttp.ClientSession(
+                connector=aiohttp.UnixConnector(
+                    path=routers[0].socket_path())) as session:
+
+            # Owner unavailable, handled locally
+            await runners[1].cleanup()
+            runners.pop()
+            async with session.post(
+                    "http://ghapp/webhooks/buildkite",
+                    json={"build": {"commit": remote}},
+                    headers={"x-token": "secret"}) as resp:
+                assert resp.status == 202
+    finally:
+        for router in routers:
+            await router.close()
+        for runner in runners:
+            await runner.cleanup()
+
+    assert handled == [
+        (0, {"build": {"commit": local}}, None),
+        (1, {"build": {"commit": remote}}, "0"),
+        (1, {"build": {"commit": remote}}, "0"),
+        (0, {"build": {"commit": remote}}, None),
+    ]
+    assert routers[0].stats() == dict(
+        index=0, workers=2, local=2, forwarded=2, fallback=1)
+    assert routers[1].stats()["local"] == 2
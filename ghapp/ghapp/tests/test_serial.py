@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+from ..serial import KeyedSerial
+
+
+@pytest.mark.asyncio
+async def test_keyed_serial():
+    lanes = KeyedSerial()
+    events = []
+    release = {"a": asyncio.Event(), "b": asyncio.Event()}
+
+    async def call(key, n):
+        events.append(("start", key, n))
+        await release[key].wait()
+        events.append(("end", key, n))
+        if n == 2:
+            raise ValueError("failed")
+        return n
+
+    calls = [
+        asyncio.ensure_future(lanes.run("a", call, "a", 1)),
+        asyncio.ensure_future(lanes.run("a", call, "a", 2)),
+        asyncio.ensure_future(lanes.run("a", call, "a", 3)),
+        asyncio.ensure_future(lanes.run("b", call, "b", 1)),
+    ]
+    await asyncio.sleep(.01)
+
+    # Keys run concurrently, calls for a key wait their turn
+    assert events == [("start", "a", 1), ("start", "b", 1)]
+    assert lanes.stats() == dict(ran=2, waited=2, lanes=2)
+
+    release["a"].set()
+    release["b"].set()
+    results = await asyncio.gather(*calls, return_exceptions=True)
+    assert results[0] == 1 and results[2] == 3
+    assert isinstance(results[1], ValueError)
+
+    # Failed calls do not block their lane
+    assert [n for e, k, n in events if k == "a" and e == "start"] == [1, 2, 3]
+    assert lanes.stats() == dict(ran=4, waited=2, lanes=0)
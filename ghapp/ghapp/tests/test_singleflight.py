@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+from ..singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_single_flight():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(.01)
+        if key == "fail":
+            raise ValueError(key)
+        return key.upper()
+
+    results = await asyncio.gather(
+        *[flight.do(k, lambda k=k: fetch(k)) for k in ["a", "a", "b", "a"]])
+    assert results == ["A", "A", "B", "A"]
+    assert calls == ["a", "b"]
+    assert flight.stats() == dict(issued=2, coalesced=2, inflight=0)
+
+    # Completed calls are not reused
+    assert await flight.do("a", lambda: fetch("a")) == "A"
+    assert flight.issued == 3
+
+    # Errors propagate to all waiters
+    results = await asyncio.gather(
+        flight.do("fail", lambda: fetch("fail")),
+        flight.do("fail", lambda: fetch("fail")),
+        return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+
+    # Cancelling one waiter does not cancel the shared call
+    first = asyncio.ensure_future(flight.do("c", lambda: fetch("c")))
+    second = asyncio.ensure_future(flight.do("c", lambda: fetch("c")))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == "C"
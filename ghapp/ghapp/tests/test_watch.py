@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from ..watch import InotifyWatcher, PollingWatcher, ProgressWatch, open_watcher
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("watcher", [
+    InotifyWatcher,
+    lambda paths: PollingWatcher(paths, interval=.01),
+])
+async def test_watcher(tmpdir, watcher):
+    progress = tmpdir.join("progress.md")
+    other = tmpdir.join("other.md")
+    watcher = watcher([str(progress)])
+
+    try:
+        waiting = asyncio.ensure_future(watcher.wait())
+
+        # Changes to other files are ignored
+        other.write("other")
+        await asyncio.sleep(.05)
+        assert not waiting.done()
+
+        progress.write("created")
+        assert await asyncio.wait_for(waiting, 1) == {str(progress)}
+    finally:
+        watcher.close()
+
+
+def test_open_watcher(tmpdir):
+    path = str(tmpdir.join("progress.md"))
+    assert isinstance(open_watcher([path], poll_interval=1), PollingWatcher)
+
+
+@pytest.mark.asyncio
+async def test_progress_watch(tmpdir):
+    progress = tmpdir.join("progress.md")
+    stop = tmpdir.join("progress.md.stop")
+    progress.write("started")
+
+    pushed = []
+
+    async def push(content):
+        pushed.append(content)
+
+    watch = ProgressWatch(
+        str(progress), push, min_interval=.2, stop_file=str(stop))
+    running = asyncio.ensure_future(watch.run())
+
+    await asyncio.sleep(.05)
+    assert pushed == ["started"]
+
+    # Changes within the interval are coalesced
+    progress.write("1/3")
+    await asyncio.sleep(.02)
+    progress.write("2/3")
+    await asyncio.sleep(.3)
+    assert pushed == ["started", "2/3"]
+
+    # Unchanged content is skipped
+    progress.write("2/3")
+    await asyncio.sleep(.3)
+    assert pushed == ["started", "2/3"]
+    assert watch.skipped == 1
+
+    # Last change is pushed on stop, without waiting for the interval
+    progress.write("3/4")
+    await asyncio.sleep(.05)
+    progress.write("4/4")
+    await asyncio.sleep(.02)
+    stop.write("")
+    await asyncio.wait_for(running, .1)
+    assert pushed == ["started", "2/3", "3/4", "4/4"]
+    assert watch.pushed == 4
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from ..workqueue import WorkQueue
+
+
+@pytest.mark.asyncio
+async def test_work_queue():
+    work = WorkQueue(maxsize=2, workers=1)
+    await work.start()
+
+    done = []
+    release = asyncio.Event()
+
+    async def job(name):
+        await release.wait()
+        done.append(name)
+
+    async def fail():
+        raise ValueError("failed")
+
+    # Worker takes the first job, the queue holds two more
+    assert work.submit(job, "a")
+    await asyncio.sleep(0)
+    assert work.submit(job, "b")
+    assert work.submit(fail)
+    assert not work.submit(job, "rejected")
+
+    release.set()
+    await work.join()
+    assert done == ["a", "b"]
+    assert work.stats() == dict(
+        pending=0, maxsize=2, workers=1,
+        submitted=3, rejected=1, processed=2, failed=1, replayed=0)
+
+    # Pending work is drained on close
+    release.clear()
+    work.submit(job, "c")
+    asyncio.get_event_loop().call_later(.01, release.set)
+    await work.close()
+    assert done == ["a", "b", "c"]
+
+
+def test_resolve(monkeypatch):
+    monkeypatch.setenv(WorkQueue.QUEUE_SIZE_ENV_VAR, "10")
+    monkeypatch.setenv(WorkQueue.WORKERS_ENV_VAR, "2")
+    assert WorkQueue().maxsize == 10
+    assert WorkQueue().workers == 2
+
+    with pytest.raises(RuntimeError):
+        WorkQueue().submit(asyncio.sleep, 0)
@@ -0,0 +1,225 @@
+"""Watch a job's progress file, pushing its contents as check run output.
+
+Changes are detected with inotify where available, falling back to polling
+`os.stat`, so an idle watch costs no wakeups on linux. Pushes are throttled
+to `min_interval` and skipped if the file's content hash is unchanged.
+"""
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import os
+import time
+import struct
+import asyncio
+import hashlib
+import logging
+import ctypes
+import ctypes.util
+
+import attr
+import aiohttp
+
+from .output import read_text
+
+logger = logging.getLogger(__name__)
+
+# inotify(7) event masks
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+
+_event_header = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """Waits for writes to or creation of paths, via inotify on their dirs."""
+
+    mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    def __init__(self, paths: Iterable[str]):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        # Raises AttributeError where unavailable.
+        init1, add_watch = libc.inotify_init1, libc.inotify_add_watch
+
+        self.paths = {os.path.abspath(p) for p in paths}
+        self.fd = init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self.dirs: Dict[int, str] = {}
+        try:
+            for d in {os.path.dirname(p) for p in self.paths}:
+                wd = add_watch(self.fd, os.fsencode(d), self.mask)
+                if wd < 0:
+                    raise OSError(
+                        ctypes.get_errno(), "inotify_add_watch failed", d)
+                self.dirs[wd] = d
+        except Exception:
+            os.close(self.fd)
+            raise
+
+    def _read_events(self) -> Set[str]:
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _event_header.unpack_from(data, offset)
+                offset += _event_header.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+
+                if mask & IN_Q_OVERFLOW:
+                    changed.update(self.paths)
+                elif wd in self.dirs:
+                    path = os.path.join(self.dirs[wd], os.fsdecode(name))
+                    if path in self.paths:
+                        changed.add(path)
+
+    async def wait(self) -> Set[str]:
+        """Wait for, and return, changed paths."""
+        loop = asyncio.get_event_loop()
+        while True:
+            readable = loop.create_future()
+            loop.add_reader(
+                self.fd,
+                lambda: readable.done() or readable.set_result(None))
+            try:
+                await readable
+            finally:
+                loop.remove_reader(self.fd)
+
+            changed = self._read_events()
+            if changed:
+                return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher:
+    """Waits for changes to paths' size or mtime, polling every `interval`."""
+
+    def __init__(self, paths: Iterable[str], interval: float = 2.0):
+        self.paths = {os.path.abspath(p) for p in paths}
+        self.interval = interval
+        self.stats = {p: self._stat(p) for p in self.paths}
+
+    @staticmethod
+    def _stat(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    async def wait(self) -> Set[str]:
+        while True:
+            await asyncio.sleep(self.interval)
+
+            changed = set()
+            for path in self.paths:
+                stat = self._stat(path)
+                if stat != self.stats[path]:
+                    self.stats[path] = stat
+                    changed.add(path)
+
+            if changed:
+                return changed
+
+    def close(self):
+        pass
+
+
+def open_watcher(paths: List[str], poll_interval: Optional[float] = None):
+    """inotify watcher, or a polling watcher if unavailable or requested."""
+    if poll_interval is None:
+        try:
+            return InotifyWatcher(paths)
+        except (AttributeError, OSError) as ex:
+            logger.info("inotify unavailable, polling: %s", ex)
+            poll_interval = 2.0
+
+    return PollingWatcher(paths, poll_interval)
+
+
+@attr.s(auto_attribs=True)
+class ProgressWatch:
+    """Pushes the contents of `path` via `push` as it changes.
+
+    Changes within `min_interval` of the last push are coalesced into one
+    push of the latest content, and content matching the last push, by hash,
+    is skipped. Runs until `stop_file` exists, pushing the latest content
+    without waiting for the interval, or until the watch is cancelled.
+    """
+    path: str
+    push: Callable[[str], Awaitable[None]]
+    min_interval: float = 30.0
+    stop_file: Optional[str] = None
+    poll_interval: Optional[float] = None
+    clock: Callable[[], float] = time.monotonic
+
+    pushed: int = 0
+    skipped: int = 0
+
+    _last_hash: Optional[bytes] = attr.ib(default=None, repr=False)
+    _last_push: Optional[float] = attr.ib(default=None, repr=False)
+
+    def stopped(self) -> bool:
+        return self.stop_file is not None and os.path.exists(self.stop_file)
+
+    async def run(self):
+        paths = [self.path] + ([self.stop_file] if self.stop_file else [])
+        watcher = open_watcher(paths, self.poll_interval)
+        try:
+            await self.update()
+            while not self.stopped():
+                await watcher.wait()
+
+                # Throttle, consuming changes until the interval elapses.
+                while not self.stopped() and self._last_push is not None:
+                    delay = self._last_push + self.min_interval - self.clock()
+                    if delay <= 0:
+                        break
+                    try:
+                        await asyncio.wait_for(watcher.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+
+                # Pushing any last change once stopped.
+                await self.update()
+        finally:
+            watcher.close()
+
+        logger.info("Stopped watching: %s pushed: %s skipped: %s",
+                    self.path, self.pushed, self.skipped)
+
+    async def update(self):
+        """Push current content, unless missing or unchanged."""
+        try:
+            content = read_text(self.path)
+        except FileNotFoundError:
+            return
+
+        digest = hashlib.blake2b(
+            content.encode("utf-8", errors="replace"), digest_size=16).digest()
+        if digest == self._last_hash:
+            self.skipped += 1
+            return
+
+        self._last_push = self.clock()
+        try:
+            await self.push(content)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            logger.exception("Error pushing progress: %s", self.path)
+            return
+
+        self._last_hash = digest
+        self.pushed += 1
@@ -0,0 +1,243 @@
+from typing import Any, Awaitable, Callable, List, Optional, Set
+
+import os
+import asyncio
+import logging
+import contextvars
+
+import attr
+
+from .journal import DeliveryJournal
+
+logger = logging.getLogger(__name__)
+
+# Futures deferring completion of the journaled delivery being handled.
+_deferred: "contextvars.ContextVar[Optional[List[asyncio.Future]]]" = (
+    contextvars.ContextVar("ghapp.workqueue.deferred", default=None))
+
+
+def defer(sent: "asyncio.Future[bool]"):
+    """Defer completion of the delivery being handled until `sent` is True.
+
+    For handlers whose work finishes after they return, such as debounced
+    check run updates. The delivery is left journaled, and replayed after a
+    restart, if `sent` resolves False. Outside of journaled delivery
+    handling this has no effect.
+    """
+    deferred = _deferred.get()
+    if deferred is not None:
+        deferred.append(sent)
+
+
+@attr.s(auto_attribs=True)
+class WorkQueue:
+    """Bounded in-process queue of webhook work, run by worker tasks.
+
+    Holds up to `maxsize` pending calls, resolved from `GHAPP_WORK_QUEUE_SIZE`
+    and defaulting to 1000, run by `workers` tasks, resolved from
+    `GHAPP_WORKERS` and defaulting to 8. `submit` rejects work once the queue
+    is full, for the webhook handler to apply backpressure.
+
+    Given a `journal`, `deliver` durably records webhook deliveries before
+    they are acknowledged, removing them once handled successfully, and
+    `replay` requeues deliveries left unfinished by a restart or failure, up
+    to the journal's `max_replays` times. Handlers may `defer` completion
+    until work they leave pending is done.
+    """
+    QUEUE_SIZE_ENV_VAR = "GHAPP_WORK_QUEUE_SIZE"
+    WORKERS_ENV_VAR = "GHAPP_WORKERS"
+
+    @staticmethod
+    def _resolve_maxsize(maxsize: Optional[int] = None) -> int:
+        if maxsize is None:
+            maxsize = os.getenv(WorkQueue.QUEUE_SIZE_ENV_VAR, 1000)
+        return int(maxsize)
+
+    @staticmethod
+    def _resolve_workers(workers: Optional[int] = None) -> int:
+        if workers is None:
+            workers = os.getenv(WorkQueue.WORKERS_ENV_VAR, 8)
+        return int(workers)
+
+    maxsize: int = attr.ib(converter=_resolve_maxsize.__func__, default=None)
+    workers: int = attr.ib(converter=_resolve_workers.__func__, default=None)
+    journal: Optional[DeliveryJournal] = None
+
+    submitted: int = 0
+    rejected: int = 0
+    processed: int = 0
+    failed: int = 0
+    replayed: int = 0
+
+    _queue: Optional[asyncio.Queue] = attr.ib(default=None, repr=False)
+    _tasks: List[asyncio.Future] = attr.ib(
+        default=attr.Factory(list), repr=False)
+    _completing: Set[asyncio.Future] = attr.ib(
+        default=attr.Factory(set), repr=False)
+    _replaying: Optional[asyncio.Future] = attr.ib(default=None, repr=False)
+
+    async def start(self):
+        """Open the journal, if any, and start worker tasks on the running loop."""
+        if self.journal is not None:
+            await self.journal.open()
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [
+            asyncio.ensure_future(self._work()) for _ in range(self.workers)
+        ]
+
+    def submit(self, fn: Callable[..., Awaitable[Any]], *args,
+               **kwargs) -> bool:
+        """Enqueue a call of `fn`, returning False if the queue is full."""
+        if self._queue is None:
+            raise RuntimeError("Work queue not started.")
+
+        try:
+            self._queue.put_nowait((fn, args, kwargs))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            logger.warning("Work queue full, rejecting: %s", fn)
+            return False
+
+        self.submitted += 1
+        return True
+
+    async def deliver(self, source: str, send: Callable[..., Awaitable[Any]],
+                      name: str, body: Any) -> bool:
+        """Journal and enqueue a webhook delivery, returning False if full."""
+        if self.journal is None:
+            return self.submit(send, name=name, body=body)
+
+        if self._queue is None:
+            raise RuntimeError("Work queue not started.")
+        if self._queue.full():
+            self.rejected += 1
+            logger.warning("Work queue full, rejecting: %s %s", source, name)
+            return False
+
+        id = await self.journal.append(source, name, body)
+        if not self.submit(self._process, id, send, name=name, body=body):
+            # Rejected deliveries are redelivered by the sender.
+            self.journal.complete(id)
+            return False
+        return True
+
+    async def replay(self, resolve: Callable[[str, str], Optional[Callable]]):
+        """Enqueue unfinished journaled deliveries, handled by `resolve`.
+
+        `resolve` maps a delivery's source and name to its handler, waiting
+        for queue capacity rather than rejecting.
+        """
+        if self.journal is None:
+            return
+
+        for delivery in await self.journal.replay():
+            send = resolve(delivery.source, delivery.name)
+            if send is None:
+                logger.warning("No handler for journaled delivery: %s",
+                               delivery)
+                self.journal.complete(delivery.id)
+                continue
+
+            await self._queue.put(
+                (self._process, (delivery.id, send),
+                 dict(name=delivery.name, body=delivery.body)))
+            self.submitted += 1
+            self.replayed += 1
+
+        if self.replayed:
+            logger.info("Replayed %s journaled deliveries.", self.replayed)
+
+    def start_replay(self, resolve: Callable[[str, str], Optional[Callable]]):
+        """Replay unfinished journaled deliveries in the background.
+
+        Queueing a large backlog waits on workers, so runs as a task rather
+        than delaying startup, and is cancelled by `close`.
+        """
+        self._replaying = asyncio.ensure_future(self.replay(resolve))
+
+    async def _process(self, id: int, send: Callable[..., Awaitable[Any]],
+                       **kwargs):
+        # Failed deliveries, or those interrupted by cancellation, are left
+        # for replay.
+        deferred: List[asyncio.Future] = []
+        token = _deferred.set(deferred)
+        try:
+            await send(**kwargs)
+        finally:
+            _deferred.reset(token)
+
+        if not deferred:
+            self.journal.complete(id)
+            return
+
+        completing = asyncio.gather(*deferred)
+        self._completing.add(completing)
+        completing.add_done_callback(
+            lambda f: self._complete_deferred(id, f))
+
+    def _complete_deferred(self, id: int, completing: asyncio.Future):
+        self._completing.discard(completing)
+        if (not completing.cancelled() and completing.exception() is None
+                and all(completing.result())):
+            self.journal.complete(id)
+        else:
+            logger.warning("Deferred work failed, leaving delivery: %s", id)
+
+    async def _work(self):
+        while True:
+            fn, args, kwargs = await self._queue.get()
+            try:
+                await fn(*args, **kwargs)
+                self.processed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("Error processing: %s", fn)
+            finally:
+                self._queue.task_done()
+
+    async def join(self):
+        """Wait for all submitted work to be processed."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self, timeout: float = 30):
+        """Drain pending work, for up to `timeout` seconds, and stop workers."""
+        if self._replaying is not None:
+            # Deliveries not yet requeued are left journaled.
+            self._replaying.cancel()
+            await asyncio.gather(self._replaying, return_exceptions=True)
+            self._replaying = None
+
+        try:
+            await asyncio.wait_for(self.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Abandoning %s pending webhooks.",
+                           self._queue.qsize())
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        if self._completing:
+            # Deliveries awaiting deferred work, left journaled if unfinished.
+            await asyncio.wait(list(self._completing), timeout=timeout)
+
+        if self.journal is not None:
+            await self.journal.close()
+
+    def stats(self) -> dict:
+        stats = dict(
+            pending=self._queue.qsize() if self._queue else 0,
+            maxsize=self.maxsize,
+            workers=self.workers,
+            submitted=self.submitted,
+            rejected=self.rejected,
+            processed=self.processed,
+            failed=self.failed,
+            replayed=self.replayed,
+        )
+        if self.journal is not None:
+            stats["deferred"] = len(self._completing)
+            stats["journal"] = self.journal.stats()
+        return stats
@@ -14,7 +14,7 @@ setup(
     entry_points={
         'console_scripts' : [
         'git-credential-github-app-auth='
-            'ghapp.cli:credential',
+            'ghapp.github.credentialclient:main',
         'ghapp='
             'ghapp.cli:main',
         ]
@@ -25,5 +25,5 @@ setup(
     ],
 
     setup_requires=["pytest-runner"],
-    tests_require=["pytest", "pytest-aiohttp"],
+    tests_require=["pytest", "pytest-aiohttp", "pytest-asyncio"],
 )
@@ -88,3 +88,76 @@ load '/usr/local/lib/bats/load.bash'
   unset BUILDKITE_DOCKER_DEFAULT_VOLUMES
 
 }
+
+@test "token cache" {
+  export DCYML=$PWD/hooks/../docker-compose.yml
+  export BUILDKITE_PLUGIN_GITHUB_CHECKS_TOKEN_CACHE=true
+
+  stub docker-compose \
+    "-f ${DCYML} build ghapp : echo build ghapp" \
+    "-f ${DCYML} run -v ghapp-token-cache:/var/cache/ghapp -e GITHUB_APP_AUTH_TOKEN_CACHE=/var/cache/ghapp/tokens.json --workdir=${PWD} --rm ghapp -v check from-job-env : echo run ghapp" \
+    "-f ${DCYML} down  : echo down"
+
+  run $PWD/hooks/pre-command
+
+  assert_success
+
+  unstub docker-compose
+
+  unset BUILDKITE_PLUGIN_GITHUB_CHECKS_TOKEN_CACHE
+}
+
+@test "progress watch started detached on pre-command" {
+  export DCYML=$PWD/hooks/../docker-compose.yml
+  export BUILDKITE_JOB_ID=test-job
+  export BUILDKITE_PLUGIN_GITHUB_CHECKS_PROGRESS=progress.md
+
+  stub docker-compose \
+    "-f ${DCYML} build ghapp : echo build ghapp" \
+    "-f ${DCYML} run --workdir=${PWD} --rm ghapp -v check from-job-env : echo run ghapp" \
+    "-f ${DCYML} down  : echo down" \
+    "-f ${DCYML} build ghapp : echo build ghapp" \
+    "-f ${DCYML} run --workdir=${PWD} -d --name ghapp-watch-test-job ghapp -v check watch --interval 30 --stop_file progress.md.stop progress.md : echo watch"
+
+  stub docker \
+    "volume create --name=buildkite : echo volume" \
+    "rm -f ghapp-watch-test-job : echo rm" \
+    "volume create --name=buildkite : echo volume"
+
+  run $PWD/hooks/pre-command
+
+  assert_success
+
+  unstub docker-compose
+  unstub docker
+
+  unset BUILDKITE_JOB_ID
+  unset BUILDKITE_PLUGIN_GITHUB_CHECKS_PROGRESS
+}
+
+@test "progress watch stopped on post-command" {
+  export DCYML=$PWD/hooks/../docker-compose.yml
+  export BUILDKITE_JOB_ID=test-job
+  export BUILDKITE_PLUGIN_GITHUB_CHECKS_PROGRESS=$BATS_TMPDIR/progress.md
+
+  stub docker \
+    "wait ghapp-watch-test-job : echo 0" \
+    "rm -f ghapp-watch-test-job : echo rm" \
+    "volume create --name=buildkite : echo volume"
+
+  stub docker-compose \
+    "-f ${DCYML} build ghapp : echo build ghapp" \
+    "-f ${DCYML} run --workdir=${PWD} --rm ghapp -v check from-job-env : echo run ghapp" \
+    "-f ${DCYML} down  : echo down"
+
+  run $PWD/hooks/post-command
+
+  assert_success
+  [[ ! -f "$BATS_TMPDIR/progress.md.stop" ]]
+
+  unstub docker
+  unstub docker-compose
+
+  unset BUILDKITE_JOB_ID
+  unset BUILDKITE_PLUGIN_GITHUB_CHECKS_PROGRESS
+}